@@ -0,0 +1,55 @@
+"""
+Benchmark the vectorised backtest engine over synthetic candles.
+
+Usage:
+    python -m benchmarks.bench_backtest [bars ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from sdk.backtest import STRATEGIES, Backtest
+from sdk.candles import CANDLE_DTYPE
+
+DEFAULT_SIZES = [1_000_000]
+REPEATS = 3
+
+
+def make_candles(count, seed=42):
+    """
+    Build a random walk of one-minute candles.
+    """
+    rng = np.random.default_rng(seed)
+
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.002, count))
+    open_ = np.concatenate(([100.0], close[:-1]))
+
+    candles = np.zeros(count, dtype=CANDLE_DTYPE)
+    candles['ts'] = np.arange(count) * 60
+    candles['open'] = open_
+    candles['high'] = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.001, count)))
+    candles['low'] = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.001, count)))
+    candles['close'] = close
+    candles['volume'] = rng.uniform(1, 100, count)
+    return candles
+
+
+def main(sizes):
+    print(f"{'bars':>10} {'strategy':>10} {'trades':>7} {'run s':>7} {'bars/s':>12}")
+    for count in sizes:
+        candles = make_candles(count)
+        backtest = Backtest(candles, stop_loss=0.01, take_profit=0.02)
+
+        for strategy in STRATEGIES:
+            seconds = float('inf')
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                trades = backtest.run(strategy)
+                seconds = min(seconds, time.perf_counter() - start)
+
+            print(f"{count:>10} {strategy:>10} {len(trades):>7} {seconds:>7.3f} {count / seconds:>12.0f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,56 @@
+"""
+Benchmark a full cost-basis replay for every lot matching method.
+
+Usage:
+    python -m benchmarks.bench_cost_basis [transactions ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from sdk.portoflio.ledger import PositionLedger
+from sdk.portoflio.lots import COST_BASIS_METHODS, CostBasisEngine
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+SYMBOLS = 50
+
+
+def make_transactions(count, seed=42):
+    """
+    Build a synthetic transaction log, two BUYs for every SELL.
+    """
+    rng = np.random.default_rng(seed)
+
+    symbols = rng.integers(0, SYMBOLS, count)
+    actions = np.where(rng.random(count) < 2 / 3, 'BUY', 'SELL')
+    amounts = rng.uniform(0.01, 5, count)
+    prices = rng.uniform(10, 1000, count)
+
+    return [
+        {'symbol': f'C{symbol}', 'action': action, 'amount': amount, 'price': price}
+        for symbol, action, amount, price in zip(symbols.tolist(), actions.tolist(), amounts.tolist(), prices.tolist())
+    ]
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'transactions':>12} {'method':>8} {'replay s':>9} {'tx/s':>10}")
+    for count in sizes:
+        transactions = make_transactions(count)
+
+        for method in COST_BASIS_METHODS:
+            seconds = timed(lambda: CostBasisEngine.replay(transactions, method))
+            print(f"{count:>12} {method:>8} {seconds:>9.2f} {count / seconds:>10.0f}")
+
+        seconds = timed(lambda: PositionLedger.replay(transactions))
+        print(f"{count:>12} {'ledger':>8} {seconds:>9.2f} {count / seconds:>10.0f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
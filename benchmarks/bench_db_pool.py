@@ -0,0 +1,89 @@
+"""
+Load test of the pooled storage connections against a connection per request.
+
+Each simulated request reads one page of the trade journal, the way the
+/history route does. The unpooled variant opens and closes a connection per
+request like main.py used to.
+
+Usage:
+    python -m benchmarks.bench_db_pool [requests] [threads ...]
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+
+from sdk import storage
+
+DEFAULT_REQUESTS = 5_000
+DEFAULT_THREADS = [1, 4, 16]
+TRADES = 20_000
+
+PAGE_QUERY = 'SELECT * FROM trades WHERE pair = ? ORDER BY date DESC, id DESC LIMIT 50'
+
+
+def make_database(path, trades=TRADES):
+    """
+    Create a journal database with synthetic trades.
+    """
+    with storage.connect(path) as conn:
+        with storage.transaction(conn):
+            conn.executemany(
+                f"INSERT INTO trades ({', '.join(storage.TRADE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(storage.TRADE_COLUMNS))})",
+                [
+                    (f'2024-{1 + i % 12:02d}-{1 + i % 28:02d}', ('BTCUSD', 'ETHUSD', 'SOLUSD')[i % 3], 'Buy',
+                     100, 95, 110, 105, 5, 1, 1, 'Breakout', 'Win', 5, 'London', '')
+                    for i in range(trades)
+                ]
+            )
+
+
+def unpooled_request(path):
+    conn = sqlite3.connect(path)
+    conn.execute(PAGE_QUERY, ('BTCUSD',)).fetchall()
+    conn.close()
+
+
+def pooled_request(path):
+    with storage.connect(path) as conn:
+        conn.execute(PAGE_QUERY, ('BTCUSD',)).fetchall()
+
+
+def throughput(request, path, requests, threads):
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(request, path) for _ in range(requests)]:
+            future.result()
+
+    return requests / (time.perf_counter() - start)
+
+
+def main(requests, thread_counts):
+    previous_size = storage.POOL_SIZE
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        make_database(path)
+
+        print(f"{'threads':>8} {'unpooled req/s':>16} {'pooled req/s':>14} {'speedup':>8}")
+        try:
+            for threads in thread_counts:
+                storage.configure_pool(size=threads)
+
+                unpooled = throughput(unpooled_request, path, requests, threads)
+                pooled = throughput(pooled_request, path, requests, threads)
+
+                print(f"{threads:>8} {unpooled:>16.0f} {pooled:>14.0f} {pooled / unpooled:>7.2f}x")
+        finally:
+            # Restores the size and closes the pool of the temporary database
+            storage.configure_pool(size=previous_size)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else DEFAULT_REQUESTS, args[1:] or DEFAULT_THREADS)
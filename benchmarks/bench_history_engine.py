@@ -0,0 +1,66 @@
+"""
+Benchmark the portfolio history engine at different history sizes.
+
+Usage:
+    python -m benchmarks.bench_history_engine [points ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from sdk.portoflio.history import SECONDS_PER_DAY, PortfolioHistory, naive_now
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def make_history(points, step_seconds=60, seed=42):
+    """
+    Build a synthetic minute-resolution history ending now.
+    """
+    rng = np.random.default_rng(seed)
+
+    timestamps = naive_now() - np.arange(points, dtype=np.int64)[::-1] * step_seconds
+    total_value = 10_000 * np.cumprod(1 + rng.normal(0, 0.001, points))
+    total_investment = np.full(points, 8_000.0)
+    profit_loss = total_value - total_investment
+    profit_loss_percentage = profit_loss / total_investment * 100
+
+    return timestamps, total_value, total_investment, profit_loss, profit_loss_percentage
+
+
+def timed(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench(points):
+    columns = make_history(points)
+    history = PortfolioHistory(*columns)
+
+    def metrics():
+        history.atl_ath()
+        for days in (1, 7, 30):
+            history.change_for_period(days * SECONDS_PER_DAY)
+        history.drawdown_and_sharpe()
+
+    return {
+        'load': timed(lambda: PortfolioHistory(*columns)),
+        'metrics': timed(metrics),
+        'chart': timed(history.chart_buckets, repeat=2),
+    }
+
+
+def main(sizes):
+    print(f"{'points':>10} {'load ms':>10} {'metrics ms':>12} {'chart ms':>10}")
+    for points in sizes:
+        result = bench(points)
+        print(f"{points:>10} {result['load']:>10.2f} {result['metrics']:>12.2f} {result['chart']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
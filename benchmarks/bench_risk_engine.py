@@ -0,0 +1,67 @@
+"""
+Benchmark the covariance risk engine over a synthetic price history.
+
+Times the full load of the history, one incremental day and the risk
+metrics of an equally weighted portfolio.
+
+Usage:
+    python -m benchmarks.bench_risk_engine [assets] [days]
+"""
+import sys
+import time
+
+import numpy as np
+
+from datetime import date, timedelta
+
+from sdk.portoflio.risk_engine import RISK_WINDOW_DAYS, RiskEngine
+
+DEFAULT_ASSETS = 200
+DEFAULT_DAYS = RISK_WINDOW_DAYS
+
+
+def make_closes(assets, days, seed=42):
+    """
+    Build geometric random walk closes, one row per day.
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.04, (days, assets))
+    return 100 * np.cumprod(1 + returns, axis=0)
+
+
+def main(assets, days):
+    closes = make_closes(assets, days + 1)
+    symbols = [f'C{index}' for index in range(assets)]
+    start = date(2020, 1, 1)
+
+    rows = [
+        ((start + timedelta(days=day)).isoformat(), dict(zip(symbols, closes[day].tolist())))
+        for day in range(days + 1)
+    ]
+
+    engine = RiskEngine()
+
+    began = time.perf_counter()
+    engine.add_days(rows[:-1])
+    load = time.perf_counter() - began
+
+    began = time.perf_counter()
+    engine.add_day(*rows[-1])
+    update = time.perf_counter() - began
+
+    weights = {symbol: 1 / assets for symbol in symbols}
+
+    began = time.perf_counter()
+    metrics = engine.metrics(weights)
+    compute = time.perf_counter() - began
+
+    print(f"{assets} assets x {days} days")
+    print(f"{'full load':>16} {load * 1000:>10.1f} ms")
+    print(f"{'one day update':>16} {update * 1000:>10.2f} ms")
+    print(f"{'risk metrics':>16} {compute * 1000:>10.2f} ms")
+    print(f"volatility {metrics['volatility']}%, VaR {metrics['var_historical']}%, CVaR {metrics['cvar_historical']}%")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(args[0] if args else DEFAULT_ASSETS, args[1] if len(args) > 1 else DEFAULT_DAYS)
@@ -1,73 +1,139 @@
+import io
+import os
+import hashlib
 import logging
-import sqlite3, csv
+import threading
 
-from io import StringIO
+from datetime import datetime, timedelta
 from flask import (
     flash,
     Flask,
     request,
+    Response,
     url_for,
     jsonify,
     redirect,
     send_file,
     make_response,
     render_template,
+    stream_with_context,
 )
 
 from sdk.portoflio.analytics import(
+    PORTFOLIO_FIELDS,
+    portfolio_versions,
     calculate_portfolio_data,
+    calculate_portfolio_fields,
 )
+from sdk import storage, journal, api_encoding
+from sdk.api_client import quote_cache, quote_client
+from sdk.metrics import (
+    end_trace,
+    start_trace,
+    format_labels,
+    stage_metrics,
+    request_metrics,
+    format_histogram,
+)
+from sdk.alerts import alert_engine, alert_notifier, load_outbox
 from sdk.logger import setup_logging
+from sdk.journal_analytics import get_journal_analytics_json
+from sdk.portoflio.performance import (
+    CHART_PERIODS,
+    INITIAL_CHART_PERIOD,
+    DEFAULT_CHART_POINTS,
+    get_chart_data,
+    get_asset_chart_data,
+)
+from sdk.price_worker import quote_store, price_worker
+from sdk.portoflio.importer import detect_format, import_transactions
+from sdk.portoflio.holdings import get_current_prices, get_holdings
+from sdk.portoflio.lots import DEFAULT_COST_BASIS_METHOD, get_cost_basis_engine
+from sdk.portoflio.history import set_history_source
+from sdk.portoflio.snapshots import snapshot_recorder
+from sdk.portoflio.stream import portfolio_stream
+from sdk.portoflio.risk_engine import get_risk_metrics, record_daily_closes, update_daily_candles
 from sdk.portoflio.transactions import (
     update_buy,
     update_sell,
-    create_csv_content,
+    gzip_stream,
+    stream_csv_content,
+    create_csv_filename,
     load_transactions_by_symbol,
 )
 
 app = Flask(__name__)
 app.secret_key = '123123123123123123'
 
-DB_FILE = 'trades.db'
+DB_FILE = storage.DB_FILE
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
-# Initialize DB if not exists
-conn = sqlite3.connect(DB_FILE)
-c = conn.cursor()
-conn.execute('''CREATE TABLE IF NOT EXISTS trades (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  date TEXT,
-  pair TEXT,
-  type TEXT,
-  entry REAL,
-  stopLoss REAL,
-  takeProfit REAL,
-  exit REAL,
-  profit REAL,
-  size REAL,
-  leverage REAL,
-  strategy TEXT,
-  result TEXT,
-  confidence INTEGER,
-  session TEXT,
-  note TEXT
-)''')
-
-conn.commit()
-conn.close()
+app.config.setdefault('DB_POOL_SIZE', storage.POOL_SIZE)
+app.config.setdefault('DB_BUSY_TIMEOUT', storage.BUSY_TIMEOUT)
+
+# Requests slower than this many seconds log their stage trace, None to disable
+app.config.setdefault('SLOW_REQUEST_THRESHOLD', 1.0)
+
+# Read the portfolio history from the binary snapshot files instead of SQLite.
+# The snapshot recorder writes both, so either source stays current.
+app.config.setdefault('USE_SNAPSHOT_HISTORY', False)
+
+storage.configure_pool(app.config['DB_POOL_SIZE'], app.config['DB_BUSY_TIMEOUT'])
+storage.init_storage()
+
+# Rendered /portfolio page, reused while its input versions are unchanged
+portfolio_page = {'etag': None, 'html': None}
+portfolio_page_lock = threading.Lock()
+
+# Keeps ETags from one process run from matching pages of another
+ETAG_SALT = os.urandom(8).hex()
+
+
+@app.before_request
+def bind_db_connections():
+    storage.bind_connections()
+
+@app.teardown_appcontext
+def release_db_connections(exception):
+    storage.release_connections()
+
+@app.before_request
+def start_request_trace():
+    start_trace(f'{request.method} {request.full_path.rstrip("?")}')
+
+@app.teardown_request
+def finish_request_trace(exception):
+    trace = end_trace()
+    if trace is None:
+        return
+
+    elapsed = trace.elapsed()
+    request_metrics.observe(request.endpoint or 'unknown', elapsed, trace.start, exception is not None)
+
+    threshold = app.config['SLOW_REQUEST_THRESHOLD']
+    if threshold is not None and elapsed > threshold:
+        spans = trace.format()
+        logger.warning(f"Slow request {trace.name}: {elapsed * 1000:.1f} ms" + (f"\n{spans}" if spans else ''))
+
+@app.context_processor
+def inject_quotes_freshness():
+    return {'quotes_updated_at': quote_store.updated_at}
+
+@app.template_filter('usd')
+def format_usd(value):
+    return f"${value:,.2f}"
+
+@app.template_filter('percent')
+def format_percent(value):
+    return f"{value:,.2f}%"
 
 @app.route('/')
 def index():
-    conn = sqlite3.connect(DB_FILE)
-    trades = conn.execute("SELECT * FROM trades").fetchall()
-
-    pairs = [row[0] for row in conn.execute("SELECT DISTINCT pair FROM trades").fetchall()]
-    strategies = [row[0] for row in conn.execute("SELECT DISTINCT strategy FROM trades").fetchall()]
-    conn.close()
+    distinct = journal.get_distinct_values()
 
-    return render_template("index.html", trades=trades, pairs=pairs, strategies=strategies)
+    return render_template("index.html", pairs=distinct['pairs'], strategies=distinct['strategies'])
 
 @app.route('/transactions/<symbol>')
 def get_transactions_by_symbol(symbol):
@@ -77,16 +143,47 @@ def get_transactions_by_symbol(symbol):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/export/transactions/<symbol>')
-def export_transactions_csv(symbol):
-    output, filename = create_csv_content(symbol)
+def parse_export_range(args):
+    """
+    Parse the optional start/end export filters (YYYY-MM-DD, both inclusive).
+
+    Returns:
+        tuple: ISO lower bound and exclusive ISO upper bound, or None for each
+    """
+    start = args.get('start')
+    end = args.get('end')
+
+    if start:
+        start = datetime.strptime(start, '%Y-%m-%d').date().isoformat()
+    if end:
+        end = (datetime.strptime(end, '%Y-%m-%d').date() + timedelta(days=1)).isoformat()
+
+    return start, end
+
+def stream_csv_response(symbols):
+    try:
+        start, end = parse_export_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date, expected YYYY-MM-DD'}), 400
+
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    rows = stream_csv_content(symbols, start, end)
+    filename = create_csv_filename(symbols, use_gzip)
+
+    if use_gzip:
+        response = Response(stream_with_context(gzip_stream(rows)), mimetype='application/gzip')
+    else:
+        response = Response(stream_with_context(rows), mimetype='text/csv')
 
-    response = make_response(output)
-    response.headers['Content-Type'] = 'text/csv'
     response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
 
     return response
 
+@app.route('/export/transactions/<symbol>')
+def export_transactions_csv(symbol):
+    return stream_csv_response(None if symbol.lower() == 'all' else [symbol])
+
 @app.route('/add-transaction', methods=['POST'])
 def add_new_transaction():
     print("Route hit!") # Add this line
@@ -112,26 +209,286 @@ def add_new_transaction():
     except Exception as e:
         return jsonify({'error': f'Error adding transaction: {str(e)}'}), 500
 
+def query_journal_page(args):
+    """
+    Run the trade journal query described by the history page arguments.
+    """
+    start, end = journal.parse_date_range(args)
+
+    try:
+        limit = int(args.get('limit', journal.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = journal.DEFAULT_PAGE_SIZE
+
+    return journal.query_trades(
+        filters={column: args.get(column) for column in journal.JOURNAL_FILTERS},
+        start=start,
+        end=end,
+        sort=args.get('sort', 'date_desc'),
+        cursor=args.get('cursor'),
+        limit=limit,
+        source=args.get('source', 'journal'),
+    )
+
+@app.route('/import-transactions', methods=['POST'])
+def import_transactions_route():
+    upload = request.files.get('file')
+
+    if upload is not None:
+        fmt = request.args.get('format') or detect_format(upload.filename)
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    else:
+        fmt = request.args.get('format') or 'csv'
+        stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+
+    try:
+        return jsonify(import_transactions(stream, fmt))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error importing transactions: {str(e)}'}), 500
+
 @app.route('/history')
 def history_tab():
-    conn = sqlite3.connect(DB_FILE)
-    trades = conn.execute("SELECT * FROM trades").fetchall()
+    trades, next_cursor = query_journal_page(request.args)
+    distinct = journal.get_distinct_values(request.args.get('source', 'journal'))
+
+    return render_template(
+        "history.html",
+        trades=trades,
+        next_cursor=next_cursor,
+        pairs=distinct['pairs'],
+        strategies=distinct['strategies'],
+        sessions=distinct['sessions'],
+    )
+
+@app.route('/history/trades')
+def history_trades():
+    trades, next_cursor = query_journal_page(request.args)
+
+    page = {'trades': [dict(trade) for trade in trades], 'next_cursor': next_cursor}
 
-    pairs = [row[0] for row in conn.execute("SELECT DISTINCT pair FROM trades").fetchall()]
-    strategies = [row[0] for row in conn.execute("SELECT DISTINCT strategy FROM trades").fetchall()]
-    conn.close()
+    # The history page appends the rendered cards directly
+    if request.args.get('html') == '1':
+        page['html'] = render_template("trade_cards.html", trades=trades)
 
-    return render_template("history.html", trades=trades, pairs=pairs, strategies=strategies)
+    return jsonify(page)
+
+@app.route('/history/analytics')
+def history_analytics():
+    version, body = get_journal_analytics_json()
+    etag = hashlib.sha1(f'{ETAG_SALT}journal{version}'.encode()).hexdigest()
+
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
 
 @app.route('/portfolio')
 def portfolio():
-    portfolio_data = calculate_portfolio_data()
+    versions = portfolio_versions()
+    etag = hashlib.sha1(f'{ETAG_SALT}{versions}'.encode()).hexdigest()
 
-    return render_template(
-        'portfolio.html',
-        **portfolio_data
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        with portfolio_page_lock:
+            if portfolio_page['etag'] != etag:
+                portfolio_data = calculate_portfolio_data(versions)
+
+                with stage_metrics.stage('render_template.portfolio'):
+                    portfolio_page['html'] = render_template(
+                        'portfolio.html',
+                        **portfolio_data
+                    )
+                portfolio_page['etag'] = etag
+
+            response = make_response(portfolio_page['html'])
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+
+    return response
+
+def portfolio_api_response(fields):
+    unknown = [field for field in fields if field not in PORTFOLIO_FIELDS]
+    if unknown:
+        return jsonify({'error': f'Unknown fields {", ".join(unknown)}, expected {", ".join(PORTFOLIO_FIELDS)}'}), 400
+
+    fmt = api_encoding.negotiate_format(request.accept_mimetypes, request.args.get('format'))
+    if fmt is None:
+        return jsonify({'error': f'Unsupported format, expected one of {", ".join(api_encoding.available_formats())}'}), 406
+
+    encoding = api_encoding.negotiate_encoding(request.accept_encodings)
+
+    versions = portfolio_versions()
+    etag = hashlib.sha1(f'{ETAG_SALT}api{versions}{fields}{fmt}{encoding}'.encode()).hexdigest()
+
+    headers = {'Vary': 'Accept, Accept-Encoding', 'Cache-Control': 'no-cache'}
+
+    if etag in request.if_none_match:
+        response = Response(status=304, headers=headers)
+    else:
+        body = api_encoding.encode(calculate_portfolio_fields(fields, versions), fmt)
+        body, content_encoding = api_encoding.compress(body, encoding)
+
+        response = Response(body, mimetype=api_encoding.MEDIA_TYPES[fmt], headers=headers)
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/v1/portfolio')
+def portfolio_api():
+    fields = request.args.get('fields')
+    fields = [field.strip() for field in fields.split(',') if field.strip()] if fields else list(PORTFOLIO_FIELDS)
+
+    return portfolio_api_response(fields)
+
+@app.route('/api/v1/portfolio/<field>')
+def portfolio_api_field(field):
+    return portfolio_api_response([field])
+
+@app.route('/portfolio/stream')
+def portfolio_stream_events():
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+
+    try:
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        cursor = None
+
+    return Response(
+        portfolio_stream.subscribe(cursor),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
     )
 
+@app.route('/portfolio/chart-data')
+def portfolio_chart_data():
+    period = request.args.get('range', INITIAL_CHART_PERIOD)
+
+    if period not in CHART_PERIODS:
+        return jsonify({'error': f'Invalid range, expected one of {", ".join(CHART_PERIODS)}'}), 400
+
+    try:
+        points = min(max(int(request.args.get('points', DEFAULT_CHART_POINTS)), 10), 5000)
+    except ValueError:
+        return jsonify({'error': 'Invalid points value'}), 400
+
+    return jsonify({'range': period, 'points': get_chart_data(period, points)})
+
+@app.route('/portfolio/chart-data/<symbol>')
+def asset_chart_data(symbol):
+    period = request.args.get('range', INITIAL_CHART_PERIOD)
+
+    if period not in CHART_PERIODS:
+        return jsonify({'error': f'Invalid range, expected one of {", ".join(CHART_PERIODS)}'}), 400
+
+    return jsonify({'symbol': symbol, 'range': period, 'points': get_asset_chart_data(symbol, period)})
+
+@app.route('/portfolio/cost-basis')
+def portfolio_cost_basis():
+    method = request.args.get('method', DEFAULT_COST_BASIS_METHOD).lower()
+
+    try:
+        engine = get_cost_basis_engine(method)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    open_symbols = [symbol for symbol, book in engine.books.items() if book.quantity > 0]
+
+    return jsonify(engine.report(get_current_prices(open_symbols)))
+
+@app.route('/portfolio/risk')
+def portfolio_risk():
+    holdings, _, _ = get_holdings()
+    metrics = get_risk_metrics(holdings)
+
+    if metrics is None:
+        return jsonify({'error': 'Not enough daily price history'}), 404
+
+    return jsonify(metrics)
+
+@app.route('/metrics')
+def metrics():
+    lines = stage_metrics.render() + request_metrics.render()
+
+    providers = quote_client.get_latency_stats()
+    if providers:
+        lines += [
+            '# HELP quote_provider_duration_seconds Duration of upstream quote requests.',
+            '# TYPE quote_provider_duration_seconds histogram',
+        ]
+        for name, stats in providers.items():
+            lines += format_histogram('quote_provider_duration_seconds', {'provider': name}, stats)
+
+        lines += [
+            '# HELP quote_provider_errors_total Failed upstream quote requests.',
+            '# TYPE quote_provider_errors_total counter',
+        ]
+        lines += [
+            f"quote_provider_errors_total{format_labels({'provider': name})} {stats['errors']}"
+            for name, stats in providers.items()
+        ]
+
+    lines += [
+        '# HELP quote_cache_events_total Quote cache lookups by outcome.',
+        '# TYPE quote_cache_events_total counter',
+    ]
+    cache_stats = quote_cache.get_stats()
+    lines += [
+        f"quote_cache_events_total{format_labels({'event': event})} {count}"
+        for event, count in cache_stats.items() if event != 'size'
+    ]
+    lines += [
+        '# HELP quote_cache_size Cached quotes.',
+        '# TYPE quote_cache_size gauge',
+        f"quote_cache_size {cache_stats['size']}",
+    ]
+    lines += [
+        '# HELP alerts_suppressed_total Alerts dropped by the global rate limit.',
+        '# TYPE alerts_suppressed_total counter',
+        f"alerts_suppressed_total {alert_engine.suppressed}",
+    ]
+
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/alerts')
+def list_alerts():
+    return jsonify({'rules': alert_engine.list_rules(), 'outbox': load_outbox()})
+
+@app.route('/alerts', methods=['POST'])
+def add_alert():
+    rule = request.get_json(silent=True) or request.form
+
+    try:
+        if rule.get('kind') == 'portfolio' and 'lower' in rule:
+            rule_ids = alert_engine.add_portfolio_band(rule['lower'], rule['upper'], rule.get('note', ''))
+        else:
+            rule_ids = (alert_engine.add_rule(
+                rule.get('kind'),
+                rule.get('symbol', ''),
+                side=rule.get('side'),
+                level=rule.get('level'),
+                pct=rule.get('pct'),
+                note=rule.get('note', ''),
+            ),)
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'ids': list(rule_ids)}), 201
+
+@app.route('/alerts/<int:rule_id>', methods=['DELETE'])
+def delete_alert(rule_id):
+    if not alert_engine.remove_rule(rule_id):
+        return jsonify({'error': f'No alert rule {rule_id}'}), 404
+
+    return jsonify({'deleted': rule_id})
+
 @app.route('/buy_asset', methods=['POST'])
 def buy_asset():
     try:
@@ -171,7 +528,9 @@ def sell_asset():
         price_decimal = float(price)
         quantity_decimal = float(quantity)
 
-        update_sell(asset_name, quantity_decimal, price_decimal)
+        if not update_sell(asset_name, quantity_decimal, price_decimal):
+            flash(f'Cannot sell {quantity_decimal} {asset_name}: the position holds less', 'error')
+            return redirect(url_for('portfolio'))
 
         flash('Asset sold successfully!', 'success')
         return redirect(url_for('portfolio'))
@@ -193,35 +552,15 @@ def sell_asset():
 
 @app.route('/add', methods=['POST'])
 def add_trade():
-    data = [request.form[k] for k in [
-        'date', 'pair', 'type', 'entry', 'stopLoss', 'takeProfit',
-        'exit', 'profit', 'size', 'leverage', 'strategy',
-        'result', 'confidence', 'session', 'note'
-    ]]
-
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("""
-      INSERT INTO trades (
-        date, pair, type, entry, stopLoss, takeProfit,
-        exit, profit, size, leverage, strategy,
-        result, confidence, session, note
-      )
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, data)
-
-    conn.commit()
-    conn.close()
+    journal.add_trade({column: request.form[column] for column in storage.TRADE_COLUMNS})
+
     return redirect(url_for('index'))
 
 @app.route('/export')
 def export_csv():
-    output, filename = create_csv_content('all')
-
-    response = make_response(output)
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    symbols = [symbol for symbol in request.args.get('symbols', '').split(',') if symbol]
 
-    return response
+    return stream_csv_response(symbols or None)
 
 if __name__ == "__main__":
     host = "127.0.0.1"
@@ -232,4 +571,14 @@ if __name__ == "__main__":
     for rule in app.url_map.iter_rules():
         print(f"{rule.rule} -> {rule.methods}")
 
+    price_worker.add_listener(snapshot_recorder.record_portfolio)
+    price_worker.add_listener(record_daily_closes)
+    price_worker.add_listener(alert_engine.on_quotes)
+    price_worker.add_listener(update_daily_candles)
+    if app.config['USE_SNAPSHOT_HISTORY']:
+        set_history_source(snapshot_recorder)
+
+    price_worker.start()
+    alert_notifier.start()
+
     app.run(host=host, port=port)
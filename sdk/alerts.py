@@ -0,0 +1,466 @@
+import time
+import logging
+import threading
+
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from datetime import datetime, timezone
+
+from sdk import storage
+from sdk.portoflio.ledger import get_ledger
+from sdk.portoflio.versions import get_versions
+
+logger = logging.getLogger(__name__)
+
+# Rule kinds: absolute price levels, stops and targets of a holding, moves
+# from the holding's average price in percent and portfolio value bands
+ALERT_KINDS = ('price', 'stop', 'target', 'average_move', 'portfolio')
+ALERT_SIDES = ('above', 'below')
+
+# Symbol the portfolio value rules are indexed under
+PORTFOLIO_SYMBOL = 'PORTFOLIO'
+
+# Seconds before the same rule can fire again
+ALERT_COOLDOWN = 15 * 60
+
+# Alerts written to the outbox per minute across all rules
+MAX_ALERTS_PER_MINUTE = 30
+
+# Seconds between two outbox polls of the notifier
+NOTIFY_INTERVAL = 5
+
+
+class ThresholdIndex:
+    """
+    Price thresholds per symbol and side, kept in sorted lists.
+
+    A move from the previous price to the new one fires the 'above'
+    thresholds in (previous, price] or the 'below' thresholds in
+    [price, previous), found with two binary searches each, so a tick
+    costs O(log n + matches) whatever the number of rules.
+    """
+
+    def __init__(self):
+        self._levels = {}
+
+    def add(self, symbol, side, level, rule_id):
+        levels = self._levels.setdefault((symbol, side), [])
+        insort(levels, (level, rule_id))
+
+    def remove(self, symbol, side, level, rule_id):
+        levels = self._levels.get((symbol, side))
+        if not levels:
+            return
+
+        position = bisect_left(levels, (level, rule_id))
+        if position < len(levels) and levels[position] == (level, rule_id):
+            del levels[position]
+
+    def clear(self):
+        self._levels = {}
+
+    def crossed(self, symbol, previous, price):
+        """
+        Return the rules whose threshold the move from previous to price crossed.
+
+        Returns:
+            list: (rule id, level) pairs
+        """
+        above = self._levels.get((symbol, 'above'), [])
+        below = self._levels.get((symbol, 'below'), [])
+
+        # Sentinels sort after every (level, id) pair with the same level
+        high = (price, float('inf'))
+
+        if price > previous:
+            matches = above[bisect_right(above, (previous, float('inf'))):bisect_right(above, high)]
+        elif price < previous:
+            matches = below[bisect_left(below, (price,)):bisect_left(below, (previous,))]
+        else:
+            matches = []
+
+        return [(rule_id, level) for level, rule_id in matches]
+
+    def __len__(self):
+        return sum(len(levels) for levels in self._levels.values())
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value).timestamp()
+
+
+class AlertEngine:
+    """
+    Checks quote ticks against the stored alert rules and writes the fired
+    alerts to the alert_outbox table.
+
+    A rule fires when the price crosses its level. The first tick of a
+    symbol only records its price, so levels the price is already beyond
+    do not fire again after every restart. A rule then stays quiet for
+    the cooldown, and at most max_per_minute alerts are written in any
+    minute; alerts over that limit are dropped and counted.
+    """
+
+    def __init__(self, cooldown=ALERT_COOLDOWN, max_per_minute=MAX_ALERTS_PER_MINUTE, db_file=None,
+                 clock=time.time):
+        self.cooldown = cooldown
+        self.max_per_minute = max_per_minute
+        self.db_file = db_file
+        self.clock = clock
+
+        self.rules = {}
+        self.index = ThresholdIndex()
+        self.last_prices = {}
+        self.last_fired = {}
+        self.suppressed = 0
+
+        self._recent = deque()
+        self._loaded_version = None
+        self._lock = threading.RLock()
+
+    def _levels(self, rule, positions):
+        """
+        Return the (side, level) thresholds of a rule, none if it has no level yet.
+        """
+        if rule['kind'] != 'average_move':
+            return [(rule['side'], rule['level'])]
+
+        position = positions.get(rule['symbol'])
+        if position is None or not position['average_price']:
+            return []
+
+        return [(rule['side'], position['average_price'] * (1 + rule['pct'] / 100))]
+
+    def _index_rule(self, rule, positions):
+        rule['levels'] = self._levels(rule, positions)
+        for side, level in rule['levels']:
+            self.index.add(rule['symbol'], side, level, rule['id'])
+
+    def load(self):
+        """
+        Load the rules and their last fire times, and rebuild the index.
+
+        Average move levels follow the positions, so this runs again
+        whenever the transactions change.
+        """
+        with storage.connect(self.db_file) as conn:
+            rows = conn.execute(
+                'SELECT id, kind, symbol, side, level, pct, note FROM alert_rules ORDER BY id'
+            ).fetchall()
+            fired = conn.execute(
+                'SELECT rule_id, MAX(created_at) FROM alert_outbox GROUP BY rule_id'
+            ).fetchall()
+
+        positions = get_ledger().open_positions()
+
+        with self._lock:
+            self._loaded_version = get_versions()['transactions']
+            self.rules = {row['id']: dict(row) for row in rows}
+            self.last_fired = {rule_id: parse_time(created_at) for rule_id, created_at in fired}
+
+            self.index.clear()
+            for rule in self.rules.values():
+                self._index_rule(rule, positions)
+
+        logger.info(f"Alert engine loaded {len(self.rules)} rules")
+
+    def _ensure_loaded(self):
+        if self._loaded_version != get_versions()['transactions']:
+            self.load()
+
+    def add_rule(self, kind, symbol, side=None, level=None, pct=None, note=''):
+        """
+        Store a rule and add it to the index.
+
+        Stops fire below their level and targets above it. Average move
+        rules take pct, the move from the average price in percent, and
+        fire above for a positive move and below for a negative one.
+
+        Args:
+            kind (str): One of ALERT_KINDS
+            symbol (str): Coin symbol, ignored for portfolio rules
+            side (str, optional): One of ALERT_SIDES, for price and portfolio rules
+            level (float, optional): Price or portfolio value
+            pct (float, optional): Percent move, for average_move rules
+            note (str): Free text included in the alert
+
+        Returns:
+            int: Id of the new rule
+
+        Raises:
+            ValueError: If the rule is incomplete
+        """
+        if kind not in ALERT_KINDS:
+            raise ValueError(f"Unknown alert kind: {kind}")
+
+        if kind == 'stop':
+            side = 'below'
+        elif kind == 'target':
+            side = 'above'
+        elif kind == 'average_move':
+            if pct is None or float(pct) == 0:
+                raise ValueError("Average move alerts need a non-zero pct")
+            pct = float(pct)
+            side = 'above' if pct > 0 else 'below'
+            level = None
+
+        if side not in ALERT_SIDES:
+            raise ValueError(f"Alert side must be one of {', '.join(ALERT_SIDES)}")
+        if kind != 'average_move':
+            if level is None:
+                raise ValueError("Alert level is required")
+            level = float(level)
+
+        symbol = PORTFOLIO_SYMBOL if kind == 'portfolio' else str(symbol).upper()
+
+        with storage.connect(self.db_file) as conn:
+            cursor = conn.execute(
+                'INSERT INTO alert_rules (kind, symbol, side, level, pct, note, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (kind, symbol, side, level, pct, note or '', datetime.now(timezone.utc).isoformat())
+            )
+
+        rule = {'id': cursor.lastrowid, 'kind': kind, 'symbol': symbol, 'side': side,
+                'level': level, 'pct': pct, 'note': note or ''}
+
+        with self._lock:
+            self._ensure_loaded()
+            if rule['id'] not in self.rules:
+                self.rules[rule['id']] = rule
+                self._index_rule(rule, get_ledger().open_positions())
+
+        return rule['id']
+
+    def add_portfolio_band(self, lower, upper, note=''):
+        """
+        Alert when the portfolio value leaves [lower, upper].
+
+        Returns:
+            tuple: Ids of the lower and upper rules
+        """
+        return (self.add_rule('portfolio', PORTFOLIO_SYMBOL, 'below', lower, note=note),
+                self.add_rule('portfolio', PORTFOLIO_SYMBOL, 'above', upper, note=note))
+
+    def remove_rule(self, rule_id):
+        """
+        Delete a rule.
+
+        Returns:
+            bool: False if there was no such rule
+        """
+        with storage.connect(self.db_file) as conn:
+            deleted = conn.execute('DELETE FROM alert_rules WHERE id = ?', (rule_id,)).rowcount
+
+        with self._lock:
+            rule = self.rules.pop(rule_id, None)
+            if rule is not None:
+                for side, level in rule.get('levels', []):
+                    self.index.remove(rule['symbol'], side, level, rule_id)
+
+        return bool(deleted)
+
+    def list_rules(self):
+        with self._lock:
+            self._ensure_loaded()
+            return [
+                {**{key: value for key, value in rule.items() if key != 'levels'},
+                 'levels': [level for _, level in rule.get('levels', [])]}
+                for rule in self.rules.values()
+            ]
+
+    def _allow(self, rule_id, now):
+        last = self.last_fired.get(rule_id)
+        if last is not None and now - last < self.cooldown:
+            return False
+
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+
+        if len(self._recent) >= self.max_per_minute:
+            self.suppressed += 1
+            return False
+
+        self._recent.append(now)
+        self.last_fired[rule_id] = now
+        return True
+
+    def check(self, symbol, price, now=None):
+        """
+        Check one tick against the index.
+
+        Args:
+            symbol (str): Coin symbol or PORTFOLIO_SYMBOL
+            price (float): New price or portfolio value
+            now (float, optional): Epoch seconds. Defaults to the clock.
+
+        Returns:
+            list: Alert dicts that passed the cooldown and rate limit
+        """
+        now = self.clock() if now is None else now
+
+        with self._lock:
+            previous = self.last_prices.get(symbol)
+            self.last_prices[symbol] = price
+
+            alerts = []
+            if previous is None:
+                return alerts
+
+            for rule_id, level in self.index.crossed(symbol, previous, price):
+                if not self._allow(rule_id, now):
+                    continue
+
+                rule = self.rules[rule_id]
+                movement = 'rose above' if rule['side'] == 'above' else 'fell below'
+                name = 'Portfolio value' if symbol == PORTFOLIO_SYMBOL else symbol
+
+                message = f"{name} {movement} {level:,.2f} ({rule['kind']}) at {price:,.2f}"
+                if rule['note']:
+                    message += f" - {rule['note']}"
+
+                alerts.append({
+                    'rule_id': rule_id,
+                    'symbol': symbol,
+                    'kind': rule['kind'],
+                    'side': rule['side'],
+                    'level': level,
+                    'price': price,
+                    'message': message,
+                    'created_at': datetime.fromtimestamp(now, timezone.utc).isoformat(),
+                })
+
+        return alerts
+
+    def on_quotes(self, response):
+        """
+        Price worker listener checking every quote and the portfolio value.
+
+        Args:
+            response (dict): Quotes response with a 'data' mapping
+
+        Returns:
+            list: Alerts written to the outbox
+        """
+        self._ensure_loaded()
+
+        now = self.clock()
+        alerts = []
+
+        for symbol, coin_data in (response.get('data') or {}).items():
+            price = (coin_data or {}).get('quote', {}).get('USD', {}).get('price')
+            if price is not None:
+                alerts.extend(self.check(symbol, float(price), now))
+
+        positions = get_ledger().open_positions()
+        if positions and all(symbol in self.last_prices for symbol in positions):
+            value = sum(position['quantity'] * self.last_prices[symbol] for symbol, position in positions.items())
+            alerts.extend(self.check(PORTFOLIO_SYMBOL, value, now))
+
+        if alerts:
+            self.write_outbox(alerts)
+
+        return alerts
+
+    def write_outbox(self, alerts):
+        with storage.connect(self.db_file) as conn:
+            with storage.transaction(conn):
+                conn.executemany(
+                    'INSERT INTO alert_outbox (rule_id, symbol, kind, side, level, price, message, created_at) '
+                    'VALUES (:rule_id, :symbol, :kind, :side, :level, :price, :message, :created_at)',
+                    alerts
+                )
+
+        logger.info(f"{len(alerts)} alerts written to the outbox")
+
+
+def load_outbox(pending_only=False, limit=100, db_file=None):
+    """
+    Return outbox alerts, newest first, or the pending ones oldest first.
+    """
+    query = 'SELECT * FROM alert_outbox'
+    if pending_only:
+        query += ' WHERE delivered_at IS NULL ORDER BY id'
+    else:
+        query += ' ORDER BY id DESC'
+
+    with storage.connect(db_file) as conn:
+        return [dict(row) for row in conn.execute(query + ' LIMIT ?', (limit,))]
+
+
+class LocalNotifier:
+    """
+    Background thread delivering the outbox alerts, a local stand-in for
+    push or e-mail delivery.
+
+    Each pending alert is passed to the sink, logged by default, and then
+    marked as delivered.
+    """
+
+    def __init__(self, sink=None, interval=NOTIFY_INTERVAL, batch_size=100, db_file=None):
+        self.sink = sink or (lambda alert: logger.warning(f"ALERT: {alert['message']}"))
+        self.interval = interval
+        self.batch_size = batch_size
+        self.db_file = db_file
+
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def run_once(self):
+        """
+        Deliver the pending alerts.
+
+        Returns:
+            int: Number of alerts delivered
+        """
+        delivered = []
+
+        for alert in load_outbox(pending_only=True, limit=self.batch_size, db_file=self.db_file):
+            try:
+                self.sink(alert)
+            except Exception as e:
+                logger.error(f"Alert notifier error: {str(e)}")
+                break
+            delivered.append(alert['id'])
+
+        if delivered:
+            with storage.connect(self.db_file) as conn:
+                conn.executemany(
+                    'UPDATE alert_outbox SET delivered_at = ? WHERE id = ?',
+                    [(datetime.now(timezone.utc).isoformat(), alert_id) for alert_id in delivered]
+                )
+
+        return len(delivered)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Alert notifier error: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """
+        Start the notifier thread if it is not already running.
+        """
+        if self.is_running():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='alert-notifier', daemon=True)
+        self._thread.start()
+        logger.info("Alert notifier started")
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+alert_engine = AlertEngine()
+alert_notifier = LocalNotifier()
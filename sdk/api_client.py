@@ -1,13 +1,286 @@
+import time
 import logging
+import threading
 import requests
 
-from sdk.variables_fetcher import get_api_key
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from sdk.metrics import Histogram, stage_metrics
+from sdk.portoflio import versions
+from sdk.variables_fetcher import get_api_key, load_json_file
 
 logger = logging.getLogger(__name__)
 
-def get_crypto_data_by_symbols(symbols, convert='USD'):
+CMC_QUOTES_URL = 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest'
+COINGECKO_MARKETS_URL = 'https://api.coingecko.com/api/v3/coins/markets'
+
+# Seconds a cached quote is considered fresh
+QUOTE_CACHE_TTL = 60
+
+
+def split_batches(symbols, batch_size):
     """
-    Get cryptocurrency data from CoinMarketCap for specific symbols.
+    Split a symbol list into batches of at most batch_size symbols.
+    """
+    return [symbols[i:i + batch_size] for i in range(0, len(symbols), batch_size)]
+
+
+def create_session(pool_size=10):
+    """
+    Create a keep-alive HTTP session with a connection pool.
+
+    Args:
+        pool_size (int): Connections kept per host
+
+    Returns:
+        requests.Session: Pooled session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class QuoteProvider:
+    """
+    Base class of a quote source.
+
+    Subclasses declare their batch size limit and implement fetch_batch,
+    returning quotes in the CoinMarketCap 'data' shape.
+    """
+
+    name = 'provider'
+    batch_size = 100
+
+    def __init__(self, timeout=30, session=None):
+        self.timeout = timeout
+        self.session = session or create_session()
+        self.latency = Histogram()
+        self.errors = 0
+
+    def fetch_batch(self, symbols, convert):
+        raise NotImplementedError
+
+    def fetch(self, symbols, convert):
+        """
+        Fetch one batch and record its latency.
+
+        Args:
+            symbols (list): At most batch_size symbols
+            convert (str): Currency to convert prices to
+
+        Returns:
+            dict: Quotes keyed by symbol, or None if the request failed
+        """
+        start = time.perf_counter()
+        try:
+            return self.fetch_batch(symbols, convert)
+        except Exception as e:
+            logger.error(f"{self.name} request error: {str(e)}")
+            self.errors += 1
+            return None
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+
+class CoinMarketCapProvider(QuoteProvider):
+    """
+    CoinMarketCap quotes/latest endpoint.
+    """
+
+    name = 'coinmarketcap'
+    batch_size = 100
+
+    def __init__(self, url=CMC_QUOTES_URL, api_key=None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.api_key = api_key
+
+    def fetch_batch(self, symbols, convert):
+        api_key = self.api_key or get_api_key("coinmarketcap")
+
+        if api_key is None:
+            logger.error("Failed to fetch CoinMarketCap API key!")
+            return None
+
+        params = {
+            'symbol': ','.join(symbols),
+            'convert': convert
+        }
+
+        headers = {
+            'X-CMC_PRO_API_KEY': api_key,
+            'Accept': 'application/json'
+        }
+
+        logger.info(f"Requesting data for symbols: {params['symbol']}")
+        response = self.session.get(self.url, headers=headers, params=params, timeout=self.timeout)
+
+        if response.status_code != 200:
+            logger.error(f"API error: {response.status_code} - {response.text}")
+            self.errors += 1
+            return None
+
+        logger.info("CMC data request successfully")
+        return response.json().get('data') or {}
+
+
+class CoinGeckoProvider(QuoteProvider):
+    """
+    CoinGecko coins/markets endpoint, used as the fallback source.
+
+    Symbols are mapped to CoinGecko ids through the 'coingecko_id' field
+    of config/coin_mappings.json.
+    """
+
+    name = 'coingecko'
+    batch_size = 250
+
+    def __init__(self, url=COINGECKO_MARKETS_URL, api_key=None, ids=None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.api_key = api_key
+        self.ids = ids
+
+    def get_ids(self):
+        if self.ids is not None:
+            return self.ids
+
+        return {
+            symbol: mapping['coingecko_id']
+            for symbol, mapping in load_json_file('./config/coin_mappings.json').items()
+            if mapping.get('coingecko_id')
+        }
+
+    def fetch_batch(self, symbols, convert):
+        ids = self.get_ids()
+        symbols_by_id = {ids[symbol]: symbol for symbol in symbols if symbol in ids}
+
+        if not symbols_by_id:
+            return {}
+
+        params = {
+            'vs_currency': convert.lower(),
+            'ids': ','.join(symbols_by_id),
+            'price_change_percentage': '24h,7d',
+            'per_page': self.batch_size,
+        }
+
+        headers = {'Accept': 'application/json'}
+        api_key = self.api_key or get_api_key("coingecko")
+        if api_key:
+            headers['x-cg-demo-api-key'] = api_key
+
+        response = self.session.get(self.url, headers=headers, params=params, timeout=self.timeout)
+
+        if response.status_code != 200:
+            logger.error(f"CoinGecko API error: {response.status_code} - {response.text}")
+            self.errors += 1
+            return None
+
+        data = {}
+        for market in response.json():
+            symbol = symbols_by_id.get(market.get('id'))
+            if symbol is None:
+                continue
+
+            data[symbol] = {
+                'name': market.get('name', symbol),
+                'symbol': symbol,
+                'quote': {
+                    convert: {
+                        'price': market.get('current_price'),
+                        'percent_change_24h': market.get('price_change_percentage_24h_in_currency') or 0,
+                        'percent_change_7d': market.get('price_change_percentage_7d_in_currency') or 0,
+                    }
+                }
+            }
+
+        return data
+
+
+class QuoteClient:
+    """
+    Fetches quotes from an ordered list of providers.
+
+    Symbols are split into each provider's batch size and the batches are
+    requested concurrently. Symbols the primary provider fails to return,
+    or does not return within slow_after seconds, are retried on the next
+    provider.
+    """
+
+    def __init__(self, providers, max_workers=8, slow_after=10):
+        self.providers = providers
+        self.slow_after = slow_after
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quotes')
+
+    def fetch(self, symbols, convert='USD'):
+        """
+        Fetch quotes for the given symbols.
+
+        Args:
+            symbols (list): List of cryptocurrency symbols
+            convert (str): Currency to convert prices to
+
+        Returns:
+            dict: Response shaped like the CoinMarketCap quotes response or
+                  None if no provider returned any quote
+        """
+        remaining = list(dict.fromkeys(symbols))
+        data = {}
+        sources = {}
+
+        for provider in self.providers:
+            if not remaining:
+                break
+
+            futures = [
+                self.executor.submit(provider.fetch, batch, convert)
+                for batch in split_batches(remaining, provider.batch_size)
+            ]
+
+            done, not_done = wait(futures, timeout=self.slow_after)
+
+            if not_done:
+                logger.warning(f"{provider.name}: {len(not_done)} batches slower than {self.slow_after}s, falling back")
+
+            for future in done:
+                for symbol, coin_data in (future.result() or {}).items():
+                    if symbol in remaining and coin_data:
+                        data[symbol] = coin_data
+                        sources[symbol] = provider.name
+
+            remaining = [symbol for symbol in remaining if symbol not in data]
+
+        if not data:
+            return None
+
+        if remaining:
+            logger.error(f"No quotes for symbols: {','.join(remaining)}")
+
+        return {'status': {'error_code': 0, 'sources': sources}, 'data': data}
+
+    def get_latency_stats(self):
+        """
+        Return the latency histogram of every provider.
+
+        Returns:
+            dict: Histogram snapshot and error count keyed by provider name
+        """
+        return {
+            provider.name: dict(provider.latency.snapshot(), errors=provider.errors)
+            for provider in self.providers
+        }
+
+
+quote_client = QuoteClient([CoinMarketCapProvider(), CoinGeckoProvider()])
+
+
+def request_crypto_data(symbols, convert='USD'):
+    """
+    Request cryptocurrency data from the quote providers, bypassing the quote cache.
 
     Args:
         symbols (list): List of cryptocurrency symbols (e.g., ['BTC', 'ETH'])
@@ -16,37 +289,178 @@ def get_crypto_data_by_symbols(symbols, convert='USD'):
     Returns:
         dict: JSON response with cryptocurrency data or None if request failed
     """
-    api_key = get_api_key("coinmarketcap")
+    return quote_client.fetch(symbols, convert)
 
-    if api_key is None:
-        logger.error("Failed to fetch CoinMarketCap API key!")
-        return None
 
-    logger.info(api_key)
-    symbols_str = ','.join(symbols)
-    url = 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest'
+class QuoteCache:
+    """
+    Per-symbol quote cache keyed by (symbol, convert).
 
-    params = {
-        'symbol': symbols_str,
-        'convert': convert
-    }
+    Only missing or stale symbols are requested upstream, and concurrent
+    callers asking for the same symbols share a single in-flight request.
+    """
 
-    headers = {
-        'X-CMC_PRO_API_KEY': api_key,
-        'Accept': 'application/json'
-    }
+    def __init__(self, fetcher=request_crypto_data, ttl=QUOTE_CACHE_TTL, clock=time.monotonic):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.clock = clock
 
-    try:
-        logger.info(f"Requesting data for symbols: {symbols_str}")
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        self._entries = {}
+        self._in_flight = {}
+        self._status = None
+        self._lock = threading.Lock()
 
-        if response.status_code == 200:
-            logger.info("CMC data request successfully")
-            return response.json()
-        else:
-            logger.error(f"API error: {response.status_code} - {response.text}")
-            return None
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'upstream_requests': 0, 'errors': 0}
+
+    def get(self, symbols, convert='USD', max_age=None):
+        """
+        Get quotes for the given symbols, fetching only what is missing or stale.
+
+        Args:
+            symbols (list): List of cryptocurrency symbols
+            convert (str): Currency to convert prices to
+            max_age (float, optional): Override of the cache TTL in seconds
+
+        Returns:
+            dict: Response shaped like the CoinMarketCap quotes response or None
+                  if no quote could be served for any symbol
+        """
+        ttl = self.ttl if max_age is None else max_age
+        symbols = list(dict.fromkeys(symbols))
+
+        to_fetch = []
+        to_wait = []
+
+        with self._lock:
+            now = self.clock()
+
+            for symbol in symbols:
+                key = (symbol, convert)
+                entry = self._entries.get(key)
+
+                if entry is not None and now - entry[0] <= ttl:
+                    self.stats['hits'] += 1
+                    continue
+
+                self.stats['stale' if entry is not None else 'misses'] += 1
+
+                if key in self._in_flight:
+                    to_wait.append(self._in_flight[key])
+                else:
+                    self._in_flight[key] = threading.Event()
+                    to_fetch.append(symbol)
+
+        if to_fetch:
+            self._fetch(to_fetch, convert)
 
-    except Exception as e:
-        logger.error(f"Request error: {str(e)}")
-        return None
+        for event in to_wait:
+            event.wait()
+
+        return self._build_response(symbols, convert)
+
+    def _fetch(self, symbols, convert):
+        """
+        Request the given symbols upstream and store the returned quotes.
+
+        Args:
+            symbols (list): Symbols claimed by this caller
+            convert (str): Currency to convert prices to
+        """
+        try:
+            with self._lock:
+                self.stats['upstream_requests'] += 1
+
+            response = self.fetcher(symbols, convert)
+
+            with self._lock:
+                if response is None:
+                    self.stats['errors'] += 1
+                    return
+
+                now = self.clock()
+                self._status = response.get('status')
+
+                for symbol, coin_data in (response.get('data') or {}).items():
+                    self._entries[(symbol, convert)] = (now, coin_data)
+
+            versions.bump('quotes')
+        except Exception as e:
+            logger.error(f"Quote cache fetch error: {str(e)}")
+
+            with self._lock:
+                self.stats['errors'] += 1
+        finally:
+            with self._lock:
+                for symbol in symbols:
+                    event = self._in_flight.pop((symbol, convert), None)
+                    if event is not None:
+                        event.set()
+
+    def _build_response(self, symbols, convert):
+        """
+        Merge cached quotes into the response shape expected by get_holdings.
+
+        Stale entries are still served when the upstream refresh failed.
+
+        Args:
+            symbols (list): Requested symbols
+            convert (str): Currency to convert prices to
+
+        Returns:
+            dict: Response with 'status' and 'data' keys or None
+        """
+        with self._lock:
+            data = {}
+            for symbol in symbols:
+                entry = self._entries.get((symbol, convert))
+                if entry is not None:
+                    data[symbol] = entry[1]
+
+            if not data:
+                return None
+
+            return {'status': self._status, 'data': data}
+
+    def invalidate(self, symbols=None, convert=None):
+        """
+        Drop cached quotes.
+
+        Args:
+            symbols (list, optional): Symbols to drop. Defaults to all.
+            convert (str, optional): Restrict to one convert currency.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if symbols is not None and key[0] not in symbols:
+                    continue
+                if convert is not None and key[1] != convert:
+                    continue
+                del self._entries[key]
+
+    def get_stats(self):
+        """
+        Return a copy of the hit/miss/stale counters.
+        """
+        with self._lock:
+            return dict(self.stats, size=len(self._entries))
+
+
+quote_cache = QuoteCache()
+
+
+@stage_metrics.timed('get_crypto_data_by_symbols')
+def get_crypto_data_by_symbols(symbols, convert='USD'):
+    """
+    Get cryptocurrency data from CoinMarketCap for specific symbols.
+
+    Quotes are served from the module quote cache; only missing or stale
+    symbols trigger an upstream request.
+
+    Args:
+        symbols (list): List of cryptocurrency symbols (e.g., ['BTC', 'ETH'])
+        convert (str): Currency to convert prices to
+
+    Returns:
+        dict: JSON response with cryptocurrency data or None if request failed
+    """
+    return quote_cache.get(symbols, convert)
@@ -0,0 +1,117 @@
+import gzip
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+}
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def fallback(value):
+    """
+    Serialise values the encoders do not know, such as NumPy scalars and datetimes.
+    """
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def available_formats():
+    return [fmt for fmt in MEDIA_TYPES if fmt != 'msgpack' or msgpack is not None]
+
+
+def available_encodings():
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+
+def negotiate_format(accept_mimetypes, requested=None):
+    """
+    Pick the body format from ?format= or the Accept header, JSON by default.
+
+    Args:
+        accept_mimetypes (werkzeug.datastructures.MIMEAccept): Accept header
+        requested (str, optional): Explicit format name
+
+    Returns:
+        str: Key of MEDIA_TYPES, or None if the requested format is unavailable
+    """
+    formats = available_formats()
+
+    if requested:
+        return requested if requested in formats else None
+
+    if 'msgpack' in formats and accept_mimetypes.best_match(
+            [MEDIA_TYPES['json'], MEDIA_TYPES['msgpack'], 'application/x-msgpack']) in (
+            MEDIA_TYPES['msgpack'], 'application/x-msgpack'):
+        return 'msgpack'
+
+    return 'json'
+
+
+def negotiate_encoding(accept_encodings):
+    """
+    Pick the content coding from the Accept-Encoding header.
+
+    Returns:
+        str: 'br', 'gzip' or None for identity
+    """
+    encoding = accept_encodings.best_match(available_encodings() + ['identity'], default='identity')
+    return None if encoding == 'identity' else encoding
+
+
+def encode(data, fmt='json'):
+    """
+    Serialise data as compact JSON (orjson when installed) or msgpack.
+
+    Returns:
+        bytes: Encoded body
+    """
+    if fmt == 'msgpack':
+        return msgpack.packb(data, default=fallback, use_bin_type=True)
+
+    if orjson is not None:
+        return orjson.dumps(data, default=fallback, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+    return json.dumps(data, default=fallback, separators=(',', ':')).encode()
+
+
+def compress(body, encoding):
+    """
+    Compress a body with the negotiated content coding.
+
+    Returns:
+        tuple: (body, content coding or None if sent as is)
+    """
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
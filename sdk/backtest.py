@@ -0,0 +1,383 @@
+import sys
+import time
+import logging
+import argparse
+
+import numpy as np
+
+from datetime import datetime, timezone
+from numpy.lib.stride_tricks import sliding_window_view
+
+from sdk import journal
+from sdk.candles import TIMEFRAMES, candle_store
+
+logger = logging.getLogger(__name__)
+
+# Defaults of a backtest run
+DEFAULT_STOP_LOSS = 0.02
+DEFAULT_TAKE_PROFIT = 0.04
+DEFAULT_MAX_BARS = 500
+DEFAULT_SIZE = 1000.0
+
+# Window cells resolved at once, bounds the memory of one chunk of entries
+RESOLVE_CHUNK_CELLS = 1 << 22
+
+# Trading sessions by UTC hour of the entry, as on the journal form
+SESSION_HOURS = (
+    (0, 'Asia'),
+    (7, 'London'),
+    (13, 'New York'),
+    (21, 'Overnight'),
+)
+
+EXIT_REASONS = ('stop', 'target', 'time')
+
+TRADE_DTYPE = np.dtype([
+    ('entry_index', '<i8'),
+    ('exit_index', '<i8'),
+    ('direction', '<i1'),
+    ('entry', '<f8'),
+    ('stop', '<f8'),
+    ('target', '<f8'),
+    ('exit', '<f8'),
+    ('profit', '<f8'),
+    ('reason', '<i1'),
+])
+
+
+def moving_average(values, window):
+    """
+    Simple moving average, NaN until the window is full.
+    """
+    result = np.full(len(values), np.nan)
+    if len(values) < window:
+        return result
+
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    result[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return result
+
+
+def sma_cross(candles, fast=20, slow=50, short=True):
+    """
+    Enter long when the fast average crosses above the slow one and short
+    when it crosses below.
+
+    Returns:
+        np.ndarray: Entry direction per bar, 1 long, -1 short, 0 none
+    """
+    close = candles['close']
+    above = moving_average(close, int(fast)) > moving_average(close, int(slow))
+
+    signals = np.zeros(len(close), dtype=np.int8)
+    signals[1:][above[1:] & ~above[:-1]] = 1
+    if short:
+        signals[1:][~above[1:] & above[:-1]] = -1
+
+    # Both averages must exist on both bars of a crossing
+    signals[:int(slow)] = 0
+    return signals
+
+
+def breakout(candles, lookback=20, short=True):
+    """
+    Enter when the close breaks the high or low of the previous bars.
+
+    Returns:
+        np.ndarray: Entry direction per bar, 1 long, -1 short, 0 none
+    """
+    lookback = int(lookback)
+    close = candles['close']
+    signals = np.zeros(len(close), dtype=np.int8)
+
+    if len(close) <= lookback:
+        return signals
+
+    highest = sliding_window_view(candles['high'], lookback)[:-1].max(axis=1)
+    lowest = sliding_window_view(candles['low'], lookback)[:-1].min(axis=1)
+
+    up = np.zeros(len(close), dtype=bool)
+    down = np.zeros(len(close), dtype=bool)
+    up[lookback:] = close[lookback:] > highest
+    down[lookback:] = close[lookback:] < lowest
+
+    # Only the first bar of a breakout is an entry
+    signals[1:][up[1:] & ~up[:-1]] = 1
+    if short:
+        signals[1:][down[1:] & ~down[:-1]] = -1
+
+    return signals
+
+
+STRATEGIES = {
+    'sma_cross': sma_cross,
+    'breakout': breakout,
+}
+
+
+class Backtest:
+    """
+    Simulates a strategy over OHLC candles, one position at a time.
+
+    Entries are filled at the close of the signal bar. The exits of every
+    candidate entry are resolved together: the following max_bars highs
+    and lows of each entry are compared with its stop and target as one
+    window matrix, and the first hit is found with argmax. A stop and a
+    target hit on the same bar count as the stop. Positions still open
+    after max_bars are closed at that bar's close.
+
+    Overlapping candidates are then dropped by following, from each taken
+    trade, the first candidate after its exit.
+    """
+
+    def __init__(self, candles, stop_loss=DEFAULT_STOP_LOSS, take_profit=DEFAULT_TAKE_PROFIT,
+                 max_bars=DEFAULT_MAX_BARS, size=DEFAULT_SIZE, leverage=1.0, fee=0.0):
+        self.candles = candles
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.max_bars = max_bars
+        self.size = size
+        self.leverage = leverage
+        self.fee = fee
+
+    def signals(self, strategy, **params):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}")
+
+        return STRATEGIES[strategy](self.candles, **params)
+
+    def resolve(self, entries, directions):
+        """
+        Find the exit of every candidate entry.
+
+        Args:
+            entries (np.ndarray): Bar indices of the entries, ascending
+            directions (np.ndarray): 1 long or -1 short per entry
+
+        Returns:
+            np.ndarray: TRADE_DTYPE records, profit included
+        """
+        candles = self.candles
+        count = len(candles['close'])
+        horizon = self.max_bars
+
+        # Row i of a window holds bars i + 1 ... i + horizon, NaN past the end
+        padding = np.full(horizon, np.nan)
+        highs = sliding_window_view(np.concatenate((candles['high'][1:], padding)), horizon)
+        lows = sliding_window_view(np.concatenate((candles['low'][1:], padding)), horizon)
+
+        trades = np.zeros(len(entries), dtype=TRADE_DTYPE)
+        trades['entry_index'] = entries
+        trades['direction'] = directions
+
+        entry = candles['close'][entries]
+        trades['entry'] = entry
+        trades['stop'] = entry * (1 - directions * self.stop_loss)
+        trades['target'] = entry * (1 + directions * self.take_profit)
+
+        chunk = max(1, RESOLVE_CHUNK_CELLS // horizon)
+        for lo in range(0, len(entries), chunk):
+            part = trades[lo:lo + chunk]
+            index = part['entry_index']
+            long = (part['direction'] > 0)[:, None]
+
+            high = highs[index]
+            low = lows[index]
+
+            stop = part['stop'][:, None]
+            target = part['target'][:, None]
+
+            stop_hits = np.where(long, low <= stop, high >= stop)
+            target_hits = np.where(long, high >= target, low <= target)
+
+            # argmax finds the first hit; rows without one get the horizon
+            stop_at = np.where(stop_hits.any(axis=1), stop_hits.argmax(axis=1), horizon)
+            target_at = np.where(target_hits.any(axis=1), target_hits.argmax(axis=1), horizon)
+
+            offset = np.minimum(stop_at, target_at)
+            reason = np.where(stop_at <= target_at, 0, 1)
+            reason[offset == horizon] = 2
+
+            exit_index = np.minimum(index + 1 + np.minimum(offset, horizon - 1), count - 1)
+            part['exit_index'] = exit_index
+            part['reason'] = reason
+
+            # Levels fill at their price unless the bar opened beyond them
+            bar_open = candles['open'][exit_index]
+            is_long = part['direction'] > 0
+            stop_fill = np.where(is_long, np.minimum(bar_open, part['stop']), np.maximum(bar_open, part['stop']))
+            target_fill = np.where(is_long, np.maximum(bar_open, part['target']), np.minimum(bar_open, part['target']))
+
+            part['exit'] = np.select(
+                [reason == 0, reason == 1],
+                [stop_fill, target_fill],
+                candles['close'][exit_index]
+            )
+
+        notional = self.size * self.leverage
+        trades['profit'] = (
+            notional * trades['direction'] * (trades['exit'] / trades['entry'] - 1)
+            - 2 * notional * self.fee
+        )
+
+        return trades
+
+    def run(self, strategy, **params):
+        """
+        Run a strategy of STRATEGIES.
+
+        Args:
+            strategy (str): Strategy name
+            **params: Strategy parameters
+
+        Returns:
+            np.ndarray: TRADE_DTYPE records of the trades taken
+        """
+        signals = self.signals(strategy, **params)
+
+        # Entries on the last bar have nothing to exit on
+        signals[-1:] = 0
+        entries = np.flatnonzero(signals)
+
+        candidates = self.resolve(entries, signals[entries].astype(np.int8))
+        if not len(candidates):
+            return candidates
+
+        # First candidate after each candidate's exit
+        following = np.searchsorted(entries, candidates['exit_index'], side='right')
+
+        taken = []
+        position = 0
+        while position < len(candidates):
+            taken.append(position)
+            position = following[position]
+
+        return candidates[taken]
+
+
+def summarize(trades):
+    """
+    Return the headline statistics of a run.
+    """
+    profit = trades['profit']
+    wins = profit > 0
+    losses = profit < 0
+
+    gross_loss = -profit[losses].sum()
+
+    equity = np.cumsum(profit)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0)) - equity
+
+    return {
+        'trades': len(trades),
+        'win_rate': round(float(wins.mean()) * 100, 2) if len(trades) else 0,
+        'net_profit': round(float(profit.sum()), 2),
+        'profit_factor': round(float(profit[wins].sum() / gross_loss), 2) if gross_loss else None,
+        'max_drawdown': round(float(drawdown.max()), 2) if len(trades) else 0,
+    }
+
+
+def session_of(hour):
+    session = SESSION_HOURS[0][1]
+    for start, name in SESSION_HOURS:
+        if hour >= start:
+            session = name
+    return session
+
+
+def trade_rows(trades, candles, pair, strategy, size=DEFAULT_SIZE, leverage=1.0):
+    """
+    Convert simulated trades to journal rows.
+
+    Returns:
+        list: Trade dicts keyed by storage.TRADE_COLUMNS
+    """
+    rows = []
+    timestamps = candles['ts']
+
+    for trade in trades.tolist():
+        entry_index, exit_index, direction, entry, stop, target, exit_price, profit, reason = trade
+        opened = datetime.fromtimestamp(int(timestamps[entry_index]), timezone.utc)
+
+        rows.append({
+            'date': opened.strftime('%Y-%m-%d'),
+            'pair': pair,
+            'type': 'Buy' if direction > 0 else 'Sell',
+            'entry': round(entry, 8),
+            'stopLoss': round(stop, 8),
+            'takeProfit': round(target, 8),
+            'exit': round(exit_price, 8),
+            'profit': round(profit, 2),
+            'size': size,
+            'leverage': leverage,
+            'strategy': strategy,
+            'result': 'Win' if profit > 0 else 'Loss' if profit < 0 else 'Break Even',
+            'confidence': None,
+            'session': session_of(opened.hour),
+            'note': f"Backtest {EXIT_REASONS[reason]} exit after {exit_index - entry_index} bars",
+        })
+
+    return rows
+
+
+def parse_params(values):
+    """
+    Parse name=value strategy parameters, as numbers where possible.
+    """
+    params = {}
+    for value in values or []:
+        name, _, raw = value.partition('=')
+        if raw.lower() in ('true', 'false'):
+            params[name] = raw.lower() == 'true'
+            continue
+        try:
+            params[name] = float(raw) if '.' in raw else int(raw)
+        except ValueError:
+            params[name] = raw
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backtest a strategy over the stored candles.')
+    parser.add_argument('symbol', help='Coin symbol')
+    parser.add_argument('--tf', choices=list(TIMEFRAMES), default='1h', help='Timeframe')
+    parser.add_argument('--days', type=int, default=365, help='Days of candles to test')
+    parser.add_argument('--strategy', choices=list(STRATEGIES), default='sma_cross')
+    parser.add_argument('--param', action='append', help='Strategy parameter as name=value')
+    parser.add_argument('--stop-loss', type=float, default=DEFAULT_STOP_LOSS, help='Fraction of the entry')
+    parser.add_argument('--take-profit', type=float, default=DEFAULT_TAKE_PROFIT, help='Fraction of the entry')
+    parser.add_argument('--max-bars', type=int, default=DEFAULT_MAX_BARS, help='Bars before a time exit')
+    parser.add_argument('--size', type=float, default=DEFAULT_SIZE)
+    parser.add_argument('--leverage', type=float, default=1.0)
+    parser.add_argument('--fee', type=float, default=0.0, help='Fee per side as a fraction of the notional')
+    parser.add_argument('--save', action='store_true', help='Store the trades for the journal pages')
+    args = parser.parse_args(argv)
+
+    symbol = args.symbol.upper()
+    end = int(time.time())
+    start = end - args.days * TIMEFRAMES['1d']
+
+    candle_store.backfill(symbol, args.tf, start, end)
+    candles = candle_store.get(symbol, args.tf, start, end)
+
+    if len(candles) < 2:
+        print(f"No {args.tf} candles of {symbol}")
+        return 1
+
+    backtest = Backtest(candles, args.stop_loss, args.take_profit, args.max_bars, args.size, args.leverage, args.fee)
+    trades = backtest.run(args.strategy, **parse_params(args.param))
+
+    for name, value in summarize(trades).items():
+        print(f"{name:>14}: {value}")
+
+    if args.save:
+        pair = f'{symbol}USD'
+        rows = trade_rows(trades, candles, pair, args.strategy, args.size, args.leverage)
+        journal.replace_backtest_trades(pair, args.strategy, rows)
+        print(f"Stored {len(rows)} trades as {pair} {args.strategy}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import sys
+import time
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from collections import OrderedDict
+
+from sdk import storage
+from sdk.api_client import create_session
+from sdk.variables_fetcher import load_json_file
+
+logger = logging.getLogger(__name__)
+
+BINANCE_KLINES_URL = 'https://api.binance.com/api/v3/klines'
+
+# Candle length in seconds per timeframe
+TIMEFRAMES = {
+    '1m': 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60,
+}
+
+CANDLE_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+# Series kept in memory by a CandleStore
+CANDLE_CACHE_SIZE = 64
+
+
+def load_candle_symbols():
+    """
+    Load the symbols candles are kept for.
+
+    Returns:
+        list: Symbols of config/coin_mappings.json
+    """
+    return list(load_json_file('./config/coin_mappings.json'))
+
+
+def align(ts, tf):
+    """
+    Round an epoch timestamp down to the open time of its candle.
+    """
+    seconds = TIMEFRAMES[tf]
+    return int(ts) // seconds * seconds
+
+
+def find_gaps(ts, tf, start, end):
+    """
+    Find the candle open times missing from a series.
+
+    Args:
+        ts (np.ndarray): Sorted open times present in [start, end)
+        tf (str): Timeframe
+        start (int): Inclusive range start, epoch seconds
+        end (int): Exclusive range end, epoch seconds
+
+    Returns:
+        list: (gap start, gap end) pairs of missing open times, end exclusive
+    """
+    seconds = TIMEFRAMES[tf]
+    first = -(-int(start) // seconds) * seconds
+    last = align(end - 1, tf) + seconds
+
+    if first >= last:
+        return []
+
+    bounds = np.concatenate(([first - seconds], np.asarray(ts, dtype=np.int64), [last]))
+    missing = np.flatnonzero(np.diff(bounds) > seconds)
+
+    return [(int(bounds[i]) + seconds, int(bounds[i + 1])) for i in missing]
+
+
+class CandleProvider:
+    """
+    Base class of a candle source.
+
+    Subclasses declare how many candles one request may return and
+    implement fetch_candles.
+    """
+
+    name = 'provider'
+    max_candles = 500
+
+    def fetch_candles(self, symbol, tf, start, end):
+        """
+        Fetch candles with open times in [start, end).
+
+        Returns:
+            list: (ts, open, high, low, close, volume) rows in time order,
+                  or None if the request failed
+        """
+        raise NotImplementedError
+
+
+class BinanceCandleProvider(CandleProvider):
+    """
+    Binance klines endpoint, quoting every symbol against USDT.
+    """
+
+    name = 'binance'
+    max_candles = 1000
+
+    def __init__(self, url=BINANCE_KLINES_URL, quote='USDT', timeout=30, session=None):
+        self.url = url
+        self.quote = quote
+        self.timeout = timeout
+        self.session = session or create_session()
+
+    def fetch_candles(self, symbol, tf, start, end):
+        params = {
+            'symbol': f'{symbol}{self.quote}',
+            'interval': tf,
+            'startTime': int(start) * 1000,
+            'endTime': int(end) * 1000 - 1,
+            'limit': self.max_candles,
+        }
+
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"{self.name} request error: {str(e)}")
+            return None
+
+        if response.status_code != 200:
+            logger.error(f"Binance API error: {response.status_code} - {response.text}")
+            return None
+
+        return [
+            (int(kline[0]) // 1000, float(kline[1]), float(kline[2]), float(kline[3]), float(kline[4]), float(kline[5]))
+            for kline in response.json()
+        ]
+
+
+class CandleStore:
+    """
+    OHLC candles per symbol and timeframe, stored in SQLite and served
+    from an LRU cache of NumPy series.
+
+    Each cached entry holds the structured array of one (symbol, timeframe)
+    over the range it was loaded for. Queries inside that range are sliced
+    with a binary search; anything else reloads the union of both ranges.
+    """
+
+    def __init__(self, provider=None, cache_size=CANDLE_CACHE_SIZE, db_file=None, clock=time.time):
+        self.provider = provider
+        self.cache_size = cache_size
+        self.db_file = db_file
+        self.clock = clock
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Ranges the provider had no candles for or failed on, so they are not refetched
+        self._empty = set()
+
+    def _cached(self, symbol, tf, start, end):
+        key = (symbol, tf)
+
+        with self._lock:
+            entry = self._cache.get(key)
+
+            if entry is not None:
+                self._cache.move_to_end(key)
+                loaded_start, loaded_end, series = entry
+
+                if loaded_start <= start and end <= loaded_end:
+                    return series
+
+                start = min(start, loaded_start)
+                end = max(end, loaded_end)
+
+        series = np.array(storage.load_candles(symbol, tf, start, end, self.db_file), dtype=CANDLE_DTYPE)
+
+        with self._lock:
+            self._cache[key] = (start, end, series)
+            self._cache.move_to_end(key)
+
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return series
+
+    def invalidate(self, symbol=None, tf=None):
+        """
+        Drop cached series, all of them by default.
+        """
+        with self._lock:
+            for key in list(self._cache):
+                if (symbol is None or key[0] == symbol) and (tf is None or key[1] == tf):
+                    del self._cache[key]
+
+    def get(self, symbol, tf, start, end):
+        """
+        Return the stored candles with open times in [start, end).
+
+        Args:
+            symbol (str): Coin symbol
+            tf (str): One of TIMEFRAMES
+            start (int): Inclusive range start, epoch seconds
+            end (int): Exclusive range end, epoch seconds
+
+        Returns:
+            np.ndarray: CANDLE_DTYPE records in time order
+        """
+        if tf not in TIMEFRAMES:
+            raise ValueError(f"Unknown timeframe: {tf}")
+
+        series = self._cached(symbol, tf, int(start), int(end))
+        lo, hi = np.searchsorted(series['ts'], [start, end])
+
+        return series[lo:hi]
+
+    def closes(self, symbol, tf, start, end):
+        """
+        Return (open times, closes) arrays of a range.
+        """
+        series = self.get(symbol, tf, start, end)
+        return series['ts'], series['close']
+
+    def gaps(self, symbol, tf, start, end):
+        """
+        Return the missing candle ranges of [start, end), see find_gaps.
+
+        The candle still open at the current time is never a gap.
+        """
+        end = min(int(end), align(self.clock(), tf))
+        return find_gaps(self.get(symbol, tf, start, end)['ts'], tf, start, end)
+
+    def backfill(self, symbol, tf, start, end):
+        """
+        Fetch and store the missing candles of a range from the provider.
+
+        Args:
+            symbol (str): Coin symbol
+            tf (str): One of TIMEFRAMES
+            start (int): Inclusive range start, epoch seconds
+            end (int): Exclusive range end, epoch seconds
+
+        Returns:
+            int: Number of candles stored
+        """
+        if self.provider is None:
+            raise ValueError("CandleStore has no provider to backfill from")
+
+        seconds = TIMEFRAMES[tf]
+        stored = 0
+
+        for gap_start, gap_end in self.gaps(symbol, tf, start, end):
+            if (symbol, tf, gap_start, gap_end) in self._empty:
+                continue
+
+            fetched = 0
+            chunk_start = gap_start
+            while chunk_start < gap_end:
+                chunk_end = min(gap_end, chunk_start + self.provider.max_candles * seconds)
+
+                candles = self.provider.fetch_candles(symbol, tf, chunk_start, chunk_end)
+                if candles is None:
+                    # Failures such as an unlisted pair would fail again on every call
+                    self._empty.add((symbol, tf, gap_start, gap_end))
+                    break
+
+                candles = [candle for candle in candles if chunk_start <= candle[0] < chunk_end]
+                if candles:
+                    storage.save_candles(symbol, tf, candles, self.db_file)
+                    fetched += len(candles)
+
+                chunk_start = chunk_end
+            else:
+                if not fetched:
+                    self._empty.add((symbol, tf, gap_start, gap_end))
+
+            stored += fetched
+
+        if stored:
+            self.invalidate(symbol, tf)
+            logger.info(f"Backfilled {stored} {tf} candles of {symbol}")
+
+        return stored
+
+    def update(self, tf, symbols=None, lookback=None):
+        """
+        Backfill each symbol from its latest stored candle up to now.
+
+        Args:
+            tf (str): One of TIMEFRAMES
+            symbols (list, optional): Defaults to load_candle_symbols()
+            lookback (int, optional): Seconds of history for symbols without
+                                      candles. Defaults to 1000 candles.
+
+        Returns:
+            dict: Candles stored keyed by symbol
+        """
+        now = int(self.clock())
+        lookback = lookback or 1000 * TIMEFRAMES[tf]
+        stored = {}
+
+        for symbol in symbols or load_candle_symbols():
+            last = storage.last_candle_ts(symbol, tf, self.db_file)
+            start = last + TIMEFRAMES[tf] if last is not None else now - lookback
+            stored[symbol] = self.backfill(symbol, tf, start, now)
+
+        return stored
+
+
+candle_store = CandleStore(BinanceCandleProvider())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill OHLC candles of the configured coins.')
+    parser.add_argument('--tf', choices=list(TIMEFRAMES), default='1d', help='Timeframe')
+    parser.add_argument('--days', type=int, default=365, help='Days of history to fill')
+    parser.add_argument('symbols', nargs='*', help='Defaults to config/coin_mappings.json')
+    args = parser.parse_args(argv)
+
+    now = int(time.time())
+    for symbol in args.symbols or load_candle_symbols():
+        stored = candle_store.backfill(symbol, args.tf, now - args.days * TIMEFRAMES['1d'], now)
+        print(f"{symbol}: {stored} {args.tf} candles")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
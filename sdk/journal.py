@@ -0,0 +1,258 @@
+import json
+import base64
+import logging
+import threading
+
+from datetime import date, timedelta
+
+from sdk import storage
+from sdk.portoflio import versions
+
+logger = logging.getLogger(__name__)
+
+# Tables with the trades schema the journal pages can show
+JOURNAL_TABLES = {
+    'journal': 'trades',
+    'backtest': 'backtest_trades',
+}
+
+# Columns that can be filtered on with an exact match
+JOURNAL_FILTERS = ('pair', 'strategy', 'result', 'session', 'confidence')
+
+# Sort options of the history page: (column, direction)
+JOURNAL_SORTS = {
+    'date_desc': ('date', 'DESC'),
+    'date_asc': ('date', 'ASC'),
+    'profit_desc': ('profit', 'DESC'),
+    'profit_asc': ('profit', 'ASC'),
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Distinct column values shown in the filter dropdowns per table, rebuilt after /add
+_distinct_cache = {}
+_distinct_lock = threading.Lock()
+
+
+def encode_cursor(row, sort_column):
+    """
+    Encode the keyset position after a row as an opaque string.
+    """
+    payload = json.dumps([row[sort_column], row['id']]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created by encode_cursor.
+
+    Returns:
+        tuple: (sort value, id) or None if the cursor is malformed
+    """
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_date_range(args, today=None):
+    """
+    Turn the date_range filter of the history page into ISO date bounds.
+
+    Args:
+        args (dict): Request arguments with date_range and, for 'custom',
+            start_date and end_date (YYYY-MM-DD, both inclusive)
+        today (date, optional): Reference day. Defaults to today.
+
+    Returns:
+        tuple: Inclusive ISO lower bound and exclusive ISO upper bound, or None for each
+    """
+    today = today or date.today()
+    date_range = args.get('date_range') or ''
+
+    presets = {
+        'today': (today, today),
+        'yesterday': (today - timedelta(days=1), today - timedelta(days=1)),
+        'last_7_days': (today - timedelta(days=6), today),
+        'last_30_days': (today - timedelta(days=29), today),
+        'this_week': (today - timedelta(days=today.weekday()), today),
+        'this_month': (today.replace(day=1), today),
+    }
+
+    if date_range in presets:
+        first, last = presets[date_range]
+        return first.isoformat(), (last + timedelta(days=1)).isoformat()
+
+    if date_range != 'custom':
+        return None, None
+
+    start = end = None
+    try:
+        if args.get('start_date'):
+            start = date.fromisoformat(args['start_date']).isoformat()
+        if args.get('end_date'):
+            end = (date.fromisoformat(args['end_date']) + timedelta(days=1)).isoformat()
+    except ValueError:
+        logger.warning(f"Ignoring invalid journal date range: {args.get('start_date')} - {args.get('end_date')}")
+        return None, None
+
+    return start, end
+
+
+def get_table(source):
+    """
+    Return the table of a JOURNAL_TABLES source, the journal by default.
+    """
+    return JOURNAL_TABLES.get(source, JOURNAL_TABLES['journal'])
+
+
+def query_trades(filters=None, start=None, end=None, sort='date_desc', cursor=None, limit=DEFAULT_PAGE_SIZE,
+                 source='journal', db_file=None):
+    """
+    Return one page of journaled trades.
+
+    Pages are read with keyset pagination on (sort column, id), so the cost
+    of a page does not grow with its position in the journal.
+
+    Args:
+        filters (dict, optional): Exact-match values keyed by JOURNAL_FILTERS column
+        start (str, optional): Inclusive lower bound on the trade date
+        end (str, optional): Exclusive upper bound on the trade date
+        sort (str): One of JOURNAL_SORTS
+        cursor (str, optional): Cursor returned with the previous page
+        limit (int): Page size, capped at MAX_PAGE_SIZE
+        source (str): One of JOURNAL_TABLES
+
+    Returns:
+        tuple: (list of sqlite3.Row in TRADE_COLUMNS order after id, cursor of
+                the next page or None)
+    """
+    sort_column, direction = JOURNAL_SORTS.get(sort, JOURNAL_SORTS['date_desc'])
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    conditions = []
+    params = []
+
+    for column in JOURNAL_FILTERS:
+        value = (filters or {}).get(column)
+        if value not in (None, ''):
+            conditions.append(f'{column} = ?')
+            params.append(value)
+
+    if start:
+        conditions.append('date >= ?')
+        params.append(start)
+    if end:
+        conditions.append('date < ?')
+        params.append(end)
+
+    key = decode_cursor(cursor) if cursor else None
+    if key is not None:
+        operator = '<' if direction == 'DESC' else '>'
+        conditions.append(f'({sort_column}, id) {operator} (?, ?)')
+        params.extend(key)
+
+    query = f"SELECT id, {', '.join(storage.TRADE_COLUMNS)} FROM {get_table(source)}"
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f' ORDER BY {sort_column} {direction}, id {direction} LIMIT ?'
+    params.append(limit + 1)
+
+    with storage.connect(db_file) as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1], sort_column)
+
+    return rows, next_cursor
+
+
+def get_distinct_values(source='journal', db_file=None):
+    """
+    Return the distinct pairs, strategies and sessions of the journal.
+
+    The lists are cached until invalidate_distinct_values is called.
+
+    Args:
+        source (str): One of JOURNAL_TABLES
+
+    Returns:
+        dict: Sorted value lists keyed by 'pairs', 'strategies' and 'sessions'
+    """
+    table = get_table(source)
+
+    with _distinct_lock:
+        if table in _distinct_cache:
+            return _distinct_cache[table]
+
+    with storage.connect(db_file) as conn:
+        values = {
+            name: [
+                row[0] for row in
+                conn.execute(f'SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column}')
+            ]
+            for name, column in (('pairs', 'pair'), ('strategies', 'strategy'), ('sessions', 'session'))
+        }
+
+    with _distinct_lock:
+        _distinct_cache[table] = values
+
+    return values
+
+
+def invalidate_distinct_values(source='journal'):
+    with _distinct_lock:
+        _distinct_cache.pop(get_table(source), None)
+
+
+def add_trade(values, db_file=None):
+    """
+    Store a journaled trade.
+
+    Args:
+        values (dict): Trade fields keyed by TRADE_COLUMNS
+
+    Returns:
+        int: Id of the new trade
+    """
+    with storage.connect(db_file) as conn:
+        cursor = conn.execute(
+            f"INSERT INTO trades ({', '.join(storage.TRADE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(storage.TRADE_COLUMNS))})",
+            [values[column] for column in storage.TRADE_COLUMNS]
+        )
+
+    invalidate_distinct_values()
+    versions.bump('journal')
+
+    return cursor.lastrowid
+
+
+def replace_backtest_trades(pair, strategy, trades, db_file=None):
+    """
+    Replace the simulated trades of one pair and strategy.
+
+    Args:
+        pair (str): Traded pair
+        strategy (str): Strategy name
+        trades (list): Trade dicts keyed by TRADE_COLUMNS
+
+    Returns:
+        int: Number of trades stored
+    """
+    with storage.connect(db_file) as conn:
+        with storage.transaction(conn):
+            conn.execute('DELETE FROM backtest_trades WHERE pair = ? AND strategy = ?', (pair, strategy))
+            conn.executemany(
+                f"INSERT INTO backtest_trades ({', '.join(storage.TRADE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(storage.TRADE_COLUMNS))})",
+                [[trade[column] for column in storage.TRADE_COLUMNS] for trade in trades]
+            )
+
+    invalidate_distinct_values('backtest')
+
+    return len(trades)
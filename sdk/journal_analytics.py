@@ -0,0 +1,292 @@
+import json
+import logging
+import threading
+
+import numpy as np
+
+from sdk import storage
+from sdk.portoflio.history import lttb_indices
+from sdk.portoflio.versions import VersionedCache, get_versions
+
+logger = logging.getLogger(__name__)
+
+# Dimensions the journal metrics are grouped by
+JOURNAL_GROUPS = ('strategy', 'pair', 'session', 'confidence')
+
+# Confidence buckets: (label, lowest confidence included)
+CONFIDENCE_BUCKETS = (('low', 0), ('medium', 4), ('high', 7))
+
+NUMERIC_COLUMNS = ('entry', 'stopLoss', 'exit', 'profit')
+TEXT_COLUMNS = ('date', 'pair', 'type', 'strategy', 'session')
+
+# Points kept per equity curve
+EQUITY_CURVE_POINTS = 200
+
+_response_cache = VersionedCache()
+
+
+def to_float(values):
+    """
+    Convert column values to float64, mapping empty or invalid values to NaN.
+    """
+    result = np.full(len(values), np.nan)
+
+    for i, value in enumerate(values):
+        try:
+            result[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+
+    return result
+
+
+def confidence_buckets(confidence):
+    """
+    Map confidence scores to CONFIDENCE_BUCKETS labels.
+
+    Args:
+        confidence (np.ndarray): Scores, NaN when missing
+
+    Returns:
+        np.ndarray: Bucket label per trade, 'unknown' for missing scores
+    """
+    labels = np.array([label for label, _ in CONFIDENCE_BUCKETS] + ['unknown'], dtype=object)
+    bounds = [lowest for _, lowest in CONFIDENCE_BUCKETS[1:]]
+
+    index = np.searchsorted(bounds, confidence, side='right')
+    index[np.isnan(confidence)] = len(CONFIDENCE_BUCKETS)
+
+    return labels[index]
+
+
+def r_multiples(trade_type, entry, stop, exit_price):
+    """
+    Compute the realised R-multiple of each trade.
+
+    Risk is the distance between entry and stop loss; the result is NaN when
+    it is zero or a price is missing.
+
+    Args:
+        trade_type (np.ndarray): 'Buy' or 'Sell' per trade
+        entry (np.ndarray): Entry prices
+        stop (np.ndarray): Stop-loss prices
+        exit_price (np.ndarray): Exit prices
+
+    Returns:
+        np.ndarray: R-multiples
+    """
+    risk = np.abs(entry - stop)
+    direction = np.where(trade_type == 'Sell', -1.0, 1.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = direction * (exit_price - entry) / risk
+
+    r[~np.isfinite(r)] = np.nan
+    return r
+
+
+def max_consecutive_losses(groups, losses, group_count, order=None):
+    """
+    Longest run of losing trades per group.
+
+    Args:
+        groups (np.ndarray): Group index per trade, trades in chronological order
+        losses (np.ndarray): True for losing trades
+        group_count (int): Number of groups
+        order (np.ndarray, optional): Stable argsort of groups, computed if omitted
+
+    Returns:
+        np.ndarray: Longest losing streak per group
+    """
+    result = np.zeros(group_count, dtype=np.int64)
+
+    if len(groups) == 0:
+        return result
+
+    # Stable sort keeps the chronological order within each group
+    if order is None:
+        order = np.argsort(groups, kind='stable')
+    sorted_groups = groups[order]
+    sorted_losses = losses[order]
+
+    # A new run starts on every non-loss and at every group boundary
+    breaks = ~sorted_losses | np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+    runs = np.cumsum(breaks)
+
+    run_lengths = np.bincount(runs, weights=sorted_losses)
+    run_groups = np.zeros(len(run_lengths), dtype=np.int64)
+    run_groups[runs] = sorted_groups
+
+    np.maximum.at(result, run_groups, run_lengths.astype(np.int64))
+
+    return result
+
+
+def equity_curve(dates, profit, points=EQUITY_CURVE_POINTS):
+    """
+    Cumulative profit of trades in chronological order, downsampled with LTTB.
+
+    Returns:
+        list: [date, equity] pairs
+    """
+    equity = np.cumsum(np.nan_to_num(profit))
+    indices = lttb_indices(np.arange(len(equity)), equity, points)
+
+    return [[dates[i], round(float(equity[i]), 2)] for i in indices]
+
+
+def group_metrics(keys, profit, r, dates):
+    """
+    Compute the journal metrics of every group in one vectorised pass.
+
+    Args:
+        keys (np.ndarray): Group key per trade, trades in chronological order
+        profit (np.ndarray): Profit per trade
+        r (np.ndarray): R-multiple per trade
+        dates (np.ndarray): Trade dates
+
+    Returns:
+        dict: Metrics keyed by group
+    """
+    names, groups = np.unique(keys.astype(str), return_inverse=True)
+    count = len(names)
+
+    pnl = np.nan_to_num(profit)
+    wins = pnl > 0
+    losses = pnl < 0
+    valid_r = ~np.isnan(r)
+
+    trades = np.bincount(groups, minlength=count)
+    win_count = np.bincount(groups, weights=wins, minlength=count)
+    total = np.bincount(groups, weights=pnl, minlength=count)
+    gross_profit = np.bincount(groups, weights=np.where(wins, pnl, 0), minlength=count)
+    gross_loss = -np.bincount(groups, weights=np.where(losses, pnl, 0), minlength=count)
+    r_count = np.bincount(groups, weights=valid_r, minlength=count)
+    r_total = np.bincount(groups, weights=np.where(valid_r, r, 0), minlength=count)
+    # One stable sort splits the trades into chronological runs per group
+    order = np.argsort(groups, kind='stable')
+    boundaries = np.cumsum(trades)[:-1]
+    group_dates = np.split(dates[order], boundaries)
+    group_profit = np.split(profit[order], boundaries)
+
+    streaks = max_consecutive_losses(groups, losses, count, order)
+
+    metrics = {}
+    for i, name in enumerate(names):
+        metrics[name] = {
+            'trades': int(trades[i]),
+            'win_rate': round(win_count[i] / trades[i] * 100, 2),
+            'expectancy': round(total[i] / trades[i], 2),
+            'average_r': round(r_total[i] / r_count[i], 2) if r_count[i] else None,
+            'profit_factor': round(gross_profit[i] / gross_loss[i], 2) if gross_loss[i] else None,
+            'max_consecutive_losses': int(streaks[i]),
+            'total_profit': round(total[i], 2),
+            'equity_curve': equity_curve(group_dates[i], group_profit[i]),
+        }
+
+    return metrics
+
+
+class JournalAnalytics:
+    """
+    Columnar copy of the trades table, extended with new rows on refresh.
+    """
+
+    def __init__(self, db_file=None):
+        self.db_file = db_file
+        self.columns = None
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Load trades added since the last refresh and keep the columns in
+        (date, id) order.
+
+        Returns:
+            int: Number of new trades
+        """
+        with self._lock:
+            with storage.connect(self.db_file) as conn:
+                rows = conn.execute(
+                    f"SELECT id, confidence, {', '.join(TEXT_COLUMNS + NUMERIC_COLUMNS)} FROM trades "
+                    f"WHERE id > ? ORDER BY id",
+                    (self.last_id,)
+                ).fetchall()
+
+            if not rows:
+                return 0
+
+            new = {'id': np.array([row['id'] for row in rows], dtype=np.int64)}
+            new['confidence'] = to_float([row['confidence'] for row in rows])
+            for column in TEXT_COLUMNS:
+                new[column] = np.array([row[column] or '' for row in rows], dtype=object)
+            for column in NUMERIC_COLUMNS:
+                new[column] = to_float([row[column] for row in rows])
+
+            if self.columns is None:
+                columns = new
+            else:
+                columns = {name: np.concatenate([self.columns[name], new[name]]) for name in self.columns}
+
+            order = np.lexsort((columns['id'], columns['date'].astype(str)))
+            self.columns = {name: values[order] for name, values in columns.items()}
+            self.last_id = int(new['id'][-1])
+
+            return len(rows)
+
+    def compute(self):
+        """
+        Compute the overall and grouped journal metrics.
+
+        Returns:
+            dict: 'overall' metrics and one dict of group metrics per JOURNAL_GROUPS entry
+        """
+        self.refresh()
+
+        columns = self.columns
+        if columns is None:
+            return {'overall': None, **{f'by_{group}': {} for group in JOURNAL_GROUPS}}
+
+        r = r_multiples(columns['type'], columns['entry'], columns['stopLoss'], columns['exit'])
+        dates = columns['date']
+        profit = columns['profit']
+
+        keys = {
+            'strategy': columns['strategy'],
+            'pair': columns['pair'],
+            'session': columns['session'],
+            'confidence': confidence_buckets(columns['confidence']),
+        }
+
+        result = {'overall': group_metrics(np.full(len(dates), 'all'), profit, r, dates)['all']}
+        for group in JOURNAL_GROUPS:
+            result[f'by_{group}'] = group_metrics(keys[group], profit, r, dates)
+
+        return result
+
+
+journal_analytics = JournalAnalytics()
+
+
+def get_journal_analytics():
+    """
+    Return the journal metrics, recomputed only after a trade is added.
+
+    Returns:
+        dict: See JournalAnalytics.compute
+    """
+    return _response_cache.get('journal', get_versions()['journal'], journal_analytics.compute)
+
+
+def get_journal_analytics_json():
+    """
+    Return the journal metrics serialized once per journal version.
+
+    Returns:
+        tuple: (journal version, JSON string)
+    """
+    version = get_versions()['journal']
+    body = _response_cache.get('journal_json', version, lambda: json.dumps(get_journal_analytics()))
+
+    return version, body
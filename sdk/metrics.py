@@ -0,0 +1,312 @@
+import time
+import bisect
+import functools
+import threading
+
+from contextlib import contextmanager
+
+# Latency bucket upper bounds in seconds
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Trace of the request running on the current thread, see bind_trace
+_local = threading.local()
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, thread safe.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Record one observation.
+
+        Args:
+            value (float): Observed value, in seconds for latencies
+        """
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        """
+        Return the histogram state.
+
+        Returns:
+            dict: buckets as (upper bound, cumulative count) pairs, count and sum
+        """
+        with self._lock:
+            cumulative = []
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+                total += count
+                cumulative.append((bound, total))
+
+            return {'buckets': cumulative, 'count': self.count, 'sum': self.sum}
+
+
+def format_labels(labels):
+    """
+    Format Prometheus labels, escaping their values.
+    """
+    if not labels:
+        return ''
+
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_histogram(name, labels, snapshot):
+    """
+    Format a histogram snapshot as Prometheus text exposition lines.
+
+    Args:
+        name (str): Metric name without the _bucket/_sum/_count suffix
+        labels (dict): Labels of the series
+        snapshot (dict): Result of Histogram.snapshot()
+
+    Returns:
+        list: Exposition lines
+    """
+    lines = []
+
+    for bound, count in snapshot['buckets']:
+        le = '+Inf' if bound == float('inf') else repr(float(bound))
+        lines.append(f"{name}_bucket{format_labels(dict(labels, le=le))} {count}")
+
+    lines.append(f"{name}_sum{format_labels(labels)} {snapshot['sum']!r}")
+    lines.append(f"{name}_count{format_labels(labels)} {snapshot['count']}")
+
+    return lines
+
+
+class Trace:
+    """
+    Stages timed while serving one request, possibly on several threads.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []
+
+        self._lock = threading.Lock()
+
+    def add(self, stage, start, elapsed):
+        with self._lock:
+            self.spans.append((start - self.start, elapsed, stage, threading.current_thread().name))
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def format(self):
+        """
+        Format the spans in start order, one per line.
+        """
+        with self._lock:
+            spans = sorted(self.spans)
+
+        return '\n'.join(
+            f"  +{offset * 1000:8.1f} ms {elapsed * 1000:8.1f} ms  {stage} [{thread}]"
+            for offset, elapsed, stage, thread in spans
+        )
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def start_trace(name):
+    """
+    Start recording the stages run on this thread into a new trace.
+
+    Returns:
+        Trace: The started trace
+    """
+    trace = _local.trace = Trace(name)
+    return trace
+
+
+def end_trace():
+    """
+    Stop recording the trace started by start_trace.
+
+    Returns:
+        Trace: The trace, or None if none was started
+    """
+    trace = current_trace()
+    _local.trace = None
+    return trace
+
+
+@contextmanager
+def bind_trace(trace):
+    """
+    Record the stages run on this thread into trace until the block exits.
+    """
+    previous = current_trace()
+    _local.trace = trace
+
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+class StageMetrics:
+    """
+    Latency histograms, error counts and bytes read per named stage.
+
+    Stages are timed with the stage() context manager or the timed()
+    decorator. Each timed stage is also added to the trace bound to the
+    current thread, if any.
+
+    Args:
+        prefix (str): Metric name prefix
+        label (str): Label carrying the stage name
+        buckets (tuple): Latency bucket upper bounds in seconds
+    """
+
+    def __init__(self, prefix, label='stage', buckets=DEFAULT_LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.label = label
+        self.buckets = buckets
+
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {'latency': Histogram(self.buckets), 'errors': 0, 'bytes': 0}
+            return stage
+
+    def observe(self, name, elapsed, start=None, error=False):
+        """
+        Record one run of a stage.
+
+        Args:
+            name (str): Stage name
+            elapsed (float): Duration in seconds
+            start (float, optional): perf_counter() value at the start, for the trace
+            error (bool): Whether the stage raised
+        """
+        stage = self._get(name)
+        stage['latency'].observe(elapsed)
+
+        if error:
+            with self._lock:
+                stage['errors'] += 1
+
+        trace = current_trace()
+        if trace is not None:
+            trace.add(name, time.perf_counter() - elapsed if start is None else start, elapsed)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the enclosed block as one run of a stage.
+        """
+        start = time.perf_counter()
+        error = False
+
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, start, error)
+
+    def timed(self, name):
+        """
+        Decorator timing every call of a function as one run of a stage.
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_bytes(self, name, count):
+        """
+        Add to the number of bytes a stage read.
+        """
+        stage = self._get(name)
+
+        with self._lock:
+            stage['bytes'] += count
+
+    def snapshot(self):
+        """
+        Return the metrics of every stage.
+
+        Returns:
+            dict: Histogram snapshot, errors and bytes keyed by stage name
+        """
+        with self._lock:
+            stages = {name: (stage['latency'], stage['errors'], stage['bytes']) for name, stage in self._stages.items()}
+
+        return {
+            name: dict(latency.snapshot(), errors=errors, bytes=count)
+            for name, (latency, errors, count) in sorted(stages.items())
+        }
+
+    def render(self):
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        Returns:
+            list: Exposition lines
+        """
+        stages = self.snapshot()
+        if not stages:
+            return []
+
+        lines = [
+            f"# HELP {self.prefix}_duration_seconds Duration of each {self.label}, with the call count as _count.",
+            f"# TYPE {self.prefix}_duration_seconds histogram",
+        ]
+        for name, stage in stages.items():
+            lines += format_histogram(f"{self.prefix}_duration_seconds", {self.label: name}, stage)
+
+        lines += [
+            f"# HELP {self.prefix}_errors_total Runs of each {self.label} that raised.",
+            f"# TYPE {self.prefix}_errors_total counter",
+        ]
+        lines += [f"{self.prefix}_errors_total{format_labels({self.label: name})} {stage['errors']}" for name, stage in stages.items()]
+
+        read = {name: stage['bytes'] for name, stage in stages.items() if stage['bytes']}
+        if read:
+            lines += [
+                f"# HELP {self.prefix}_read_bytes_total Bytes read by each {self.label}.",
+                f"# TYPE {self.prefix}_read_bytes_total counter",
+            ]
+            lines += [f"{self.prefix}_read_bytes_total{format_labels({self.label: name})} {count}" for name, count in read.items()]
+
+        return lines
+
+
+# Stages of the portfolio pipeline
+stage_metrics = StageMetrics('portfolio_stage')
+
+# Served requests by Flask endpoint
+request_metrics = StageMetrics('http_request', label='endpoint')
@@ -1,14 +1,19 @@
+import json
+import time
 import logging
 
-import numpy as np
-import pandas as pd
-
-from datetime import datetime, timedelta
-
-from sdk.portoflio.holdings import get_holdings
+from sdk import storage
+from sdk.price_worker import price_worker
+from sdk.api_client import QUOTE_CACHE_TTL
+from sdk.variables_fetcher import get_atl_ath
+from sdk.portoflio.ledger import get_ledger
+from sdk.portoflio.graph import ComputationGraph
+from sdk.portoflio.versions import get_versions
+from sdk.portoflio.holdings import get_holdings, group_holdings
+from sdk.portoflio.history import HISTORY_DATETIME_FORMAT, SECONDS_PER_DAY, get_portfolio_history
 from sdk.portoflio.transactions import load_transactions
-from sdk.variables_fetcher import load_json_file, get_atl_ath
-from sdk.portoflio.performance import get_portfolio_performance
+from sdk.portoflio.performance import INITIAL_CHART_PERIOD, get_chart_data
+from sdk.portoflio.risk_engine import get_risk_metrics
 from sdk.portoflio.risk import (
     calculate_risk_level,
     calculate_portfolio_volatility,
@@ -17,24 +22,32 @@ from sdk.portoflio.risk import (
 
 logger = logging.getLogger(__name__)
 
+# Versions returned by portfolio_versions(), in order
+PORTFOLIO_INPUTS = ('transactions', 'quotes', 'history')
+
 
-def calculate_profit_loss(current_value, initial_investment):
+def calculate_profit_loss(current_value, ledger=None):
     """
-    Calculate profit/loss metrics.
+    Calculate all-time profit/loss metrics from the position ledger.
+
+    The amount is the unrealised P/L of the open positions plus the realised
+    P/L of everything sold, relative to the total amount ever bought.
 
     Args:
         current_value (float): Current total value of the portfolio
-        initial_investment (float): Initial investment amount
+        ledger (PositionLedger, optional): Ledger to read. Defaults to the process ledger.
 
     Returns:
         dict: Dictionary containing P/L metrics
     """
+    totals = (ledger or get_ledger()).totals()
+
     # Calculate P/L amount
-    pnl_amount = current_value - initial_investment
+    pnl_amount = current_value - totals['total_investment'] + totals['realized_pnl']
 
     # Calculate P/L percentage
-    if initial_investment > 0:
-        pnl_percentage = (pnl_amount / initial_investment) * 100
+    if totals['total_bought'] > 0:
+        pnl_percentage = (pnl_amount / totals['total_bought']) * 100
     else:
         pnl_percentage = 0
 
@@ -43,115 +56,72 @@ def calculate_profit_loss(current_value, initial_investment):
         'percentage': round(pnl_percentage, 2)
     }
 
-def load_and_normalize_history(path='./config/portfolio_history.json'):
+def load_and_normalize_history():
     """
-    Load and normalize the portfolio history from a JSON file.
-
-    Args:
-        path (str): Path to the portfolio history JSON file.
+    Load and normalize the portfolio history from the history engine.
 
     Returns:
         list: A list of history entries with parsed datetime, sorted from newest to oldest.
     """
-    history = load_json_file(path)
-
-    if isinstance(history, dict) and 'history' in history:
-        history = history['history']
-    elif not isinstance(history, list):
-        logger.error("Invalid history format")
-        return []
-
-    for entry in history:
-        if 'datetime' in entry:
-            try:
-                entry['parsed_datetime'] = datetime.strptime(entry['datetime'], '%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                logger.error(f"Invalid datetime format: {entry['datetime']}")
-                entry['parsed_datetime'] = datetime.now()
-
-    history.sort(key=lambda x: x.get('parsed_datetime', datetime.min), reverse=True)
-    return history
-
-def get_change_for_period(history, current_value, current_time, delta):
+    history = get_portfolio_history()
+
+    return [
+        {
+            'datetime': parsed_datetime.strftime(HISTORY_DATETIME_FORMAT),
+            'parsed_datetime': parsed_datetime,
+            'total_value': total_value,
+            'total_investment': total_investment,
+            'profit_loss': profit_loss,
+            'profit_loss_percentage': profit_loss_percentage,
+        }
+        for parsed_datetime, total_value, total_investment, profit_loss, profit_loss_percentage in zip(
+            history.timestamps[::-1].astype('datetime64[s]').tolist(),
+            history.total_value[::-1].tolist(),
+            history.total_investment[::-1].tolist(),
+            history.profit_loss[::-1].tolist(),
+            history.profit_loss_percentage[::-1].tolist(),
+        )
+    ]
+
+def get_change_for_period(history, current_value, current_time, delta, tolerance=SECONDS_PER_DAY):
     """
     Calculate the portfolio change for a specific time period.
 
     Args:
-        history (list): List of history entries with parsed datetime.
+        history (PortfolioHistory): Columnar portfolio history.
         current_value (float): The most recent portfolio total value.
-        current_time (datetime): The datetime of the most recent entry.
+        current_time (int): Epoch seconds of the most recent entry.
         delta (timedelta): The time period to compare against.
+        tolerance (float): Maximum distance in seconds to the closest snapshot.
 
     Returns:
         dict: Dictionary with amount, percentage, and positivity of change.
     """
-    target_time = current_time - delta
-    closest_entry = None
-    min_time_diff = float('inf')
-
-    for entry in history:
-        if 'parsed_datetime' not in entry:
-            continue
-        entry_time = entry['parsed_datetime']
-        time_diff = abs((entry_time - target_time).total_seconds())
-        if time_diff < min_time_diff:
-            min_time_diff = time_diff
-            closest_entry = entry
-
-    if closest_entry and min_time_diff <= 86400:
-        past_value = closest_entry['total_value']
-        change_amount = current_value - past_value
-        change_percentage = (change_amount / past_value * 100) if past_value else 0
-        return {
-            'amount': f"${round(change_amount, 2):,.2f}",
-            'percentage': f"{round(change_percentage, 2):,.2f}%",
-            'is_positive': change_amount >= 0
-        }
-
-    return {
-        'amount': 0,
-        'percentage': 0,
-        'is_positive': True
-    }
+    return history.change_for_period(delta.total_seconds(), current_value, current_time, tolerance)
 
-def calculate_changes_from_history():
+def calculate_changes_from_history(periods=('24h', '7d', '30d'), tolerance=SECONDS_PER_DAY):
     """
-    Calculate portfolio changes over 24h, 7d, and 30d using portfolio history.
+    Calculate portfolio changes over the given periods using portfolio history.
+
+    Args:
+        periods (iterable): Period labels such as '1h', '24h', '7d', '30d', '90d', 'YTD' or '1y'
+        tolerance (float): Maximum distance in seconds to the closest snapshot.
 
     Returns:
         dict: Dictionary containing changes (amount, percentage, and positivity)
-              for each predefined time period.
+              for each requested time period.
     """
-    history = load_and_normalize_history()
-    if not history:
-        return default_changes()
-
-    current_entry = history[0]
-    current_value = current_entry['total_value']
-    current_time = current_entry['parsed_datetime']
-
-    time_periods = {
-        '24h': timedelta(days=1),
-        '7d': timedelta(days=7),
-        '30d': timedelta(days=30)
-    }
+    history = get_portfolio_history()
+    if len(history) == 0:
+        return default_changes(periods)
 
-    changes = {
-        period: get_change_for_period(history, current_value, current_time, delta)
-        for period, delta in time_periods.items()
-    }
+    return history.changes_for_periods(list(periods), tolerance=tolerance)
 
-    return changes
-
-def default_changes():
+def default_changes(periods=('24h', '7d', '30d')):
     """
     Return default changes when no data is available
     """
-    return {
-        '24h': {'amount': 0, 'percentage': 0, 'is_positive': True},
-        '7d': {'amount': 0, 'percentage': 0, 'is_positive': True},
-        '30d': {'amount': 0, 'percentage': 0, 'is_positive': True}
-    }
+    return {period: {'amount': 0, 'percentage': 0, 'is_positive': True} for period in periods}
 
 
 def calculate_diversity_score(holdings, max_score=10):
@@ -192,112 +162,171 @@ def calculate_diversity_score(holdings, max_score=10):
     # Round to 1 decimal place
     return round(score, 1)
 
-def calculate_metrics_from_portfolio_history():
+def calculate_weighted_change(holdings):
     """
-    Calculate risk metrics from portfolio history data.
+    Calculate the 24h change of the portfolio weighted by allocation.
+
+    Args:
+        holdings (list): List of holding dictionaries
 
     Returns:
-        Dictionary of risk metrics.
+        float: Weighted 24h change in percent
     """
-    # Convert to DataFrame for easier manipulation
-    df = pd.DataFrame(load_json_file('./config/portfolio_history.json'))
-
-    if len(df) == 0:
-        return 0, 0
+    if not holdings:
+        return 0
 
-    # Convert datetime to proper datetime format and set as index
-    df['datetime'] = pd.to_datetime(df['datetime'])
-    df = df.sort_values('datetime')  # Ensure chronological order
-    df.set_index('datetime', inplace=True)
+    return round(sum(holding['day_change'] * holding['percentage'] / 100 for holding in holdings), 2)
 
-    # Calculate daily returns based on total_value
-    df['daily_return'] = df['total_value'].pct_change()
+def calculate_risk_levels(volatility, diversity_score, max_drawdown, sharpe_ratio):
+    return {
+        'volatility': determine_risk_level(volatility, 'volatility'),
+        'diversity': determine_risk_level(diversity_score, 'diversity'),
+        'max_drawdown': determine_risk_level(max_drawdown, 'max_drawdown'),
+        'sharpe_ratio': determine_risk_level(sharpe_ratio, 'sharpe_ratio')
+    }
 
-    # Drop NaN values (first row will have NaN return)
-    df = df.dropna()
+def calculate_metrics_from_portfolio_history():
+    """
+    Calculate risk metrics from portfolio history data.
 
-    # Calculate Max Drawdown
-    # First, calculate cumulative returns (starting from 1)
-    df['cumulative_return'] = (1 + df['daily_return']).cumprod()
+    Returns:
+        float: Max drawdown as a percentage
+        float: Sharpe ratio (2% annual risk-free rate, annualised over 252 periods)
+    """
+    return get_portfolio_history().drawdown_and_sharpe()
 
-    # Calculate running maximum
-    df['running_max'] = df['cumulative_return'].cummax()
+def portfolio_versions():
+    """
+    Return the versions of the inputs the portfolio page depends on.
 
-    # Calculate drawdown
-    df['drawdown'] = df['cumulative_return'] / df['running_max'] - 1
+    Without the price worker, quotes are refreshed by the quote cache TTL,
+    so the quotes version also advances once per TTL window.
 
-    # Find the maximum drawdown
-    max_drawdown = abs(df['drawdown'].min()) * 100  # Convert to percentage
+    Returns:
+        tuple: transactions, quotes and history versions
+    """
+    # Picks up history snapshots written by other processes
+    get_portfolio_history()
 
-    # Calculate Sharpe Ratio
-    # Assuming risk-free rate of 2% annually
-    risk_free_rate = 0.02 / 252  # Daily risk-free rate
+    versions = get_versions()
 
-    # Calculate excess return
-    df['excess_return'] = df['daily_return'] - risk_free_rate
+    quotes_version = versions['quotes']
+    if not price_worker.is_running():
+        quotes_version = (quotes_version, int(time.time() // QUOTE_CACHE_TTL))
 
-    # Calculate Sharpe Ratio
-    # For daily returns, multiply by sqrt(252) to annualize
-    sharpe_ratio = df['excess_return'].mean() / df['daily_return'].std() * np.sqrt(252)
+    return versions['transactions'], quotes_version, versions['history']
 
-    return round(max_drawdown, 2), round(sharpe_ratio, 2)
 
-def calculate_portfolio_data():
-    """
-    Calculate the portfolio data.
+portfolio_graph = ComputationGraph(stage_prefix='analytics')
 
-    Returns:
-        dict: with all the portfolio data.
-    """
-    holdings, current_value, initial_investment = get_holdings()
+# Quote-dependent branch
+portfolio_graph.add('positions', get_holdings, versions=('transactions', 'quotes'))
+portfolio_graph.add('holdings_by_exchange', lambda positions: group_holdings('exchange', positions[0]), inputs=('positions',))
+portfolio_graph.add('holdings_by_wallet', lambda positions: group_holdings('wallet', positions[0]), inputs=('positions',))
+portfolio_graph.add('profit_loss', lambda positions: calculate_profit_loss(positions[1]), inputs=('positions',))
+portfolio_graph.add('weighted_change', lambda positions: calculate_weighted_change(positions[0]), inputs=('positions',))
+portfolio_graph.add('diversity_score', lambda positions: calculate_diversity_score(positions[0]), inputs=('positions',))
+portfolio_graph.add('risk_level', lambda positions: calculate_risk_level(positions[0]), inputs=('positions',))
+portfolio_graph.add('risk_metrics', lambda positions: get_risk_metrics(positions[0]), inputs=('positions',))
+portfolio_graph.add(
+    'portfolio_volatility',
+    lambda positions, risk_metrics: calculate_portfolio_volatility(positions[0], risk_metrics),
+    inputs=('positions', 'risk_metrics'),
+)
 
-    profit_loss = calculate_profit_loss(current_value, initial_investment)
+# History-dependent branch
+portfolio_graph.add('atl_ath', get_atl_ath, versions=('history',))
+portfolio_graph.add('history_changes', calculate_changes_from_history, versions=('history',))
+portfolio_graph.add('chart_points', lambda: get_chart_data(INITIAL_CHART_PERIOD), versions=('history',))
+portfolio_graph.add('chart_data', lambda points: json.dumps({INITIAL_CHART_PERIOD: points}), inputs=('chart_points',))
+portfolio_graph.add('drawdown_sharpe', calculate_metrics_from_portfolio_history, versions=('history',))
+
+portfolio_graph.add(
+    'risk_levels',
+    lambda volatility, diversity_score, drawdown_sharpe: calculate_risk_levels(volatility, diversity_score, *drawdown_sharpe),
+    inputs=('portfolio_volatility', 'diversity_score', 'drawdown_sharpe'),
+)
 
-    all_time_low, all_time_high = get_atl_ath()
+# Transaction-dependent branch
+portfolio_graph.add('transactions', load_transactions, versions=('transactions',))
+portfolio_graph.add('transaction_rows', lambda: storage.load_transactions()[::-1], versions=('transactions',))
 
-    history_changes = calculate_changes_from_history()
+# Nodes rendered by the portfolio page
+PAGE_NODES = (
+    'positions', 'holdings_by_exchange', 'holdings_by_wallet', 'profit_loss', 'weighted_change',
+    'diversity_score', 'risk_level', 'risk_metrics', 'portfolio_volatility', 'atl_ath',
+    'history_changes', 'chart_data', 'drawdown_sharpe', 'risk_levels', 'transactions',
+)
 
-    diversity_score = calculate_diversity_score(holdings)
+# Groups of the portfolio API and the nodes each one reads
+PORTFOLIO_FIELDS = {
+    'holdings': ('positions', 'holdings_by_exchange', 'holdings_by_wallet'),
+    'totals': ('positions', 'profit_loss', 'weighted_change'),
+    'changes': ('history_changes',),
+    'extremes': ('atl_ath',),
+    'risk': (
+        'risk_level', 'risk_metrics', 'portfolio_volatility', 'diversity_score', 'drawdown_sharpe', 'risk_levels'
+    ),
+    'chart': ('chart_points',),
+    'transactions': ('transaction_rows',),
+}
+
+
+def evaluate_portfolio_nodes(names, versions=None):
+    """
+    Evaluate nodes of the portfolio graph for the current inputs.
 
-    risk_string, risk_level = calculate_risk_level(holdings)
+    Args:
+        names (iterable): Node names
+        versions (tuple, optional): Result of portfolio_versions()
 
-    portfolio_volatility = calculate_portfolio_volatility(holdings)
+    Returns:
+        dict: Value of every requested node
+    """
+    return portfolio_graph.evaluate(names, dict(zip(PORTFOLIO_INPUTS, versions or portfolio_versions())))
 
-    transactions = load_transactions()
+def calculate_portfolio_data(versions=None):
+    """
+    Calculate the portfolio data.
 
-    transactions_performance, chart_data_json = get_portfolio_performance()
+    Every metric is a node of the portfolio graph, memoised on the
+    versions of the inputs it depends on, so only the metrics whose
+    inputs changed are recomputed.
 
-    max_drawdown, sharpe_ratio = calculate_metrics_from_portfolio_history()
+    Args:
+        versions (tuple, optional): Result of portfolio_versions()
 
-    if holdings:
-        weighted_change = sum(holding['day_change'] * holding['percentage'] / 100 for holding in holdings)
-    else:
-        weighted_change = 0
+    Returns:
+        dict: with all the portfolio data.
+    """
+    values = evaluate_portfolio_nodes(PAGE_NODES, versions)
 
-    weighted_change = round(weighted_change, 2)
+    holdings, current_value, _ = values['positions']
+    profit_loss = values['profit_loss']
+    weighted_change = values['weighted_change']
+    risk_string, risk_level = values['risk_level']
+    all_time_low, all_time_high = values['atl_ath']
+    history_changes = values['history_changes']
+    max_drawdown, sharpe_ratio = values['drawdown_sharpe']
 
     is_positive_total_value = True if weighted_change > 0 else False
     is_positive_all_time = True if profit_loss['amount'] > 0 else False
 
-    risk_levels = {
-        'volatility': determine_risk_level(portfolio_volatility, 'volatility'),
-        'diversity': determine_risk_level(diversity_score, 'diversity'),
-        'max_drawdown': determine_risk_level(max_drawdown, 'max_drawdown'),
-        'sharpe_ratio': determine_risk_level(sharpe_ratio, 'sharpe_ratio')
-    }
     return {
         # Holdings table
         'holdings': holdings,
+        'holdings_by_exchange': values['holdings_by_exchange'],
+        'holdings_by_wallet': values['holdings_by_wallet'],
 
         # Portfolio Value Card
-        'current_value': f"${round(current_value, 2):,.2f}",
+        'current_value': round(current_value, 2),
         'is_positive_total_value': is_positive_total_value,
         'weighted_change': weighted_change,
-        'all_time_low': f"${all_time_low:,.2f}",
-        'all_time_high': f"${all_time_high:,.2f}",
+        'all_time_low': all_time_low,
+        'all_time_high': all_time_high,
 
         # Profit & Loss Card
-        'all_time_profit': f"${profit_loss['amount']:,.2f}",
+        'all_time_profit': profit_loss['amount'],
         'all_time_profit_percentage': profit_loss['percentage'],
         'is_positive_all_time': is_positive_all_time,
         'profit_24h': history_changes['24h']['amount'],
@@ -312,19 +341,85 @@ def calculate_portfolio_data():
 
         # Allocation & Metrics
         'assets_count': len(holdings),
-        'diversity_score': diversity_score,
+        'diversity_score': values['diversity_score'],
         'risk_string': risk_string,
         'risk_level': risk_level,
-        'portfolio_volatility': portfolio_volatility,
+        'portfolio_volatility': values['portfolio_volatility'],
+        'risk_metrics': values['risk_metrics'],
 
         # Recent Transactions
-        'transactions': transactions,
+        'transactions': values['transactions'],
 
         # Portfolio Performance
-        'chart_data': chart_data_json,
+        'chart_data': values['chart_data'],
 
         # Risk Analysis
-        'risk_levels': risk_levels,
+        'risk_levels': values['risk_levels'],
         'max_drawdown': max_drawdown,
         'sharpe_rati': sharpe_ratio,
     }
+
+def build_portfolio_field(field, values):
+    """
+    Assemble one API group from the evaluated nodes.
+    """
+    if field == 'holdings':
+        return {
+            'assets': values['positions'][0],
+            'by_exchange': values['holdings_by_exchange'],
+            'by_wallet': values['holdings_by_wallet'],
+        }
+
+    if field == 'totals':
+        holdings, current_value, _ = values['positions']
+        return {
+            'current_value': round(current_value, 2),
+            'profit_loss': values['profit_loss'],
+            'weighted_change': values['weighted_change'],
+            'assets_count': len(holdings),
+        }
+
+    if field == 'changes':
+        return values['history_changes']
+
+    if field == 'extremes':
+        all_time_low, all_time_high = values['atl_ath']
+        return {'all_time_low': all_time_low, 'all_time_high': all_time_high}
+
+    if field == 'risk':
+        risk_string, risk_level = values['risk_level']
+        max_drawdown, sharpe_ratio = values['drawdown_sharpe']
+        return {
+            'risk_string': risk_string,
+            'risk_level': risk_level,
+            'volatility': values['portfolio_volatility'],
+            'diversity_score': values['diversity_score'],
+            'max_drawdown': max_drawdown,
+            'sharpe_ratio': sharpe_ratio,
+            'risk_levels': values['risk_levels'],
+            'risk_metrics': values['risk_metrics'],
+        }
+
+    if field == 'chart':
+        return {'range': INITIAL_CHART_PERIOD, 'points': values['chart_points']}
+
+    return values['transaction_rows']
+
+def calculate_portfolio_fields(fields, versions=None):
+    """
+    Calculate the requested groups of raw portfolio data for the API.
+
+    Only the graph nodes the requested groups read are evaluated. Values
+    are plain numbers; formatting is left to the client.
+
+    Args:
+        fields (iterable): Names from PORTFOLIO_FIELDS
+        versions (tuple, optional): Result of portfolio_versions()
+
+    Returns:
+        dict: Group name to its data
+    """
+    fields = list(fields)
+    values = evaluate_portfolio_nodes({node for field in fields for node in PORTFOLIO_FIELDS[field]}, versions)
+
+    return {field: build_portfolio_field(field, values) for field in fields}
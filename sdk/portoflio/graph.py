@@ -0,0 +1,188 @@
+import logging
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from sdk.metrics import bind_trace, current_trace, stage_metrics
+
+logger = logging.getLogger(__name__)
+
+# Threads evaluating independent nodes of one request in parallel
+GRAPH_WORKERS = 4
+
+
+class Node:
+    """
+    One metric of the graph.
+
+    Args:
+        name (str): Node name
+        compute (callable): Called with the values of inputs, in order
+        inputs (tuple): Names of the nodes it reads
+        versions (tuple): Names of the input versions it reads directly
+    """
+
+    def __init__(self, name, compute, inputs=(), versions=()):
+        self.name = name
+        self.compute = compute
+        self.inputs = tuple(inputs)
+        self.versions = tuple(versions)
+
+
+class ComputationGraph:
+    """
+    Lazily evaluated metrics with declared dependencies.
+
+    Each node declares the nodes and input versions it reads. A node's
+    value is memoised on the versions it depends on, directly or through
+    its inputs, so evaluating it again only recomputes it once one of
+    those versions moved. evaluate() only runs the requested nodes and
+    their dependencies; nodes whose inputs are ready run in parallel on
+    a thread pool, so independent branches overlap.
+
+    Nodes must be added after their inputs, which keeps the graph acyclic
+    and the registration order topological. Every computation is also
+    recorded in stage_metrics as the stage '<stage_prefix>.<node>'.
+    """
+
+    def __init__(self, max_workers=GRAPH_WORKERS, stage_prefix='graph'):
+        self.max_workers = max_workers
+        self.stage_prefix = stage_prefix
+
+        self.nodes = {}
+        self._dependencies = {}
+        self._version_names = {}
+
+        self._values = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def add(self, name, compute, inputs=(), versions=()):
+        """
+        Register a node.
+
+        Args:
+            name (str): Node name
+            compute (callable): Called with the values of inputs, in order
+            inputs (tuple): Names of previously added nodes it reads
+            versions (tuple): Names of the input versions it reads directly
+        """
+        if name in self.nodes:
+            raise ValueError(f"Node {name} is already defined")
+
+        missing = [node for node in inputs if node not in self.nodes]
+        if missing:
+            raise ValueError(f"Node {name} reads undefined nodes {', '.join(missing)}")
+
+        node = Node(name, compute, inputs, versions)
+
+        dependencies = set()
+        version_names = set(node.versions)
+        for input_name in node.inputs:
+            dependencies |= self._dependencies[input_name] | {input_name}
+            version_names |= self._version_names[input_name]
+
+        self.nodes[name] = node
+        self._dependencies[name] = dependencies
+        self._version_names[name] = frozenset(version_names)
+
+    def key(self, name, versions):
+        """
+        Return the versions a node's value depends on.
+
+        Args:
+            name (str): Node name
+            versions (dict): Current version of every input
+
+        Returns:
+            tuple: Memoisation key of the node
+        """
+        return tuple((version, versions[version]) for version in sorted(self._version_names[name]))
+
+    def plan(self, names):
+        """
+        Return the requested nodes and their dependencies in topological order.
+        """
+        needed = set()
+        for name in names:
+            if name not in self.nodes:
+                raise KeyError(f"Unknown node {name}")
+            needed |= self._dependencies[name] | {name}
+
+        return [name for name in self.nodes if name in needed]
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='portfolio-graph')
+            return self._executor
+
+    def _run(self, name, key, args, trace=None):
+        with bind_trace(trace), stage_metrics.stage(f'{self.stage_prefix}.{name}'):
+            value = self.nodes[name].compute(*args)
+
+        with self._lock:
+            self._values[name] = (key, value)
+
+        return value
+
+    def evaluate(self, names, versions):
+        """
+        Evaluate nodes, reusing memoised values whose versions are unchanged.
+
+        Args:
+            names (iterable): Nodes to evaluate
+            versions (dict): Current version of every input
+
+        Returns:
+            dict: Value of every requested node
+        """
+        names = list(names)
+        order = self.plan(names)
+        keys = {name: self.key(name, versions) for name in order}
+
+        results = {}
+        remaining = []
+
+        with self._lock:
+            for name in order:
+                cached = self._values.get(name)
+                if cached is not None and cached[0] == keys[name]:
+                    results[name] = cached[1]
+                else:
+                    remaining.append(name)
+
+        running = {}
+        trace = current_trace()
+
+        while remaining or running:
+            ready = [name for name in remaining if all(node in results for node in self.nodes[name].inputs)]
+
+            # A single ready node with nothing in flight runs on this thread
+            if len(ready) == 1 and not running:
+                name = ready[0]
+                remaining.remove(name)
+                results[name] = self._run(name, keys[name], [results[node] for node in self.nodes[name].inputs], trace)
+                continue
+
+            executor = self._get_executor() if ready else None
+            for name in ready:
+                remaining.remove(name)
+                args = [results[node] for node in self.nodes[name].inputs]
+                running[executor.submit(self._run, name, keys[name], args, trace)] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+        return {name: results[name] for name in names}
+
+    def get(self, name, versions):
+        """
+        Evaluate a single node.
+        """
+        return self.evaluate([name], versions)[name]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
@@ -0,0 +1,639 @@
+import logging
+import threading
+
+import numpy as np
+
+from datetime import datetime
+
+from sdk import storage
+from sdk.metrics import stage_metrics
+from sdk.portoflio import versions
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+VALUE_COLUMNS = ['total_value', 'total_investment', 'profit_loss', 'profit_loss_percentage']
+
+# Chart periods and the largest day difference (as timedelta.days) they include
+CHART_PERIODS = {
+    "1D": 1,
+    "1W": 7,
+    "1M": 30,
+    "3M": 90,
+    "1Y": 365,
+}
+
+SECONDS_PER_DAY = 86400
+
+
+def parse_datetimes(values):
+    """
+    Parse history datetime strings into int64 epoch seconds.
+
+    The strings are naive and are treated as UTC, so differences between
+    them are exact.
+
+    Args:
+        values (list): Datetime strings in HISTORY_DATETIME_FORMAT
+
+    Returns:
+        np.ndarray: int64 epoch seconds
+    """
+    try:
+        return np.array(values, dtype='datetime64[s]').astype(np.int64)
+    except ValueError:
+        timestamps = np.empty(len(values), dtype=np.int64)
+
+        for i, value in enumerate(values):
+            try:
+                parsed = datetime.strptime(value, HISTORY_DATETIME_FORMAT)
+            except (TypeError, ValueError):
+                logger.error(f"Invalid datetime format: {value}")
+                parsed = datetime.now()
+
+            timestamps[i] = np.datetime64(parsed, 's').astype(np.int64)
+
+        return timestamps
+
+
+def naive_now():
+    """
+    Return the current local wall-clock time as int64 epoch seconds,
+    on the same naive scale as parse_datetimes.
+    """
+    return int(np.datetime64(datetime.now(), 's').astype(np.int64))
+
+
+class PortfolioHistory:
+    """
+    Columnar portfolio history: int64 epoch timestamps plus float64 value
+    columns, sorted oldest to newest.
+
+    The sorted timestamp column doubles as the index for period lookups,
+    and snapshots can be appended without rebuilding it.
+    """
+
+    def __init__(self, timestamps, total_value, total_investment, profit_loss, profit_loss_percentage):
+        order = np.argsort(np.asarray(timestamps, dtype=np.int64), kind='stable')
+
+        self._size = len(order)
+        self._columns = {
+            'timestamps': np.asarray(timestamps, dtype=np.int64)[order],
+            'total_value': np.asarray(total_value, dtype=np.float64)[order],
+            'total_investment': np.asarray(total_investment, dtype=np.float64)[order],
+            'profit_loss': np.asarray(profit_loss, dtype=np.float64)[order],
+            'profit_loss_percentage': np.asarray(profit_loss_percentage, dtype=np.float64)[order],
+        }
+
+        # Lowest low and highest high of rolled-up snapshots not in total_value
+        self.extremes = None
+
+    @property
+    def timestamps(self):
+        return self._columns['timestamps'][:self._size]
+
+    @property
+    def total_value(self):
+        return self._columns['total_value'][:self._size]
+
+    @property
+    def total_investment(self):
+        return self._columns['total_investment'][:self._size]
+
+    @property
+    def profit_loss(self):
+        return self._columns['profit_loss'][:self._size]
+
+    @property
+    def profit_loss_percentage(self):
+        return self._columns['profit_loss_percentage'][:self._size]
+
+    def append(self, timestamp, total_value, total_investment, profit_loss, profit_loss_percentage):
+        """
+        Add one snapshot, keeping the columns sorted by timestamp.
+
+        Appending at the end is amortised O(1); an out-of-order snapshot is
+        inserted at its sorted position.
+
+        Args:
+            timestamp (int): Epoch seconds on the parse_datetimes scale
+            total_value (float): Portfolio value
+            total_investment (float): Invested amount
+            profit_loss (float): Profit/loss amount
+            profit_loss_percentage (float): Profit/loss percentage
+        """
+        values = {
+            'timestamps': timestamp,
+            'total_value': total_value,
+            'total_investment': total_investment,
+            'profit_loss': profit_loss,
+            'profit_loss_percentage': profit_loss_percentage,
+        }
+
+        position = int(np.searchsorted(self.timestamps, timestamp, side='right'))
+
+        if self._size == len(self._columns['timestamps']):
+            capacity = max(16, 2 * self._size)
+            for name, column in self._columns.items():
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                self._columns[name] = grown
+
+        for name, column in self._columns.items():
+            if position < self._size:
+                column[position + 1:self._size + 1] = column[position:self._size]
+            column[position] = values[name]
+
+        self._size += 1
+
+    @classmethod
+    def from_entries(cls, entries):
+        """
+        Build the history from a list of portfolio_history.json style entries.
+
+        Args:
+            entries (list): Dictionaries with datetime and the VALUE_COLUMNS keys
+
+        Returns:
+            PortfolioHistory: Columnar history
+        """
+        entries = [entry for entry in entries if 'datetime' in entry]
+
+        return cls(
+            parse_datetimes([entry['datetime'] for entry in entries]),
+            *[[entry[column] for entry in entries] for column in VALUE_COLUMNS]
+        )
+
+    def __len__(self):
+        return self._size
+
+    def atl_ath(self):
+        """
+        Return the All-Time Low and All-Time High of the total value.
+
+        Returns:
+            float: All-Time Low
+            float: All-Time High
+        """
+        lows = [float(self.total_value.min())] if len(self) else []
+        highs = [float(self.total_value.max())] if len(self) else []
+
+        if self.extremes is not None:
+            lows.append(self.extremes[0])
+            highs.append(self.extremes[1])
+
+        if not lows:
+            return round(99999999, 2), 0
+
+        return round(min(lows), 2), round(max(highs), 2)
+
+    def closest_indices(self, targets, tolerance=SECONDS_PER_DAY):
+        """
+        Find the snapshot closest to each target time with a binary search.
+
+        Args:
+            targets (array-like): Epoch seconds to look up
+            tolerance (float): Maximum distance in seconds to the closest snapshot
+
+        Returns:
+            np.ndarray: Index of the closest snapshot per target, -1 when none
+                        is within tolerance
+        """
+        targets = np.asarray(targets, dtype=np.int64)
+
+        if len(self) == 0:
+            return np.full(len(targets), -1, dtype=np.int64)
+
+        timestamps = self.timestamps
+        right = np.clip(np.searchsorted(timestamps, targets, side='left'), 0, len(self) - 1)
+        left = np.clip(right - 1, 0, len(self) - 1)
+
+        left_diff = np.abs(timestamps[left] - targets)
+        right_diff = np.abs(timestamps[right] - targets)
+
+        # On a tie prefer the newer snapshot
+        closest = np.where(left_diff < right_diff, left, right)
+        closest_diff = np.minimum(left_diff, right_diff)
+
+        return np.where(closest_diff <= tolerance, closest, -1)
+
+    def changes_for_deltas(self, deltas, current_value=None, current_time=None, tolerance=SECONDS_PER_DAY):
+        """
+        Calculate the change against the snapshot closest to current_time - delta
+        for every delta in one lookup.
+
+        Args:
+            deltas (list): Period lengths in seconds
+            current_value (float, optional): Defaults to the latest total value
+            current_time (int, optional): Epoch seconds. Defaults to the latest timestamp.
+            tolerance (float): Maximum distance in seconds to the closest snapshot
+
+        Returns:
+            list: Change dictionary (amount, percentage, is_positive) per delta
+        """
+        if len(self) == 0:
+            return [default_change() for _ in deltas]
+
+        if current_value is None:
+            current_value = float(self.total_value[-1])
+        if current_time is None:
+            current_time = int(self.timestamps[-1])
+
+        indices = self.closest_indices([current_time - delta for delta in deltas], tolerance)
+
+        return [
+            calculate_change(current_value, float(self.total_value[index])) if index >= 0 else default_change()
+            for index in indices.tolist()
+        ]
+
+    def changes_for_periods(self, periods, current_value=None, current_time=None, tolerance=SECONDS_PER_DAY):
+        """
+        Calculate the change over several labelled periods in one lookup.
+
+        Args:
+            periods (list): Period labels such as '1h', '24h', '7d', '30d', '90d', 'YTD' or '1y'
+            current_value (float, optional): Defaults to the latest total value
+            current_time (int, optional): Epoch seconds. Defaults to the latest timestamp.
+            tolerance (float): Maximum distance in seconds to the closest snapshot
+
+        Returns:
+            dict: Change dictionary per period label
+        """
+        if current_time is None and len(self) > 0:
+            current_time = int(self.timestamps[-1])
+
+        deltas = [period_seconds(period, current_time or 0) for period in periods]
+
+        return dict(zip(periods, self.changes_for_deltas(deltas, current_value, current_time, tolerance)))
+
+    def change_for_period(self, delta_seconds, current_value=None, current_time=None, tolerance=SECONDS_PER_DAY):
+        """
+        Calculate the change against the snapshot closest to current_time - delta.
+
+        Args:
+            delta_seconds (float): Length of the period in seconds
+            current_value (float, optional): Defaults to the latest total value
+            current_time (int, optional): Epoch seconds. Defaults to the latest timestamp.
+            tolerance (float): Maximum distance in seconds to the closest snapshot
+
+        Returns:
+            dict: Dictionary with amount, percentage, and positivity of change.
+        """
+        return self.changes_for_deltas([delta_seconds], current_value, current_time, tolerance)[0]
+
+    def drawdown_and_sharpe(self, risk_free_rate=0.02, periods_per_year=252):
+        """
+        Calculate the max drawdown and the annualised Sharpe ratio of the total value.
+
+        Args:
+            risk_free_rate (float): Annual risk-free rate
+            periods_per_year (int): Periods used to annualise
+
+        Returns:
+            float: Max drawdown as a percentage
+            float: Sharpe ratio
+        """
+        values = self.total_value
+
+        if len(values) < 2:
+            return 0, 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = values[1:] / values[:-1] - 1
+        returns = returns[~np.isnan(returns)]
+
+        if len(returns) == 0:
+            return 0, 0
+
+        cumulative_return = np.cumprod(1 + returns)
+        running_max = np.maximum.accumulate(cumulative_return)
+        max_drawdown = abs((cumulative_return / running_max - 1).min()) * 100
+
+        if len(returns) < 2:
+            return round(float(max_drawdown), 2), 0
+
+        excess_return = returns - risk_free_rate / periods_per_year
+        sharpe_ratio = excess_return.mean() / returns.std(ddof=1) * np.sqrt(periods_per_year)
+
+        return round(float(max_drawdown), 2), round(float(sharpe_ratio), 2)
+
+    def chart_points(self, start=0, utc_offset=None):
+        """
+        Build chart data points from start to the newest snapshot.
+
+        Args:
+            start (int): First index to include
+            utc_offset (int, optional): Seconds added to convert the naive
+                timestamps to epoch time for JS. Defaults to the local offset.
+
+        Returns:
+            list: Data points with x in milliseconds
+        """
+        if utc_offset is None:
+            utc_offset = local_utc_offset()
+
+        x = ((self.timestamps[start:] - utc_offset) * 1000).tolist()
+
+        return [
+            {
+                "x": timestamp,
+                "total_value": total_value,
+                "total_investment": total_investment,
+                "profit_loss": profit_loss,
+                "profit_loss_percentage": profit_loss_percentage
+            }
+            for timestamp, total_value, total_investment, profit_loss, profit_loss_percentage in zip(
+                x,
+                self.total_value[start:].tolist(),
+                self.total_investment[start:].tolist(),
+                self.profit_loss[start:].tolist(),
+                self.profit_loss_percentage[start:].tolist(),
+            )
+        ]
+
+    def period_start(self, days, now=None):
+        """
+        Return the index of the first snapshot at most `days` whole days old.
+
+        Args:
+            days (int): Largest day difference to include
+            now (int, optional): Epoch seconds. Defaults to the local time.
+
+        Returns:
+            int: Start index into the sorted columns
+        """
+        if now is None:
+            now = naive_now()
+
+        # timedelta.days <= days  <=>  now - ts < (days + 1) * 86400
+        return int(np.searchsorted(self.timestamps, now - (days + 1) * SECONDS_PER_DAY, side='right'))
+
+    def chart_range(self, period, points=None, now=None):
+        """
+        Build the chart data points of one period, optionally downsampled.
+
+        Args:
+            period (str): One of CHART_PERIODS or 'All'
+            points (int, optional): Target point count for LTTB downsampling
+            now (int, optional): Epoch seconds. Defaults to the local time.
+
+        Returns:
+            list: Data points with x in milliseconds
+        """
+        if period == 'All':
+            start = 0
+        elif period in CHART_PERIODS:
+            start = self.period_start(CHART_PERIODS[period], now)
+        else:
+            raise ValueError(f"Invalid chart period: {period}")
+
+        if points is None or len(self) - start <= points:
+            return self.chart_points(start)
+
+        indices = start + lttb_indices(self.timestamps[start:], self.total_value[start:], points)
+
+        return self.take(indices).chart_points()
+
+    def take(self, indices):
+        """
+        Return a new history holding only the given (sorted) indices.
+        """
+        return PortfolioHistory(
+            self.timestamps[indices],
+            self.total_value[indices],
+            self.total_investment[indices],
+            self.profit_loss[indices],
+            self.profit_loss_percentage[indices],
+        )
+
+    def chart_buckets(self, now=None):
+        """
+        Categorize the history into the 1D, 1W, 1M, 3M, 1Y and All periods.
+
+        Every period is a suffix of the sorted history, so the points are
+        built once and sliced.
+
+        Args:
+            now (int, optional): Epoch seconds. Defaults to the local time.
+
+        Returns:
+            dict: Dictionary of sorted data points by time period.
+        """
+        points = self.chart_points()
+
+        chart_data = {
+            period: points[self.period_start(days, now):]
+            for period, days in CHART_PERIODS.items()
+        }
+        chart_data["All"] = points
+
+        return chart_data
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Select the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    Args:
+        x (np.ndarray): Sorted x values
+        y (np.ndarray): y values
+        threshold (int): Number of points to keep
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points
+    """
+    n = len(x)
+
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+
+    # Bucket edges for the n - 2 inner points, first and last are always kept
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+
+    return indices
+
+
+PERIOD_UNITS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': SECONDS_PER_DAY,
+    'w': 7 * SECONDS_PER_DAY,
+    'y': 365 * SECONDS_PER_DAY,
+}
+
+
+def period_seconds(period, current_time):
+    """
+    Convert a period label to its length in seconds.
+
+    Args:
+        period (str): '<count><unit>' with unit s, m, h, d, w or y, or 'YTD'
+        current_time (int): Epoch seconds the period ends at, used for YTD
+
+    Returns:
+        int: Period length in seconds
+    """
+    if period.upper() == 'YTD':
+        year_start = np.datetime64(int(current_time), 's').astype('datetime64[Y]').astype('datetime64[s]')
+        return int(current_time - year_start.astype(np.int64))
+
+    count, unit = period[:-1], period[-1].lower()
+
+    if unit not in PERIOD_UNITS or not count.isdigit():
+        raise ValueError(f"Invalid period: {period}")
+
+    return int(count) * PERIOD_UNITS[unit]
+
+
+def local_utc_offset():
+    """
+    Return the current local UTC offset in seconds.
+    """
+    offset = datetime.now().astimezone().utcoffset()
+
+    return int(offset.total_seconds()) if offset else 0
+
+
+def default_change():
+    return {'amount': 0, 'percentage': 0, 'is_positive': True}
+
+
+def calculate_change(current_value, past_value):
+    """
+    Calculate the change between two portfolio values.
+
+    Returns:
+        dict: Dictionary with amount, percentage, and positivity of change.
+    """
+    change_amount = current_value - past_value
+    change_percentage = (change_amount / past_value * 100) if past_value else 0
+
+    return {
+        'amount': round(change_amount, 2),
+        'percentage': round(change_percentage, 2),
+        'is_positive': change_amount >= 0
+    }
+
+
+class StorageHistorySource:
+    """
+    Reads the portfolio history from the SQLite storage.
+    """
+
+    def signature(self):
+        return storage.portfolio_history_signature()
+
+    def load_columns(self):
+        datetimes, *columns = storage.load_portfolio_history_columns()
+
+        return (parse_datetimes(datetimes), *columns), None
+
+
+_cache = {'signature': None, 'history': None, 'source': StorageHistorySource()}
+_cache_lock = threading.Lock()
+
+
+def set_history_source(source):
+    """
+    Select where get_portfolio_history reads from.
+
+    Args:
+        source: Object with signature() and load_columns() methods, such as
+            StorageHistorySource or snapshots.SnapshotRecorder
+    """
+    with _cache_lock:
+        _cache['source'] = source
+        _cache['signature'] = None
+        _cache['history'] = None
+
+
+def get_portfolio_history():
+    """
+    Return the portfolio history as a columnar PortfolioHistory.
+
+    The history is loaded once from the configured source and reused until
+    the source changes.
+
+    Returns:
+        PortfolioHistory: Columnar history
+    """
+    source = _cache['source']
+    signature = source.signature()
+
+    with _cache_lock:
+        if _cache['signature'] == signature and _cache['history'] is not None:
+            return _cache['history']
+
+    with stage_metrics.stage('load_portfolio_history'):
+        columns, extremes = source.load_columns()
+        history = PortfolioHistory(*columns)
+
+    stage_metrics.add_bytes('load_portfolio_history', sum(np.asarray(column).nbytes for column in columns))
+    history.extremes = extremes
+
+    with _cache_lock:
+        if _cache['source'] is source:
+            _cache['signature'] = signature
+            _cache['history'] = history
+
+    versions.bump('history')
+
+    return history
+
+
+def append_snapshot(entry):
+    """
+    Store a portfolio history snapshot and add it to the loaded history.
+
+    The cached history and its timestamp index are updated in place rather
+    than reloaded.
+
+    Args:
+        entry (dict): Snapshot with datetime and the VALUE_COLUMNS keys
+    """
+    row_id = storage.append_portfolio_history(entry)
+
+    with _cache_lock:
+        history = _cache['history']
+        signature = _cache['signature']
+
+        storage_source = isinstance(_cache['source'], StorageHistorySource)
+
+        if not storage_source or history is None or signature is None or signature[0] != len(history):
+            _cache['history'] = None
+        else:
+            history.append(
+                int(parse_datetimes([entry['datetime']])[0]),
+                *[entry[column] for column in VALUE_COLUMNS]
+            )
+            _cache['signature'] = (signature[0] + 1, row_id)
+
+    versions.bump('history')
@@ -1,75 +1,200 @@
+import numpy as np
+
+from sdk.metrics import stage_metrics
 from sdk.variables_fetcher import load_json_file
+from sdk.price_worker import quote_store
+from sdk.portoflio.ledger import get_ledger
 from sdk.api_client import get_crypto_data_by_symbols
+from sdk.portoflio.versions import VersionedCache, get_versions
+
+
+def get_current_prices(symbols):
+    """
+    Get the current USD price of each symbol.
+
+    Args:
+        symbols (list): Coin symbols
+
+    Returns:
+        dict: Price keyed by symbol, symbols without a quote are left out
+    """
+    if not symbols:
+        return {}
+
+    coins_data = quote_store.get_response(symbols) or get_crypto_data_by_symbols(symbols)
+
+    if coins_data is None:
+        return {}
+
+    return {
+        symbol: coin_data['quote']['USD']['price']
+        for symbol, coin_data in coins_data['data'].items()
+        if coin_data
+    }
+
+
+class HoldingsIndex:
+    """
+    Open positions per (symbol, exchange, wallet) location with precomputed
+    group ids, so roll-ups to symbol, exchange and wallet level are one
+    bincount each.
+    """
+
+    def __init__(self, locations):
+        keys = sorted(locations)
+
+        self.keys = keys
+        self.quantity = np.array([locations[key]['quantity'] for key in keys], dtype=np.float64)
+        self.total_investment = np.array([locations[key]['total_investment'] for key in keys], dtype=np.float64)
+
+        self.symbols, self.symbol_ids = np.unique([key[0] for key in keys], return_inverse=True)
+        self.exchanges, self.exchange_ids = np.unique([key[1] for key in keys], return_inverse=True)
+        self.wallets, self.wallet_ids = np.unique([key[2] for key in keys], return_inverse=True)
+
+        self.symbols = self.symbols.tolist() if keys else []
+        self.exchanges = self.exchanges.tolist() if keys else []
+        self.wallets = self.wallets.tolist() if keys else []
+
+    def rollup(self, values, group):
+        """
+        Sum per-location values to one group level.
+
+        Args:
+            values (np.ndarray): Value per location
+            group (str): 'symbol', 'exchange' or 'wallet'
+
+        Returns:
+            np.ndarray: Sum per group, in the order of the group's names
+        """
+        ids = getattr(self, f'{group}_ids')
+        names = getattr(self, f'{group}s')
+
+        return np.bincount(ids, weights=values, minlength=len(names))
+
+
+_index_cache = VersionedCache()
+
+
+def get_holdings_index():
+    """
+    Return the location index of the open positions, rebuilt when the
+    transactions change.
+    """
+    return _index_cache.get(
+        'holdings_index',
+        get_versions()['transactions'],
+        lambda: HoldingsIndex(get_ledger().location_positions())
+    )
 
 
+@stage_metrics.timed('get_holdings')
 def get_holdings():
     """
-    Get portfolio data from CoinMarketCap and portfolio.json.
+    Get portfolio data from the quote snapshot store and the position ledger.
+
+    One quote lookup serves every location holding the same symbol. Falls
+    back to CoinMarketCap when a symbol has no quote in the store yet.
 
     Returns:
-        list: list of all holding coins
+        list: list of all holding coins, each with its per-location rows
         float: portfolio total value at current price
         float: initial investment
     """
-    portfolio = load_json_file('./config/portfolio.json')
+    portfolio = get_ledger().open_positions()
+
+    coins = list(portfolio.keys())
+
+    if not coins:
+        return [], 0, 0
+
+    coins_data = quote_store.get_response(coins)
+
+    if coins_data is None:
+        coins_data = get_crypto_data_by_symbols(coins)
+
+    index = get_holdings_index()
+    prices = np.array([
+        (coins_data['data'].get(symbol) or {}).get('quote', {}).get('USD', {}).get('price') or 0.0
+        for symbol in index.symbols
+    ], dtype=np.float64)
+
+    location_values = index.quantity * prices[index.symbol_ids] if len(index.keys) else np.zeros(0)
 
-    coins = [key for key in portfolio.keys() if key != 'last_update']
+    locations_by_symbol = {}
+    for i, (symbol, exchange, wallet) in enumerate(index.keys):
+        quantity = index.quantity[i]
+        total_investment = index.total_investment[i]
+        value = location_values[i]
+        pnl_amount = value - total_investment
 
-    coins_data = get_crypto_data_by_symbols(coins)
+        locations_by_symbol.setdefault(symbol, []).append({
+            'exchange': exchange,
+            'wallet': wallet,
+            'holdings': float(quantity),
+            'avg_price': float(total_investment / quantity) if quantity > 0 else 0,
+            'value': float(value),
+            'pnl_amount': float(pnl_amount),
+            'pnl_percentage': float(pnl_amount / total_investment * 100) if total_investment > 0 else 0,
+        })
 
     holdings = []
 
     current_value = 0
-    for symbol, data in portfolio.items():
-        if symbol != 'last_update':
-            coin_data = coins_data['data'][symbol]
-            if coin_data:
-                current_price = coin_data['quote']['USD']['price']
-                quantity = data['quantity']
-                current_value += current_price * quantity
-
     initial_investment = 0
     for symbol, data in portfolio.items():
-        if symbol != 'last_update':
-            coin_data = coins_data['data'][symbol]
-
-            if coin_data:
-                quantity = data['quantity']
-                avg_price = data['average_price']
-                total_investment = data['total_investment']
-
-                initial_investment += total_investment
-
-                coin_price = coin_data['quote']['USD']['price']
-                value = quantity * coin_price
-
-                pnl_amount = value - total_investment
-                pnl_percentage = (pnl_amount / data['total_investment']) * 100 if data['total_investment'] > 0 else 0
-                allocation = (value / current_value) * 100 if current_value > 0 else 0
-
-                holding = {
-                    'asset': coin_data['name'],
-                    'symbol': symbol,
-                    'holdings': round(quantity, 2),
-                    'exchange': 'Binance',
-                    'avg_price': avg_price,
-                    "current_price": coin_price,
-                    "value": value,
-                    "percentage": allocation,
-                    "day_change": round(coin_data['quote']['USD']['percent_change_24h'], 2),
-                    "week_change": round(coin_data['quote']['USD']['percent_change_7d'], 2),
-                    "pnl_amount": pnl_amount,
-                    "pnl_percentage": pnl_percentage,
-                    "allocation": round(allocation, 2)
-                }
-
-                holdings.append(holding)
+        coin_data = coins_data['data'].get(symbol)
+
+        if coin_data:
+            quantity = data['quantity']
+            avg_price = data['average_price']
+            total_investment = data['total_investment']
+
+            initial_investment += total_investment
+
+            coin_price = coin_data['quote']['USD']['price']
+            value = quantity * coin_price
+            current_value += value
+
+            pnl_amount = value - total_investment
+            pnl_percentage = (pnl_amount / total_investment) * 100 if total_investment > 0 else 0
+
+            locations = locations_by_symbol.get(symbol, [])
+            exchanges = sorted({location['exchange'] for location in locations})
+
+            if len(exchanges) == 1:
+                exchange = exchanges[0]
+            else:
+                exchange = f'{len(exchanges)} exchanges' if exchanges else 'Unknown'
+
+            holding = {
+                'asset': coin_data['name'],
+                'symbol': symbol,
+                'holdings': quantity,
+                'exchange': exchange,
+                'avg_price': avg_price,
+                "current_price": coin_price,
+                "value": value,
+                "day_change": round(coin_data['quote']['USD']['percent_change_24h'], 2),
+                "week_change": round(coin_data['quote']['USD']['percent_change_7d'], 2),
+                "pnl_amount": pnl_amount,
+                "pnl_percentage": pnl_percentage,
+                "locations": locations,
+            }
+
+            holdings.append(holding)
 
     # Load coin mappings
     coin_mappings = load_json_file("./config/coin_mappings.json")
 
-    # Add icon info to each holding
+    # Add allocation and icon info to each holding
     for holding in holdings:
+        allocation = (holding['value'] / current_value) * 100 if current_value > 0 else 0
+        holding['percentage'] = allocation
+        holding['allocation'] = round(allocation, 2)
+
+        for location in holding['locations']:
+            location['percentage'] = (location['value'] / current_value) * 100 if current_value > 0 else 0
+
         symbol = holding["symbol"]
         if symbol in coin_mappings:
             holding["coin_info"] = coin_mappings[symbol]
@@ -80,4 +205,50 @@ def get_holdings():
                 "icon": None
             }
 
-    return holdings, current_value, initial_investment
\ No newline at end of file
+    return holdings, current_value, initial_investment
+
+
+def group_holdings(group, holdings=None):
+    """
+    Roll the location holdings up to exchange or wallet level.
+
+    Args:
+        group (str): 'exchange' or 'wallet'
+        holdings (list, optional): Output of get_holdings, used for the
+            current prices. Defaults to a fresh get_holdings call.
+
+    Returns:
+        list: Rows with name, value, total_investment, P/L and allocation,
+              largest value first
+    """
+    if holdings is None:
+        holdings, _, _ = get_holdings()
+
+    index = get_holdings_index()
+
+    if not len(index.keys):
+        return []
+
+    prices = {holding['symbol']: holding['current_price'] for holding in holdings}
+    location_prices = np.array([prices.get(symbol, 0.0) for symbol in index.symbols], dtype=np.float64)
+
+    values = index.rollup(index.quantity * location_prices[index.symbol_ids], group)
+    investment = index.rollup(index.total_investment, group)
+    total_value = values.sum()
+
+    rows = []
+    for name, value, total_investment in zip(getattr(index, f'{group}s'), values.tolist(), investment.tolist()):
+        pnl_amount = value - total_investment
+
+        rows.append({
+            'name': name,
+            'value': value,
+            'total_investment': total_investment,
+            'pnl_amount': pnl_amount,
+            'pnl_percentage': (pnl_amount / total_investment) * 100 if total_investment > 0 else 0,
+            'allocation': round(float(value / total_value * 100), 2) if total_value > 0 else 0,
+        })
+
+    rows.sort(key=lambda row: row['value'], reverse=True)
+
+    return rows
@@ -0,0 +1,262 @@
+import io
+import csv
+import sys
+import json
+import logging
+import argparse
+
+from datetime import datetime, timezone
+
+from sdk import storage
+from sdk.portoflio import versions
+from sdk.portoflio.ledger import PositionLedger, get_ledger, reset_ledger, QUANTITY_EPSILON
+from sdk.portoflio.transactions import CSV_HEADER
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+# Optional columns accepted on top of CSV_HEADER
+OPTIONAL_COLUMNS = ('Exchange', 'Wallet', 'Notes')
+
+# Per-row errors included in an import report
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(filename):
+    """
+    Guess the import format from a file name, defaulting to CSV.
+    """
+    if filename and filename.lower().endswith(('.jsonl', '.json', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_rows(stream, fmt='csv'):
+    """
+    Read raw rows from a text stream one at a time.
+
+    Args:
+        stream (io.TextIOBase): CSV or JSON lines text
+        fmt (str): One of IMPORT_FORMATS
+
+    Yields:
+        tuple: (row number, dict of column values) or (row number, error message)
+    """
+    if fmt == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, f'Invalid JSON: {e}'
+                continue
+
+            yield number, row if isinstance(row, dict) else 'Expected a JSON object'
+        return
+
+    # Row numbers count the header as row 1, like a spreadsheet
+    for number, row in enumerate(csv.DictReader(stream), start=2):
+        yield number, row
+
+
+def parse_number(value, name):
+    """
+    Parse an exported number such as '1,234.50' or '$1,234.56'.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    try:
+        return float(str(value).replace('$', '').replace(',', '').strip())
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value!r}")
+
+
+def validate_row(row):
+    """
+    Convert one raw import row into a transaction.
+
+    Args:
+        row (dict): Values keyed by CSV_HEADER and OPTIONAL_COLUMNS names
+
+    Returns:
+        dict: Transaction with the storage TRANSACTION_COLUMNS keys
+
+    Raises:
+        ValueError: If the row is missing a column or has an invalid value
+    """
+    missing = [column for column in CSV_HEADER if column != 'Status' and row.get(column) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+
+    action = str(row['Action']).strip().upper()
+    if action not in ('BUY', 'SELL'):
+        raise ValueError(f"Invalid Action: {row['Action']!r}")
+
+    status = row.get('Status')
+    if status not in (None, '', 'Completed'):
+        raise ValueError(f"Unsupported Status: {status!r}")
+
+    try:
+        timestamp = datetime.strptime(f"{row['Date']} {row['Time']}", '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise ValueError(f"Invalid Date/Time: {row['Date']} {row['Time']}")
+
+    amount = parse_number(row['Amount'], 'Amount')
+    price = parse_number(row['Price'], 'Price')
+
+    if amount <= 0:
+        raise ValueError(f"Amount must be positive: {row['Amount']!r}")
+    if price < 0:
+        raise ValueError(f"Price must not be negative: {row['Price']!r}")
+
+    return {
+        'symbol': str(row['Symbol']).strip().upper(),
+        'action': action,
+        'amount': round(amount, 6),
+        'price': round(price, 6),
+        'total': round(parse_number(row['Total'], 'Total'), 2),
+        'exchange': row.get('Exchange') or 'Unknown',
+        'wallet': row.get('Wallet') or 'Unknown',
+        'notes': row.get('Notes') or '',
+        # Exported times are UTC
+        'timestamp': timestamp.replace(tzinfo=timezone.utc).isoformat(),
+    }
+
+
+def build_positions(existing, new, errors):
+    """
+    Replay the stored and the new transactions in timestamp order.
+
+    New SELLs of a symbol not held at that point are rejected, like
+    update_sell does for a single trade.
+
+    Args:
+        existing (list): Stored transactions in timestamp order
+        new (list): (row number, transaction) pairs to import
+        errors (list): Receives (row number, message) for rejected rows
+
+    Returns:
+        tuple: (open positions, accepted new transactions)
+    """
+    # Stable sort keeps stored transactions ahead of new ones at equal timestamps
+    merged = sorted(
+        [(tx['timestamp'], None, tx) for tx in existing] + [(tx['timestamp'], number, tx) for number, tx in new],
+        key=lambda item: item[0]
+    )
+
+    ledger = PositionLedger()
+    accepted = []
+
+    for _, number, tx in merged:
+        if number is not None:
+            position = ledger.positions.get(tx['symbol'])
+
+            if tx['action'] == 'SELL' and (position is None or position['quantity'] <= QUANTITY_EPSILON):
+                errors.append((number, f"No {tx['symbol']} position to sell"))
+                continue
+
+            if tx['action'] == 'SELL' and float(tx['amount']) > position['quantity'] + QUANTITY_EPSILON:
+                errors.append((number, f"Sells {tx['amount']} {tx['symbol']}, only {position['quantity']} held"))
+                continue
+
+            accepted.append(tx)
+
+        ledger.apply(tx)
+
+    return ledger.open_positions(), accepted
+
+
+def import_transactions(stream, fmt='csv', db_file=None):
+    """
+    Validate and import transactions from a CSV or JSON lines stream.
+
+    Rows are validated in a single streaming pass; the valid ones are
+    applied to the positions in timestamp order and committed in one batch.
+
+    Args:
+        stream (io.TextIOBase): Text in the columns of the CSV export
+        fmt (str): One of IMPORT_FORMATS
+        db_file (str, optional): Database path. Defaults to storage.DB_FILE.
+
+    Returns:
+        dict: Report with rows, imported, duplicates and per-row errors
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+    rows = 0
+    valid = []
+    errors = []
+
+    for number, row in iter_rows(stream, fmt):
+        rows += 1
+
+        if isinstance(row, str):
+            errors.append((number, row))
+            continue
+
+        try:
+            valid.append((number, validate_row(row)))
+        except ValueError as e:
+            errors.append((number, str(e)))
+
+    # Records the opening balances of positions the transaction log does not
+    # explain, so the replay below accounts for them
+    if db_file is None:
+        get_ledger()
+
+    # Storage hands back the same dicts, so row numbers can be keyed by identity
+    numbers = {id(tx): number for number, tx in valid}
+
+    def build(existing, new):
+        return build_positions(existing, [(numbers[id(tx)], tx) for tx in new], errors)
+
+    imported, duplicates = storage.import_transactions([tx for _, tx in valid], build, db_file)
+
+    if imported:
+        reset_ledger()
+        versions.bump('transactions')
+
+    logger.info(f"Imported {len(imported)} of {rows} transactions, "
+                f"{len(duplicates)} duplicates, {len(errors)} errors")
+
+    errors.sort()
+
+    return {
+        'rows': rows,
+        'imported': len(imported),
+        'duplicates': len(duplicates),
+        'error_count': len(errors),
+        'errors': [{'row': number, 'error': message} for number, message in errors[:MAX_REPORTED_ERRORS]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import transactions from a CSV or JSON lines file.')
+    parser.add_argument('path', help="File to import, '-' for standard input")
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension')
+    parser.add_argument('--db', default=None, help='Database path')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+
+    if args.path == '-':
+        report = import_transactions(io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8'), fmt, args.db)
+    else:
+        with open(args.path, 'r', encoding='utf-8', newline='') as file:
+            report = import_transactions(file, fmt, args.db)
+
+    print(f"{report['imported']} imported, {report['duplicates']} duplicates, "
+          f"{report['error_count']} errors out of {report['rows']} rows")
+
+    for error in report['errors']:
+        print(f"  row {error['row']}: {error['error']}")
+
+    return 1 if report['error_count'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
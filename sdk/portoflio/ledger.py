@@ -0,0 +1,440 @@
+import logging
+import threading
+
+from datetime import datetime, timedelta, timezone
+
+from sdk import storage
+
+logger = logging.getLogger(__name__)
+
+# Quantities below this are treated as a closed position
+QUANTITY_EPSILON = 1e-12
+
+# Stored and replayed quantities closer than this are considered equal
+BALANCE_TOLERANCE = 1e-6
+
+OPENING_BALANCE_NOTE = 'Opening balance not explained by the transaction log'
+
+
+def empty_position():
+    """
+    Return a position with no holdings.
+
+    Returns:
+        dict: Position state
+    """
+    return {
+        'quantity': 0.0,
+        'average_price': 0.0,
+        'total_investment': 0.0,
+        'total_bought': 0.0,
+        'realized_pnl': 0.0,
+    }
+
+
+def apply_trade(position, action, amount, price):
+    """
+    Apply a BUY or SELL to a position using average-cost accounting.
+
+    Args:
+        position (dict): Current position state, updated in place
+        action (str): Transaction action ('BUY', 'SELL')
+        amount (float): Transaction coin amount
+        price (float): Transaction price
+
+    Returns:
+        dict: The updated position
+
+    Raises:
+        ValueError: If a SELL is larger than the position
+    """
+    if action == 'BUY':
+        position['quantity'] += amount
+        position['total_investment'] += amount * price
+        position['total_bought'] += amount * price
+
+        if position['quantity'] > QUANTITY_EPSILON:
+            position['average_price'] = position['total_investment'] / position['quantity']
+
+    elif action == 'SELL':
+        if amount > position['quantity'] + QUANTITY_EPSILON:
+            raise ValueError(f"Cannot sell {amount}, the position holds {position['quantity']}")
+
+        sold = min(amount, position['quantity'])
+
+        position['realized_pnl'] += sold * (price - position['average_price'])
+        position['total_investment'] -= sold * position['average_price']
+        position['quantity'] -= sold
+
+        if position['quantity'] <= QUANTITY_EPSILON:
+            position['quantity'] = 0.0
+            position['total_investment'] = 0.0
+
+    else:
+        logger.error(f"Unknown transaction action: {action}")
+
+    return position
+
+
+class PositionLedger:
+    """
+    In-memory position state built from the transaction log.
+
+    Each new transaction is applied in O(1) and the portfolio totals are
+    kept up to date alongside the per-symbol positions.
+
+    Quantity and cost are also tracked per (symbol, exchange, wallet)
+    location, each with its own average cost: a sale reduces the cost of
+    the location it is taken from at that location's average price. The
+    symbol position keeps pooling the cost of all its locations.
+
+    Average cost and realised P/L depend on the order of the trades, so
+    stored transactions are applied in (timestamp, id) order, the order
+    of a full replay. See record().
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self.locations = {}
+        self.total_investment = 0.0
+        self.total_bought = 0.0
+        self.realized_pnl = 0.0
+
+        # Per symbol: (timestamp, id) of the latest applied transaction and the highest applied id
+        self.applied = {}
+
+        self._lock = threading.Lock()
+
+    def apply(self, transaction):
+        """
+        Apply a single transaction to the ledger.
+
+        A SELL larger than the position is logged and skipped.
+
+        Args:
+            transaction (dict): Transaction with symbol, action, amount and price
+        """
+        with self._lock:
+            self._apply(transaction)
+
+    def _apply(self, transaction):
+        symbol = transaction['symbol']
+        position = self.positions.setdefault(symbol, empty_position())
+
+        before = (position['total_investment'], position['total_bought'], position['realized_pnl'])
+
+        quantity_before = position['quantity']
+
+        try:
+            apply_trade(position, transaction['action'], float(transaction['amount']), float(transaction['price']))
+        except ValueError as e:
+            logger.error(f"Skipping {symbol} transaction {transaction.get('id')}: {e}")
+            return
+
+        self._apply_location(transaction, quantity_before - position['quantity'])
+
+        self.total_investment += position['total_investment'] - before[0]
+        self.total_bought += position['total_bought'] - before[1]
+        self.realized_pnl += position['realized_pnl'] - before[2]
+
+        if transaction.get('id') is not None:
+            key = (transaction['timestamp'], transaction['id'])
+            last_key, max_id = self.applied.get(symbol, (key, transaction['id']))
+            self.applied[symbol] = (max(last_key, key), max(max_id, transaction['id']))
+
+    def _replay_symbol(self, symbol, transactions):
+        """
+        Rebuild one symbol's position from its full transaction log.
+        """
+        position = self.positions.pop(symbol, None)
+        if position is not None:
+            self.total_investment -= position['total_investment']
+            self.total_bought -= position['total_bought']
+            self.realized_pnl -= position['realized_pnl']
+
+        for key in [key for key in self.locations if key[0] == symbol]:
+            del self.locations[key]
+
+        self.applied.pop(symbol, None)
+
+        for transaction in transactions:
+            self._apply(transaction)
+
+    def record(self, transaction, load_symbol_transactions):
+        """
+        Apply a newly stored transaction so the state matches a full replay.
+
+        A transaction ordered before the latest applied one of its symbol,
+        such as a backdated trade or one that lost a race with a concurrent
+        trade, makes the symbol be replayed from storage instead. Such a
+        replay also covers every transaction stored before it, so those are
+        skipped when they arrive.
+
+        Args:
+            transaction (dict): Stored transaction with its id
+            load_symbol_transactions (callable): Called with the symbol,
+                returns its stored transactions in (timestamp, id) order
+
+        Returns:
+            bool: True if the symbol was replayed
+        """
+        symbol = transaction['symbol']
+        key = (transaction['timestamp'], transaction['id'])
+
+        with self._lock:
+            last_key, max_id = self.applied.get(symbol, (None, 0))
+
+            if transaction['id'] <= max_id:
+                return False
+
+            if last_key is not None and key < last_key:
+                logger.info(f"Replaying {symbol} for out-of-order transaction {transaction['id']}")
+                self._replay_symbol(symbol, load_symbol_transactions(symbol))
+                return True
+
+            self._apply(transaction)
+            return False
+
+    def position(self, symbol):
+        """
+        Return a copy of one symbol's position, or None.
+        """
+        with self._lock:
+            position = self.positions.get(symbol)
+            return dict(position) if position is not None else None
+
+    def _apply_location(self, transaction, sold):
+        """
+        Apply a transaction to the quantity and cost held at its location.
+
+        A sale larger than the location holds is taken from the symbol's
+        other locations, in the order they were opened.
+        """
+        symbol = transaction['symbol']
+        key = (symbol, transaction.get('exchange') or 'Unknown', transaction.get('wallet') or 'Unknown')
+
+        if transaction['action'] == 'BUY':
+            amount = float(transaction['amount'])
+            location = self.locations.setdefault(key, {'quantity': 0.0, 'total_investment': 0.0})
+            location['quantity'] += amount
+            location['total_investment'] += amount * float(transaction['price'])
+            return
+
+        if sold <= 0:
+            return
+
+        candidates = [key] + [k for k in self.locations if k[0] == symbol and k != key]
+        for location_key in candidates:
+            location = self.locations.get(location_key)
+            if location is None:
+                continue
+
+            taken = min(sold, location['quantity'])
+            sold -= taken
+
+            if location['quantity'] - taken <= QUANTITY_EPSILON or self.positions[symbol]['quantity'] == 0:
+                del self.locations[location_key]
+            else:
+                location['total_investment'] -= taken * location['total_investment'] / location['quantity']
+                location['quantity'] -= taken
+
+            if sold <= QUANTITY_EPSILON and self.positions[symbol]['quantity'] > 0:
+                return
+
+    def location_positions(self):
+        """
+        Return a snapshot of the open positions per location.
+
+        Returns:
+            dict: Positions with quantity, average_price and total_investment
+                  keyed by (symbol, exchange, wallet)
+        """
+        with self._lock:
+            return {
+                key: {
+                    'quantity': location['quantity'],
+                    'average_price': location['total_investment'] / location['quantity'],
+                    'total_investment': location['total_investment'],
+                }
+                for key, location in self.locations.items()
+            }
+
+    def open_positions(self):
+        """
+        Return a snapshot of the positions that still hold a quantity.
+
+        Returns:
+            dict: Positions keyed by symbol
+        """
+        with self._lock:
+            return {
+                symbol: dict(position)
+                for symbol, position in self.positions.items()
+                if position['quantity'] > QUANTITY_EPSILON
+            }
+
+    def symbols(self):
+        return list(self.open_positions().keys())
+
+    def totals(self):
+        """
+        Return the portfolio level aggregates.
+
+        Returns:
+            dict: total_investment, total_bought and realized_pnl
+        """
+        with self._lock:
+            return {
+                'total_investment': self.total_investment,
+                'total_bought': self.total_bought,
+                'realized_pnl': self.realized_pnl,
+            }
+
+    @classmethod
+    def replay(cls, transactions):
+        """
+        Build a ledger by replaying a full transaction log.
+
+        Args:
+            transactions (list): Transactions in timestamp order
+
+        Returns:
+            PositionLedger: Ledger holding the replayed state
+        """
+        ledger = cls()
+
+        for transaction in transactions:
+            ledger.apply(transaction)
+
+        return ledger
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """
+    Return the process ledger, replaying the stored transactions on first use.
+
+    The transaction log is the only source of positions. Stored positions
+    it does not explain, such as ones migrated from a portfolio.json
+    without matching transactions, are first written to the log as
+    opening balances, see complete_transaction_log. The replayed positions
+    then replace the stored ones.
+
+    Returns:
+        PositionLedger: The shared ledger
+    """
+    global _ledger
+
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                transactions = storage.load_transactions()
+                ledger = PositionLedger.replay(transactions)
+
+                if not storage.transaction_log_complete():
+                    complete_transaction_log(ledger, transactions)
+                    ledger = PositionLedger.replay(storage.load_transactions())
+
+                storage.replace_positions(ledger.open_positions())
+
+                _ledger = ledger
+                logger.info(f"Position ledger initialised with {len(_ledger.positions)} symbols")
+
+    return _ledger
+
+
+def _shift_timestamp(timestamp, seconds):
+    return (datetime.fromisoformat(timestamp.replace('Z', '+00:00')) + timedelta(seconds=seconds)).isoformat()
+
+
+def opening_balances(stored, ledger, transactions):
+    """
+    Build the transactions that make a replay hold the stored positions.
+
+    A stored quantity above the replayed one becomes a BUY of the
+    difference at the stored average price, one second before the
+    symbol's first transaction or now if it has none. A smaller stored
+    quantity becomes a SELL of the difference at the replayed average
+    price, one second after the symbol's last transaction.
+
+    Args:
+        stored (dict): Stored positions keyed by symbol
+        ledger (PositionLedger): Ledger replayed from transactions
+        transactions (list): Stored transactions in (timestamp, id) order
+
+    Returns:
+        list: Transactions with the storage TRANSACTION_COLUMNS keys
+    """
+    replayed = ledger.open_positions()
+
+    first = {}
+    last = {}
+    for transaction in transactions:
+        first.setdefault(transaction['symbol'], transaction['timestamp'])
+        last[transaction['symbol']] = transaction['timestamp']
+
+    balances = []
+    for symbol in sorted(set(stored) | set(replayed)):
+        held = replayed.get(symbol, {}).get('quantity', 0.0)
+        difference = stored.get(symbol, {}).get('quantity', 0.0) - held
+
+        if abs(difference) <= BALANCE_TOLERANCE:
+            continue
+
+        if difference > 0:
+            action = 'BUY'
+            price = stored[symbol]['average_price']
+            if symbol in first:
+                timestamp = _shift_timestamp(first[symbol], -1)
+            else:
+                timestamp = datetime.now(timezone.utc).isoformat()
+        else:
+            action = 'SELL'
+            price = replayed[symbol]['average_price']
+            timestamp = _shift_timestamp(last[symbol], 1)
+
+        amount = abs(difference)
+        balances.append({
+            'symbol': symbol,
+            'action': action,
+            'amount': round(amount, 6),
+            'price': round(price, 6),
+            'total': round(amount * price, 2),
+            'exchange': 'Unknown',
+            'wallet': 'Unknown',
+            'notes': OPENING_BALANCE_NOTE,
+            'timestamp': timestamp,
+        })
+
+    return balances
+
+
+def complete_transaction_log(ledger, transactions):
+    """
+    Store the opening balances of the stored positions the transaction
+    log does not explain, and mark the log complete.
+
+    Args:
+        ledger (PositionLedger): Ledger replayed from transactions
+        transactions (list): Every stored transaction in (timestamp, id) order
+    """
+    balances = opening_balances(storage.load_positions(), ledger, transactions)
+
+    for balance in balances:
+        logger.warning(f"Recording a {balance['amount']} {balance['symbol']} {balance['action']} "
+                       f"opening balance the transaction log does not explain")
+
+    storage.complete_transaction_log(balances)
+
+
+def reset_ledger():
+    """
+    Drop the process ledger so the next get_ledger() call replays storage.
+    """
+    global _ledger
+
+    with _ledger_lock:
+        _ledger = None
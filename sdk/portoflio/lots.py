@@ -0,0 +1,288 @@
+import heapq
+import logging
+
+from array import array
+
+from sdk import storage
+from sdk.portoflio.ledger import QUANTITY_EPSILON
+from sdk.portoflio.versions import VersionedCache, get_versions
+
+logger = logging.getLogger(__name__)
+
+# Lot matching methods applied on SELL
+COST_BASIS_METHODS = ('fifo', 'lifo', 'hifo', 'average')
+DEFAULT_COST_BASIS_METHOD = 'fifo'
+
+_engines = VersionedCache()
+
+
+class LotBook:
+    """
+    Open tax lots of one symbol.
+
+    Lot quantities and prices are kept in two parallel arrays of doubles.
+    FIFO consumes from a moving head index, LIFO pops from the tail and
+    HIFO keeps a heap of (-price, lot index) over the same arrays. The
+    average method keeps a single pooled lot.
+    """
+
+    __slots__ = ('method', 'quantities', 'prices', 'head', 'heap', 'quantity', 'cost')
+
+    def __init__(self, method=DEFAULT_COST_BASIS_METHOD):
+        if method not in COST_BASIS_METHODS:
+            raise ValueError(f"Unknown cost basis method: {method}")
+
+        self.method = method
+        self.quantities = array('d')
+        self.prices = array('d')
+        self.head = 0
+        self.heap = []
+
+        # Open quantity and its cost basis
+        self.quantity = 0.0
+        self.cost = 0.0
+
+    def buy(self, amount, price):
+        """
+        Open a lot.
+        """
+        self.quantity += amount
+        self.cost += amount * price
+
+        if self.method == 'average':
+            return
+
+        if self.method == 'hifo':
+            heapq.heappush(self.heap, (-price, len(self.quantities)))
+
+        self.quantities.append(amount)
+        self.prices.append(price)
+
+    def sell(self, amount, price):
+        """
+        Close lots for a sale, at most the open quantity.
+
+        Args:
+            amount (float): Sold quantity
+            price (float): Sale price
+
+        Returns:
+            tuple: (realised P/L, cost basis of the sold quantity)
+        """
+        remaining = min(amount, self.quantity)
+        sold = remaining
+
+        if self.method == 'average':
+            cost = self.cost / self.quantity * remaining if self.quantity > QUANTITY_EPSILON else 0.0
+        elif self.method == 'fifo':
+            cost = self._sell_fifo(remaining)
+        elif self.method == 'lifo':
+            cost = self._sell_lifo(remaining)
+        else:
+            cost = self._sell_hifo(remaining)
+
+        self.quantity -= sold
+        self.cost -= cost
+
+        if self.quantity <= QUANTITY_EPSILON:
+            self.quantity = 0.0
+            self.cost = 0.0
+
+        return sold * price - cost, cost
+
+    def _sell_fifo(self, remaining):
+        quantities, prices = self.quantities, self.prices
+        head = self.head
+        cost = 0.0
+
+        while remaining > QUANTITY_EPSILON and head < len(quantities):
+            used = min(remaining, quantities[head])
+            cost += used * prices[head]
+            remaining -= used
+            quantities[head] -= used
+
+            if quantities[head] <= QUANTITY_EPSILON:
+                head += 1
+
+        # Drop the consumed prefix once it is at least half of the arrays
+        if head and head * 2 >= len(quantities):
+            del quantities[:head]
+            del prices[:head]
+            head = 0
+
+        self.head = head
+        return cost
+
+    def _sell_lifo(self, remaining):
+        quantities, prices = self.quantities, self.prices
+        cost = 0.0
+
+        while remaining > QUANTITY_EPSILON and quantities:
+            used = min(remaining, quantities[-1])
+            cost += used * prices[-1]
+            remaining -= used
+            quantities[-1] -= used
+
+            if quantities[-1] <= QUANTITY_EPSILON:
+                quantities.pop()
+                prices.pop()
+
+        return cost
+
+    def _sell_hifo(self, remaining):
+        quantities, prices, heap = self.quantities, self.prices, self.heap
+        cost = 0.0
+
+        while remaining > QUANTITY_EPSILON and heap:
+            index = heap[0][1]
+            used = min(remaining, quantities[index])
+            cost += used * prices[index]
+            remaining -= used
+            quantities[index] -= used
+
+            if quantities[index] <= QUANTITY_EPSILON:
+                heapq.heappop(heap)
+
+        # Closed lots stay in the arrays until they are the majority
+        if len(heap) * 2 < len(quantities):
+            self._compact_hifo()
+
+        return cost
+
+    def _compact_hifo(self):
+        indices = sorted(index for _, index in self.heap)
+
+        self.quantities = array('d', (self.quantities[index] for index in indices))
+        self.prices = array('d', (self.prices[index] for index in indices))
+        self.heap = [(-price, index) for index, price in enumerate(self.prices)]
+        heapq.heapify(self.heap)
+
+    def open_lots(self):
+        """
+        Return the open lots.
+
+        Returns:
+            list: (quantity, price) pairs, a single pooled lot for the average method
+        """
+        if self.method == 'average':
+            if self.quantity <= QUANTITY_EPSILON:
+                return []
+            return [(self.quantity, self.cost / self.quantity)]
+
+        return [
+            (quantity, price)
+            for quantity, price in zip(self.quantities[self.head:], self.prices[self.head:])
+            if quantity > QUANTITY_EPSILON
+        ]
+
+
+class CostBasisEngine:
+    """
+    Matches SELLs against open lots and accumulates realised P/L per symbol.
+    """
+
+    def __init__(self, method=DEFAULT_COST_BASIS_METHOD):
+        if method not in COST_BASIS_METHODS:
+            raise ValueError(f"Unknown cost basis method: {method}")
+
+        self.method = method
+        self.books = {}
+        self.realized = {}
+
+    def apply(self, transaction):
+        """
+        Apply a single transaction.
+
+        Args:
+            transaction (dict): Transaction with symbol, action, amount and price
+        """
+        symbol = transaction['symbol']
+        book = self.books.get(symbol)
+
+        if book is None:
+            book = self.books[symbol] = LotBook(self.method)
+            self.realized[symbol] = 0.0
+
+        action = transaction['action']
+        if action == 'BUY':
+            book.buy(float(transaction['amount']), float(transaction['price']))
+        elif action == 'SELL':
+            pnl, _ = book.sell(float(transaction['amount']), float(transaction['price']))
+            self.realized[symbol] += pnl
+        else:
+            logger.error(f"Unknown transaction action: {action}")
+
+    @classmethod
+    def replay(cls, transactions, method=DEFAULT_COST_BASIS_METHOD):
+        """
+        Build an engine by replaying a transaction log in timestamp order.
+        """
+        engine = cls(method)
+
+        for transaction in transactions:
+            engine.apply(transaction)
+
+        return engine
+
+    def report(self, prices=None):
+        """
+        Return realised and unrealised P/L per symbol and in aggregate.
+
+        Args:
+            prices (dict, optional): Current price keyed by symbol; symbols
+                without a price have no unrealised P/L
+
+        Returns:
+            dict: 'method', per-symbol 'symbols' and aggregate 'totals'
+        """
+        prices = prices or {}
+        symbols = {}
+        totals = {'cost_basis': 0.0, 'market_value': 0.0, 'realized_pnl': 0.0, 'unrealized_pnl': 0.0}
+
+        for symbol, book in self.books.items():
+            price = prices.get(symbol)
+
+            market_value = book.quantity * price if price is not None else None
+            unrealized = market_value - book.cost if market_value is not None else None
+
+            symbols[symbol] = {
+                'quantity': round(book.quantity, 8),
+                'cost_basis': round(book.cost, 2),
+                'average_cost': round(book.cost / book.quantity, 6) if book.quantity > QUANTITY_EPSILON else 0,
+                'open_lots': len(book.open_lots()),
+                'realized_pnl': round(self.realized[symbol], 2),
+                'unrealized_pnl': round(unrealized, 2) if unrealized is not None else None,
+            }
+
+            totals['cost_basis'] += book.cost
+            totals['realized_pnl'] += self.realized[symbol]
+            if market_value is not None:
+                totals['market_value'] += market_value
+                totals['unrealized_pnl'] += unrealized
+
+        return {
+            'method': self.method,
+            'symbols': symbols,
+            'totals': {name: round(value, 2) for name, value in totals.items()},
+        }
+
+
+def get_cost_basis_engine(method=DEFAULT_COST_BASIS_METHOD):
+    """
+    Return an engine replayed over the stored transactions, rebuilt only
+    when the transactions change.
+
+    Args:
+        method (str): One of COST_BASIS_METHODS
+
+    Returns:
+        CostBasisEngine: Replayed engine
+    """
+    if method not in COST_BASIS_METHODS:
+        raise ValueError(f"Unknown cost basis method: {method}")
+
+    return _engines.get(
+        method,
+        get_versions()['transactions'],
+        lambda: CostBasisEngine.replay(storage.load_transactions(), method)
+    )
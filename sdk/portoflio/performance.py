@@ -1,7 +1,21 @@
-import json
+import time
+import threading
 
-from datetime import datetime
-from sdk.variables_fetcher import load_json_file
+from collections import OrderedDict
+
+from sdk.candles import TIMEFRAMES, candle_store
+from sdk.portoflio.history import PortfolioHistory, naive_now, get_portfolio_history
+from sdk.portoflio.history import CHART_PERIODS as CHART_PERIOD_DAYS
+
+CHART_PERIODS = ["1D", "1W", "1M", "3M", "1Y", "All"]
+INITIAL_CHART_PERIOD = "1M"
+DEFAULT_CHART_POINTS = 500
+
+# Downsampled ranges kept per minute, one per requested (period, points)
+CHART_CACHE_SIZE = 32
+
+_chart_cache = {'history': None, 'size': 0, 'ranges': OrderedDict()}
+_chart_cache_lock = threading.Lock()
 
 
 def categorize_history_by_time(portfolio_history):
@@ -12,49 +26,15 @@ def categorize_history_by_time(portfolio_history):
     1D, 1W, 1M, 3M, 1Y, and All.
 
     Args:
-        portfolio_history (list): List of portfolio history entries.
+        portfolio_history (list or PortfolioHistory): Portfolio history entries.
 
     Returns:
         dict: Dictionary of categorized history data points by time period.
     """
-    chart_data = {
-        "1D": [],
-        "1W": [],
-        "1M": [],
-        "3M": [],
-        "1Y": [],
-        "All": []
-    }
-
-    now = datetime.now()
-
-    for entry in portfolio_history:
-        entry_date = datetime.strptime(entry["datetime"], "%Y-%m-%d %H:%M:%S")
-        timestamp = int(entry_date.timestamp() * 1000)  # milliseconds for JS
-
-        data_point = {
-            "x": timestamp,
-            "total_value": entry["total_value"],
-            "total_investment": entry["total_investment"],
-            "profit_loss": entry["profit_loss"],
-            "profit_loss_percentage": entry["profit_loss_percentage"]
-        }
-
-        days_diff = (now - entry_date).days
-
-        chart_data["All"].append(data_point)
-        if days_diff <= 365:
-            chart_data["1Y"].append(data_point)
-        if days_diff <= 90:
-            chart_data["3M"].append(data_point)
-        if days_diff <= 30:
-            chart_data["1M"].append(data_point)
-        if days_diff <= 7:
-            chart_data["1W"].append(data_point)
-        if days_diff <= 1:
-            chart_data["1D"].append(data_point)
+    if not isinstance(portfolio_history, PortfolioHistory):
+        portfolio_history = PortfolioHistory.from_entries(portfolio_history)
 
-    return chart_data
+    return portfolio_history.chart_buckets()
 
 
 def sort_chart_data(chart_data):
@@ -72,20 +52,69 @@ def sort_chart_data(chart_data):
     return chart_data
 
 
-def get_portfolio_performance():
+def get_chart_data(period, points=DEFAULT_CHART_POINTS):
     """
-    Generate portfolio performance chart data.
+    Get the downsampled chart data of one period.
+
+    Results are cached per (period, points) for the current minute, in
+    an LRU of CHART_CACHE_SIZE entries, and dropped when the history
+    changes.
+
+    Args:
+        period (str): One of 1D, 1W, 1M, 3M, 1Y or All
+        points (int): Target point count
+
+    Returns:
+        list: Chart data points
+    """
+    history = get_portfolio_history()
+    minute = naive_now() // 60
+    key = (period, points, minute)
+
+    with _chart_cache_lock:
+        ranges = _chart_cache['ranges']
+
+        if _chart_cache['history'] is not history or _chart_cache['size'] != len(history):
+            _chart_cache['history'] = history
+            _chart_cache['size'] = len(history)
+            ranges.clear()
+
+        if key in ranges:
+            ranges.move_to_end(key)
+            return ranges[key]
+
+    chart_points = history.chart_range(period, points)
+
+    with _chart_cache_lock:
+        if _chart_cache['history'] is history and _chart_cache['size'] == len(history):
+            for stale in [cached for cached in ranges if cached[2] != minute]:
+                del ranges[stale]
+
+            ranges[key] = chart_points
+
+            while len(ranges) > CHART_CACHE_SIZE:
+                ranges.popitem(last=False)
+
+    return chart_points
+
+
+def get_asset_chart_data(symbol, period, now=None):
+    """
+    Get the daily closes of one asset over a chart period.
+
+    Read from the candle store, which the price worker keeps up to date.
+
+    Args:
+        symbol (str): Coin symbol
+        period (str): One of CHART_PERIODS
+        now (int, optional): Epoch seconds. Defaults to the current time.
 
     Returns:
-        tuple:
-            - list: Transaction entries.
-            - str: JSON string of chart data categorized by time period.
+        list: Data points with x in milliseconds
     """
-    transactions = load_json_file('//config/transactions.json')
-    portfolio_history = load_json_file('./config/portfolio_history.json')
+    now = int(time.time() if now is None else now)
+    start = 0 if period == 'All' else now - (CHART_PERIOD_DAYS[period] + 1) * TIMEFRAMES['1d']
 
-    chart_data = categorize_history_by_time(portfolio_history)
-    sorted_chart_data = sort_chart_data(chart_data)
-    chart_data_json = json.dumps(sorted_chart_data)
+    ts, close = candle_store.closes(symbol, '1d', start, now)
 
-    return transactions, chart_data_json
+    return [{'x': timestamp * 1000, 'close': price} for timestamp, price in zip(ts.tolist(), close.tolist())]
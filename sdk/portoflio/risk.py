@@ -51,19 +51,26 @@ def calculate_risk_level(holdings):
     return risk_level, round(avg_risk_score, 1)
 
 
-def calculate_portfolio_volatility(holdings):
+def calculate_portfolio_volatility(holdings, risk_metrics=None):
     """
     Calculate portfolio volatility.
 
+    Uses the covariance of the stored daily returns when there is enough
+    price history, and a weighted average of the weekly changes otherwise.
+
     Args:
         holdings (list): List of holding dictionaries
+        risk_metrics (dict, optional): Result of risk_engine.get_risk_metrics
 
     Returns:
-        float: Portfolio volatility as a percentage
+        float: Annualised portfolio volatility as a percentage
     """
     if not holdings:
         return 0
 
+    if risk_metrics:
+        return round(risk_metrics['volatility'], 1)
+
     total_allocation = 0
     weighted_volatility = 0
 
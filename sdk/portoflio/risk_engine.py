@@ -0,0 +1,415 @@
+import sys
+import math
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from datetime import datetime, timezone
+
+from sdk import storage
+from sdk.candles import TIMEFRAMES, align, candle_store
+from sdk.portoflio.ledger import get_ledger
+
+logger = logging.getLogger(__name__)
+
+# Daily returns kept in the rolling window
+RISK_WINDOW_DAYS = 5 * 365
+
+# Days of returns needed before the covariance estimate is used
+MIN_RISK_HISTORY_DAYS = 30
+
+# Crypto trades every day of the year
+TRADING_DAYS_PER_YEAR = 365
+
+VAR_CONFIDENCE = 0.95
+
+
+def utc_today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def normal_quantile(p):
+    """
+    Inverse of the standard normal CDF (Acklam's rational approximation).
+    """
+    a = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+
+    if p < 0.02425:
+        q = math.sqrt(-2 * math.log(p))
+        return (((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) / \
+            ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1)
+
+    if p > 1 - 0.02425:
+        return -normal_quantile(1 - p)
+
+    q = p - 0.5
+    r = q * q
+    return (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q / \
+        (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1)
+
+
+class RiskEngine:
+    """
+    Rolling matrix of daily asset returns with incrementally updated
+    covariance sums.
+
+    Returns are kept in a ring buffer of window rows by one column per
+    asset, with a mask for days an asset has no close. Alongside it the
+    engine keeps three asset-by-asset sums over the window:
+
+        P = sum of r r^T, Q = sum of r m^T, N = sum of m m^T
+
+    New days are added to the sums and expired days subtracted from them,
+    so the pairwise covariance is available without rescanning the window.
+    """
+
+    def __init__(self, window=RISK_WINDOW_DAYS, db_file=None):
+        self.window = window
+        self.db_file = db_file
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.symbols = []
+        self.columns = {}
+
+        self.returns = np.zeros((self.window, 0))
+        self.masks = np.zeros((self.window, 0))
+        self.head = 0
+        self.days = 0
+
+        self.last_close = np.zeros(0)
+        self.last_date = None
+
+        self.cross = np.zeros((0, 0))
+        self.partial = np.zeros((0, 0))
+        self.counts = np.zeros((0, 0))
+
+    def reset(self):
+        """
+        Drop the window so the next refresh reloads every stored close.
+
+        Needed after closes older than the latest added day were stored,
+        which refresh would otherwise never read.
+        """
+        with self._lock:
+            self._reset()
+
+    def _add_symbols(self, symbols):
+        new = [symbol for symbol in symbols if symbol not in self.columns]
+        if not new:
+            return
+
+        for symbol in new:
+            self.columns[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+
+        grow = len(new)
+        self.returns = np.pad(self.returns, ((0, 0), (0, grow)))
+        self.masks = np.pad(self.masks, ((0, 0), (0, grow)))
+        self.last_close = np.concatenate([self.last_close, np.full(grow, np.nan)])
+        self.cross = np.pad(self.cross, ((0, grow), (0, grow)))
+        self.partial = np.pad(self.partial, ((0, grow), (0, grow)))
+        self.counts = np.pad(self.counts, ((0, grow), (0, grow)))
+
+    def add_days(self, days):
+        """
+        Add days of closes in date order.
+
+        The return rows are written to the ring buffer one at a time and
+        the covariance sums are then updated with one matrix product for
+        the added rows and one for the expired rows.
+
+        Args:
+            days (list): (ISO date, dict of close keyed by symbol) pairs,
+                         later than every date added before
+        """
+        if not days:
+            return
+
+        for _, closes in days:
+            self._add_symbols(closes)
+
+        added = []
+        expired = []
+
+        for date, closes in days:
+            close = np.full(len(self.symbols), np.nan)
+            for symbol, price in closes.items():
+                close[self.columns[symbol]] = price
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                r = close / self.last_close - 1
+
+            mask = np.isfinite(r)
+
+            self.last_close = np.where(np.isnan(close), self.last_close, close)
+            self.last_date = date
+
+            # The first close of the series has no return yet
+            if not mask.any() and self.days == 0:
+                continue
+
+            if self.days == self.window:
+                expired.append((self.returns[self.head].copy(), self.masks[self.head].copy()))
+            else:
+                self.days += 1
+
+            self.returns[self.head] = np.where(mask, r, 0.0)
+            self.masks[self.head] = mask
+            added.append((self.returns[self.head].copy(), self.masks[self.head].copy()))
+            self.head = (self.head + 1) % self.window
+
+        for rows, sign in ((added, 1), (expired, -1)):
+            if not rows:
+                continue
+
+            r = np.array([row for row, _ in rows])
+            m = np.array([mask for _, mask in rows])
+
+            self.cross += sign * (r.T @ r)
+            self.partial += sign * (r.T @ m)
+            self.counts += sign * (m.T @ m)
+
+    def add_day(self, date, closes):
+        """
+        Add one day of closes.
+
+        Args:
+            date (str): ISO date, later than every date added before
+            closes (dict): Close keyed by symbol
+        """
+        self.add_days([(date, closes)])
+
+    def refresh(self, today=None):
+        """
+        Add the stored closes of every completed day not seen yet.
+
+        Args:
+            today (str, optional): ISO date of the current, incomplete day
+
+        Returns:
+            int: Number of days added
+        """
+        with self._lock:
+            rows = storage.load_daily_closes(self.last_date, today or utc_today(), self.db_file)
+
+            days = []
+            for date, symbol, close in rows:
+                if not days or days[-1][0] != date:
+                    days.append((date, {}))
+                days[-1][1][symbol] = close
+
+            self.add_days(days)
+
+            return len(days)
+
+    def covariance(self):
+        """
+        Pairwise covariance of the daily returns over the window.
+
+        Each pair uses the days on which both assets have a return.
+
+        Returns:
+            np.ndarray: Asset-by-asset covariance, in self.symbols order
+        """
+        counts = self.counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (self.cross - self.partial * self.partial.T / counts) / (counts - 1)
+
+        cov[counts < 2] = 0.0
+        return cov
+
+    def history(self):
+        """
+        Return the windowed returns in chronological order.
+        """
+        if self.days < self.window:
+            return self.returns[:self.days]
+
+        return np.roll(self.returns, -self.head, axis=0)
+
+    def metrics(self, weights, confidence=VAR_CONFIDENCE):
+        """
+        Portfolio risk for the given weights.
+
+        Args:
+            weights (dict): Portfolio weight (fraction of value) keyed by symbol
+            confidence (float): VaR confidence level
+
+        Returns:
+            dict: Annualised and daily volatility in percent, historical and
+                  parametric one-day VaR and CVaR as percent of portfolio
+                  value, and each holding's share of the volatility in percent.
+                  None when the history is shorter than MIN_RISK_HISTORY_DAYS.
+        """
+        if self.days < MIN_RISK_HISTORY_DAYS or not weights:
+            return None
+
+        w = np.zeros(len(self.symbols))
+        for symbol, weight in weights.items():
+            if symbol in self.columns:
+                w[self.columns[symbol]] = weight
+
+        cov = self.covariance()
+        variance = max(float(w @ cov @ w), 0.0)
+        sigma = math.sqrt(variance)
+
+        portfolio_returns = self.history() @ w
+        alpha = 1 - confidence
+
+        cutoff = np.quantile(portfolio_returns, alpha)
+        tail = portfolio_returns[portfolio_returns <= cutoff]
+
+        mean = float(portfolio_returns.mean())
+        z = normal_quantile(alpha)
+        density = math.exp(-z * z / 2) / math.sqrt(2 * math.pi)
+
+        marginal = cov @ w / sigma if sigma > 0 else np.zeros(len(w))
+        contribution = w * marginal / sigma * 100 if sigma > 0 else np.zeros(len(w))
+
+        return {
+            'days': self.days,
+            'volatility': round(sigma * math.sqrt(TRADING_DAYS_PER_YEAR) * 100, 2),
+            'daily_volatility': round(sigma * 100, 4),
+            'var_historical': round(-float(cutoff) * 100, 4),
+            'cvar_historical': round(-float(tail.mean()) * 100, 4),
+            'var_parametric': round(-(mean + z * sigma) * 100, 4),
+            'cvar_parametric': round(-(mean - sigma * density / alpha) * 100, 4),
+            'contributions': {
+                symbol: {
+                    'weight': round(weights[symbol] * 100, 2),
+                    'marginal': round(float(marginal[self.columns[symbol]]) * 100, 4),
+                    'contribution': round(float(contribution[self.columns[symbol]]), 2),
+                }
+                for symbol in weights
+                if symbol in self.columns
+            },
+        }
+
+
+risk_engine = RiskEngine()
+
+
+def record_daily_closes(response):
+    """
+    Store the latest quote of each symbol as today's close.
+
+    Registered as a price worker listener; the last update of a UTC day
+    is that day's close.
+
+    Args:
+        response (dict): Quotes response with a 'data' mapping
+    """
+    closes = {
+        symbol: coin_data['quote']['USD']['price']
+        for symbol, coin_data in (response.get('data') or {}).items()
+        if coin_data and coin_data.get('quote', {}).get('USD', {}).get('price') is not None
+    }
+
+    if closes:
+        storage.save_daily_closes(closes, utc_today())
+
+
+def backfill_daily_closes(symbols, days=RISK_WINDOW_DAYS, store=None):
+    """
+    Store the daily candle closes of the completed days of the window.
+
+    Seeds the return matrix of a new installation, which would otherwise
+    need MIN_RISK_HISTORY_DAYS of running price worker first. The shared
+    risk engine is reset so it reloads the window with the seeded days.
+
+    Args:
+        symbols (list): Coin symbols
+        days (int): Days of history to fill
+        store (CandleStore, optional): Defaults to the shared candle_store
+
+    Returns:
+        int: Number of days with at least one close
+    """
+    store = store or candle_store
+    end = align(datetime.now(timezone.utc).timestamp(), '1d')
+    start = end - days * TIMEFRAMES['1d']
+
+    closes = {}
+    for symbol in symbols:
+        if store.provider is not None:
+            store.backfill(symbol, '1d', start, end)
+
+        ts, close = store.closes(symbol, '1d', start, end)
+        for day, price in zip(ts.tolist(), close.tolist()):
+            date = datetime.fromtimestamp(day, timezone.utc).date().isoformat()
+            closes.setdefault(date, {})[symbol] = price
+
+    for date in sorted(closes):
+        storage.save_daily_closes(closes[date], date)
+
+    if closes:
+        risk_engine.reset()
+
+    return len(closes)
+
+
+def update_daily_candles(response):
+    """
+    Fetch the daily candles completed since the last update and store
+    their closes.
+
+    Registered as a price worker listener. Symbols without candles get
+    the whole risk window, so a new installation is seeded on the first
+    poll; afterwards each symbol fetches one candle per completed day.
+
+    Args:
+        response (dict): Quotes response with a 'data' mapping
+    """
+    symbols = list(response.get('data') or {})
+    if not symbols:
+        return
+
+    stored = candle_store.update('1d', symbols, lookback=RISK_WINDOW_DAYS * TIMEFRAMES['1d'])
+
+    updated = [symbol for symbol, count in stored.items() if count]
+    if updated:
+        backfill_daily_closes(updated)
+
+
+def get_risk_metrics(holdings):
+    """
+    Return the covariance-based risk metrics of the current holdings.
+
+    Args:
+        holdings (list): List of holding dictionaries
+
+    Returns:
+        dict: See RiskEngine.metrics, or None without enough price history
+    """
+    risk_engine.refresh()
+
+    weights = {holding['symbol']: holding['percentage'] / 100 for holding in holdings}
+
+    return risk_engine.metrics(weights)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the daily closes of the risk window from daily candles.')
+    parser.add_argument('--days', type=int, default=RISK_WINDOW_DAYS, help='Days of history to fill')
+    parser.add_argument('symbols', nargs='*', help='Defaults to the portfolio symbols')
+    args = parser.parse_args(argv)
+
+    days = backfill_daily_closes(args.symbols or get_ledger().symbols(), args.days)
+    print(f"{days} days of closes stored")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import os
+import logging
+import threading
+
+import numpy as np
+
+from sdk.portoflio.holdings import get_holdings
+from sdk.portoflio.analytics import calculate_profit_loss
+from sdk.portoflio.history import SECONDS_PER_DAY, append_snapshot, naive_now
+
+logger = logging.getLogger(__name__)
+
+RAW_SNAPSHOTS_FILE = './config/portfolio_history.bin'
+HOURLY_ROLLUP_FILE = './config/portfolio_history_1h.bin'
+DAILY_ROLLUP_FILE = './config/portfolio_history_1d.bin'
+
+# Fixed-width snapshot record, timestamps in naive local epoch seconds
+SNAPSHOT_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('total_value', '<f8'),
+    ('total_investment', '<f8'),
+    ('profit_loss', '<f8'),
+    ('profit_loss_percentage', '<f8'),
+])
+
+# Rollup record: OHLC of the total value plus the closing values of the other columns
+ROLLUP_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('total_investment', '<f8'),
+    ('profit_loss', '<f8'),
+    ('profit_loss_percentage', '<f8'),
+])
+
+SECONDS_PER_HOUR = 3600
+
+
+def open_records(path, dtype):
+    """
+    Open a fixed-width record file read-only through numpy.memmap.
+
+    A partially written trailing record is ignored.
+
+    Args:
+        path (str): Record file path
+        dtype (np.dtype): Record layout
+
+    Returns:
+        np.ndarray: Memory-mapped records, or an empty array
+    """
+    if not os.path.exists(path):
+        return np.empty(0, dtype=dtype)
+
+    count = os.path.getsize(path) // dtype.itemsize
+
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def read_range(records, start=None, end=None):
+    """
+    Return the records with start <= timestamp < end, without copying.
+
+    Args:
+        records (np.ndarray): Records sorted by timestamp
+        start (int, optional): Inclusive lower bound in epoch seconds
+        end (int, optional): Exclusive upper bound in epoch seconds
+
+    Returns:
+        np.ndarray: View over the matching records
+    """
+    timestamps = records['timestamp']
+
+    first = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+    last = len(records) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+
+    return records[first:last]
+
+
+def write_records(path, records):
+    """
+    Atomically replace a record file.
+    """
+    tmp_path = f'{path}.tmp'
+
+    with open(tmp_path, 'wb') as file:
+        file.write(np.ascontiguousarray(records).tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(tmp_path, path)
+
+
+def rollup(records, bucket_seconds, value_field='total_value'):
+    """
+    Aggregate records into OHLC buckets.
+
+    Args:
+        records (np.ndarray): Snapshot or rollup records sorted by timestamp
+        bucket_seconds (int): Bucket width
+        value_field (str): 'total_value' for raw snapshots; rollup records
+            are re-aggregated from their own open/high/low/close
+
+    Returns:
+        np.ndarray: ROLLUP_DTYPE records, one per non-empty bucket
+    """
+    if len(records) == 0:
+        return np.empty(0, dtype=ROLLUP_DTYPE)
+
+    buckets = records['timestamp'] // bucket_seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(records)] - 1
+
+    if value_field == 'total_value':
+        opens = highs = lows = closes = records['total_value']
+    else:
+        opens, highs, lows, closes = records['open'], records['high'], records['low'], records['close']
+
+    result = np.empty(len(starts), dtype=ROLLUP_DTYPE)
+    result['timestamp'] = buckets[starts] * bucket_seconds
+    result['open'] = opens[starts]
+    result['high'] = np.maximum.reduceat(highs, starts)
+    result['low'] = np.minimum.reduceat(lows, starts)
+    result['close'] = closes[ends]
+    result['total_investment'] = records['total_investment'][ends]
+    result['profit_loss'] = records['profit_loss'][ends]
+    result['profit_loss_percentage'] = records['profit_loss_percentage'][ends]
+
+    return result
+
+
+def merge_rollups(existing, new):
+    """
+    Append rollup records, merging a bucket present in both.
+    """
+    if len(existing) == 0:
+        return new
+    if len(new) == 0:
+        return np.array(existing)
+
+    if existing['timestamp'][-1] == new['timestamp'][0]:
+        merged = np.array(new[:1])
+        merged['open'] = existing['open'][-1]
+        merged['high'] = max(existing['high'][-1], new['high'][0])
+        merged['low'] = min(existing['low'][-1], new['low'][0])
+        return np.concatenate([existing[:-1], merged, new[1:]])
+
+    return np.concatenate([existing, new])
+
+
+class SnapshotRecorder:
+    """
+    Appends portfolio snapshots to a fixed-width binary file and rolls old
+    snapshots up into hourly and daily OHLC files.
+
+    Snapshots taken by record_portfolio are also appended to the SQLite
+    portfolio history, so the page has a history whichever source it reads.
+    """
+
+    def __init__(self, raw_path=RAW_SNAPSHOTS_FILE, hourly_path=HOURLY_ROLLUP_FILE, daily_path=DAILY_ROLLUP_FILE,
+                 min_interval=60, compact_interval=SECONDS_PER_DAY):
+        self.raw_path = raw_path
+        self.hourly_path = hourly_path
+        self.daily_path = daily_path
+        self.min_interval = min_interval
+        self.compact_interval = compact_interval
+
+        self.last_recorded = None
+        self.last_compacted = None
+        self._lock = threading.Lock()
+
+    def record(self, timestamp, total_value, total_investment, profit_loss, profit_loss_percentage):
+        """
+        Append one snapshot.
+
+        Args:
+            timestamp (int): Naive local epoch seconds
+            total_value (float): Portfolio value
+            total_investment (float): Invested amount
+            profit_loss (float): Profit/loss amount
+            profit_loss_percentage (float): Profit/loss percentage
+        """
+        record = np.array(
+            [(timestamp, total_value, total_investment, profit_loss, profit_loss_percentage)],
+            dtype=SNAPSHOT_DTYPE
+        )
+
+        with self._lock:
+            with open(self.raw_path, 'ab') as file:
+                file.write(record.tobytes())
+
+            self.last_recorded = timestamp
+
+    def record_portfolio(self, *args):
+        """
+        Record the current portfolio value, at most once per min_interval.
+
+        Accepts and ignores listener arguments so it can be registered on
+        the price ingestion worker.
+
+        Returns:
+            bool: True if a snapshot was written
+        """
+        now = naive_now()
+
+        if self.last_recorded is not None and now - self.last_recorded < self.min_interval:
+            return False
+
+        try:
+            _, current_value, total_investment = get_holdings()
+            profit_loss = calculate_profit_loss(current_value)
+        except Exception as e:
+            logger.error(f"Snapshot recorder could not value the portfolio: {e}")
+            return False
+
+        self.record(now, current_value, total_investment, profit_loss['amount'], profit_loss['percentage'])
+
+        try:
+            append_snapshot({
+                'datetime': str(np.datetime64(now, 's')).replace('T', ' '),
+                'total_value': current_value,
+                'total_investment': total_investment,
+                'profit_loss': profit_loss['amount'],
+                'profit_loss_percentage': profit_loss['percentage'],
+            })
+        except Exception as e:
+            logger.error(f"Snapshot recorder could not store the snapshot: {e}")
+
+        if self.last_compacted is None or now - self.last_compacted >= self.compact_interval:
+            self.compact(now=now)
+
+        return True
+
+    def compact(self, raw_days=7, hourly_days=365, now=None):
+        """
+        Roll raw snapshots older than raw_days into hourly OHLC records, and
+        hourly records older than hourly_days into daily OHLC records.
+
+        Args:
+            raw_days (int): Days of raw snapshots to keep
+            hourly_days (int): Days of hourly rollups to keep
+            now (int, optional): Naive local epoch seconds. Defaults to now.
+        """
+        now = naive_now() if now is None else now
+
+        # Cut-offs on bucket boundaries so no bucket is split across files
+        raw_cutoff = (now - raw_days * SECONDS_PER_DAY) // SECONDS_PER_HOUR * SECONDS_PER_HOUR
+        hourly_cutoff = (now - hourly_days * SECONDS_PER_DAY) // SECONDS_PER_DAY * SECONDS_PER_DAY
+
+        with self._lock:
+            raw = np.array(open_records(self.raw_path, SNAPSHOT_DTYPE))
+            hourly = np.array(open_records(self.hourly_path, ROLLUP_DTYPE))
+            daily = np.array(open_records(self.daily_path, ROLLUP_DTYPE))
+
+            expired_raw = read_range(raw, end=raw_cutoff)
+            hourly = merge_rollups(hourly, rollup(expired_raw, SECONDS_PER_HOUR))
+
+            expired_hourly = read_range(hourly, end=hourly_cutoff)
+            daily = merge_rollups(daily, rollup(expired_hourly, SECONDS_PER_DAY, value_field='open'))
+
+            write_records(self.daily_path, daily)
+            write_records(self.hourly_path, read_range(hourly, start=hourly_cutoff))
+            write_records(self.raw_path, read_range(raw, start=raw_cutoff))
+
+            self.last_compacted = now
+
+        logger.info(f"Compacted {len(expired_raw)} raw snapshots and {len(expired_hourly)} hourly rollups")
+
+    def signature(self):
+        """
+        Return a cheap signature that changes whenever a file changes.
+        """
+        signature = []
+        for path in (self.raw_path, self.hourly_path, self.daily_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+
+        return tuple(signature)
+
+    def load_columns(self):
+        """
+        Load the daily, hourly and raw records as history columns.
+
+        Rollups contribute their close as the total value; their lows and
+        highs are returned separately for the all-time extremes.
+
+        Returns:
+            tuple: (timestamps, total_value, total_investment, profit_loss,
+                    profit_loss_percentage), (lowest low, highest high) or None
+        """
+        raw = open_records(self.raw_path, SNAPSHOT_DTYPE)
+        hourly = open_records(self.hourly_path, ROLLUP_DTYPE)
+        daily = open_records(self.daily_path, ROLLUP_DTYPE)
+
+        rollups = [records for records in (daily, hourly) if len(records)]
+
+        columns = (
+            np.concatenate([r['timestamp'] for r in rollups] + [raw['timestamp']]),
+            np.concatenate([r['close'] for r in rollups] + [raw['total_value']]),
+            np.concatenate([r['total_investment'] for r in rollups] + [raw['total_investment']]),
+            np.concatenate([r['profit_loss'] for r in rollups] + [raw['profit_loss']]),
+            np.concatenate([r['profit_loss_percentage'] for r in rollups] + [raw['profit_loss_percentage']]),
+        )
+
+        extremes = None
+        if rollups:
+            extremes = (
+                float(min(r['low'].min() for r in rollups)),
+                float(max(r['high'].max() for r in rollups)),
+            )
+
+        return columns, extremes
+
+
+snapshot_recorder = SnapshotRecorder()
@@ -0,0 +1,330 @@
+import json
+import logging
+import threading
+
+from collections import deque
+
+from sdk import storage
+from sdk.portoflio.holdings import get_holdings
+from sdk.portoflio.history import get_portfolio_history
+from sdk.portoflio.analytics import calculate_profit_loss, portfolio_versions
+
+logger = logging.getLogger(__name__)
+
+# Events kept for clients reconnecting with a cursor
+STREAM_BUFFER_SIZE = 256
+
+# Seconds between heartbeat comments on an idle connection
+HEARTBEAT_INTERVAL = 15
+
+# Seconds between two checks of the input versions by the producer
+PRODUCER_INTERVAL = 1
+
+# Undelivered events per client before it is switched to a resync snapshot
+CLIENT_QUEUE_SIZE = 16
+
+# Milliseconds a disconnected browser waits before reconnecting
+RECONNECT_DELAY = 3000
+
+# Holding fields pushed to the page
+HOLDING_FIELDS = ('holdings', 'current_price', 'value', 'percentage', 'day_change', 'pnl_amount', 'pnl_percentage')
+
+
+def format_event(event_id, name, data):
+    """
+    Serialise one server-sent event.
+    """
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    """
+    Pending events of one connected client.
+
+    A client that falls more than max_pending events behind loses the
+    intermediate events and receives a single snapshot instead.
+    """
+
+    def __init__(self, max_pending=CLIENT_QUEUE_SIZE):
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.resync = False
+        self.condition = threading.Condition()
+
+    def push(self, event):
+        with self.condition:
+            if self.resync:
+                return
+
+            if len(self.pending) >= self.max_pending:
+                self.pending.clear()
+                self.resync = True
+            else:
+                self.pending.append(event)
+
+            self.condition.notify()
+
+    def wait(self, timeout):
+        """
+        Wait for events.
+
+        Returns:
+            tuple: (resync flag, list of pending events)
+        """
+        with self.condition:
+            if not self.pending and not self.resync:
+                self.condition.wait(timeout)
+
+            resync, events = self.resync, list(self.pending)
+            self.pending.clear()
+            self.resync = False
+
+        return resync, events
+
+
+class PortfolioStream:
+    """
+    Shared producer of live portfolio deltas.
+
+    One background thread watches the transactions, quotes and history
+    versions. When any of them changes while clients are connected, it
+    computes the holdings and totals once, diffs them against the last
+    published state and fans the delta out to every subscriber. Deltas
+    carry the changed holdings, the totals, new transactions and new
+    chart points.
+
+    Every event has an increasing id. A reconnecting client sends the
+    last id it saw and gets the missed events replayed from the buffer,
+    or a full snapshot if they are no longer buffered. Snapshots only
+    carry holdings and totals, so one sent in place of lost events is
+    flagged as a gap and the page reloads to pick up the transactions
+    and chart points it missed.
+    """
+
+    def __init__(self, buffer_size=STREAM_BUFFER_SIZE, heartbeat=HEARTBEAT_INTERVAL, interval=PRODUCER_INTERVAL,
+                 client_queue_size=CLIENT_QUEUE_SIZE):
+        self.heartbeat = heartbeat
+        self.interval = interval
+        self.client_queue_size = client_queue_size
+
+        self.events = deque(maxlen=buffer_size)
+        self.last_id = 0
+        self.state = None
+        self.versions = None
+        self.subscribers = set()
+
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def _compute(self):
+        """
+        Read the current holdings, totals, new transactions and history length.
+        """
+        holdings, current_value, _ = get_holdings()
+        history = get_portfolio_history()
+
+        if self.state is None:
+            new_transactions = []
+            last_transaction_id = storage.last_transaction_id()
+        else:
+            new_transactions = storage.load_transactions_after(self.state['last_transaction_id'])
+            last_transaction_id = new_transactions[-1]['id'] if new_transactions else self.state['last_transaction_id']
+
+        return {
+            'holdings': {
+                holding['symbol']: {field: holding[field] for field in HOLDING_FIELDS}
+                for holding in holdings
+            },
+            'totals': {
+                'current_value': round(current_value, 2),
+                'profit_loss': calculate_profit_loss(current_value),
+            },
+            'new_transactions': new_transactions,
+            'last_transaction_id': last_transaction_id,
+            'history_length': len(history),
+        }
+
+    def publish(self, force=False):
+        """
+        Publish a delta if the inputs changed since the last one.
+
+        Args:
+            force (bool): Recompute even if the versions are unchanged
+
+        Returns:
+            tuple: The published (id, name, data) event, or None
+        """
+        with self._lock:
+            versions = portfolio_versions()
+            if not force and versions == self.versions:
+                return None
+
+            current = self._compute()
+            previous = self.state
+
+            delta = {}
+
+            changed = {
+                symbol: row for symbol, row in current['holdings'].items()
+                if previous is None or previous['holdings'].get(symbol) != row
+            }
+            if changed:
+                delta['holdings'] = changed
+
+            if previous is not None:
+                removed = [symbol for symbol in previous['holdings'] if symbol not in current['holdings']]
+                if removed:
+                    delta['removed'] = removed
+
+            if previous is None or previous['totals'] != current['totals']:
+                delta['totals'] = current['totals']
+
+            if current['new_transactions']:
+                delta['transactions'] = current['new_transactions']
+
+            if previous is not None and current['history_length'] > previous['history_length']:
+                delta['chart'] = get_portfolio_history().chart_points(start=previous['history_length'])
+
+            self.versions = versions
+            self.state = {
+                'holdings': current['holdings'],
+                'totals': current['totals'],
+                'history_length': current['history_length'],
+                'last_transaction_id': current['last_transaction_id'],
+            }
+
+            if previous is None or not delta:
+                return None
+
+            self.last_id += 1
+            event = (self.last_id, 'delta', delta)
+            self.events.append(event)
+
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            subscriber.push(event)
+
+        return event
+
+    def snapshot(self, gap=False):
+        """
+        Return the full published state as an event at the current id.
+
+        Args:
+            gap (bool): Whether the snapshot replaces events the client lost
+        """
+        with self._lock:
+            if self.state is None:
+                self.publish(force=True)
+
+            return self.last_id, 'snapshot', {
+                'holdings': self.state['holdings'],
+                'totals': self.state['totals'],
+                'gap': gap,
+            }
+
+    def replay(self, cursor):
+        """
+        Return the buffered events after cursor, or None if some were dropped.
+        """
+        with self._lock:
+            if cursor > self.last_id:
+                return None
+            if cursor == self.last_id:
+                return []
+            if not self.events or self.events[0][0] > cursor + 1:
+                return None
+
+            return [event for event in self.events if event[0] > cursor]
+
+    def subscribe(self, cursor=None):
+        """
+        Yield the server-sent events of one client until it disconnects.
+
+        Args:
+            cursor (int, optional): Last event id the client received
+
+        Yields:
+            str: Serialised events and heartbeat comments
+        """
+        subscriber = Subscriber(self.client_queue_size)
+
+        with self._lock:
+            self.subscribers.add(subscriber)
+            missed = self.replay(cursor) if cursor is not None else None
+
+        self.start()
+
+        try:
+            yield f"retry: {RECONNECT_DELAY}\n\n"
+
+            if missed is None:
+                yield format_event(*self.snapshot(gap=cursor is not None))
+            else:
+                for event in missed:
+                    yield format_event(*event)
+
+            while True:
+                resync, events = subscriber.wait(self.heartbeat)
+
+                if resync:
+                    yield format_event(*self.snapshot(gap=True))
+                elif events:
+                    for event in events:
+                        yield format_event(*event)
+                else:
+                    yield ": heartbeat\n\n"
+        finally:
+            with self._lock:
+                self.subscribers.discard(subscriber)
+
+    def run_once(self):
+        """
+        Publish a delta if clients are connected, or drop the buffered state if not.
+        """
+        if self.subscribers:
+            try:
+                self.publish()
+            except Exception as e:
+                logger.error(f"Portfolio stream producer error: {str(e)}")
+            return
+
+        # Without clients nothing is diffed, so cursors from before
+        # cannot be replayed and the next client starts from a snapshot
+        with self._lock:
+            if self.state is not None:
+                self.state = None
+                self.versions = None
+                self.events.clear()
+                self.last_id += 1
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """
+        Start the producer thread if it is not already running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='portfolio-stream', daemon=True)
+            self._thread.start()
+
+        logger.info("Portfolio stream producer started")
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+portfolio_stream = PortfolioStream()
@@ -1,41 +1,38 @@
 import csv
+import zlib
 import logging
 from io import StringIO
 
-import pytz
+from sdk import storage
+from sdk.variables_fetcher import create_transaction
+from sdk.portoflio import versions
+from sdk.portoflio.ledger import get_ledger, apply_trade, empty_position
 
-from sdk.variables_fetcher import (
-    load_json_file,
-    save_transaction,
-    save_new_transaction,
-    save_data_to_json_file,
-)
-
-from datetime import datetime, timezone
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 
-def load_transactions():
+def load_transactions(symbol=None):
     """
-    Load transactions from the JSON file.
+    Load transactions from storage.
+
+    Args:
+        symbol (str, optional): Only load transactions for this symbol
 
     Returns:
         list: List of transaction dictionaries
     """
-    transactions = load_json_file('./config/transactions.json')
+    transactions = storage.load_transactions(symbol)
 
     if len(transactions) == 0:
-        logger.error('No transactions found in the JSON file.')
+        logger.error('No transactions found in storage.')
         return
 
     # Convert timestamps to datetime objects for sorting
     for transaction in transactions:
         transaction['datetime'] = datetime.fromisoformat(transaction['timestamp'].replace('Z', '+00:00'))
 
-        transaction['amount'] =  f"{round(transaction['amount'], 2):,.2f}"
-        transaction['price'] =  f"${round(transaction['price'], 2):,.2f}"
-
     # Sort transactions by date (newest first)
     transactions.sort(key=lambda x: x['datetime'], reverse=True)
 
@@ -51,16 +48,98 @@ def load_transactions_by_symbol(symbol):
     Returns:
         list: List of transaction dictionaries for the specified symbol.
     """
-    transactions = load_transactions()
+    transactions = load_transactions(symbol)
 
     if transactions is None:
-        logger.error('No transactions found in the JSON file.')
+        logger.error(f'No transactions found for {symbol}.')
         return []
 
-    # Filter transactions by symbol
-    filtered_transactions = [tx for tx in transactions if tx['symbol'] == symbol]
+    return transactions
+
+CSV_HEADER = ['Date', 'Time', 'Action', 'Symbol', 'Amount', 'Price', 'Total', 'Status']
+
+
+def create_csv_filename(symbols=None, gzip=False):
+    """
+    Build the download filename for a transactions export.
+
+    Args:
+        symbols (list, optional): Exported symbols, None for all transactions
+        gzip (bool): Whether the export is gzip compressed
+
+    Returns:
+        str: Filename for the CSV.
+    """
+    prefix = '_'.join(symbols) if symbols else 'all'
+    filename = f"{prefix}_transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+    return filename + '.gz' if gzip else filename
+
+
+def stream_csv_content(symbols=None, start=None, end=None, chunk_size=500):
+    """
+    Stream transactions as CSV lines in timestamp order.
+
+    Transactions are read from storage in chunks, so memory use does not
+    grow with the size of the history.
+
+    Args:
+        symbols (list, optional): Symbols to export, None for all transactions
+        start (str, optional): Inclusive lower bound on the ISO timestamp
+        end (str, optional): Exclusive upper bound on the ISO timestamp
+        chunk_size (int): Transactions read from storage per query
+
+    Yields:
+        str: CSV formatted lines, header first
+    """
+    output = StringIO()
+    writer = csv.writer(output)
+
+    def flush():
+        line = output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+        return line
+
+    writer.writerow(CSV_HEADER)
+    yield flush()
+
+    for tx in storage.iter_transactions(symbols, start, end, chunk_size):
+        tx_datetime = datetime.fromisoformat(tx['timestamp'].replace('Z', '+00:00'))
+
+        writer.writerow([
+            tx_datetime.strftime('%Y-%m-%d'),
+            tx_datetime.strftime('%H:%M:%S'),
+            tx['action'],
+            tx['symbol'],
+            f"{round(tx['amount'], 2):,.2f}",
+            f"${round(tx['price'], 2):,.2f}",
+            tx['total'],
+            'Completed'
+        ])
+        yield flush()
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Gzip compress a stream of text chunks incrementally.
+
+    Args:
+        chunks (iterable): Text chunks
+        level (int): zlib compression level
+
+    Yields:
+        bytes: Compressed data
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+
+    yield compressor.flush()
 
-    return filtered_transactions
 
 def create_csv_content(symbol):
     """
@@ -74,46 +153,65 @@ def create_csv_content(symbol):
         str: Filename for the CSV.
     """
     try:
-        # Get transactions for the symbol (or all if symbol is 'all')
-        if symbol.lower() == 'all':
-            transactions = load_transactions()  # Get all transactions
-            filename = f"all_transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        else:
-            transactions = load_transactions_by_symbol(symbol)
-            filename = f"{symbol}_transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-
-        # Create CSV content
-        output = StringIO()
-        writer = csv.writer(output)
-
-        # Write header
-        writer.writerow(['Date', 'Time', 'Action', 'Symbol', 'Amount', 'Price', 'Total', 'Status'])
-
-        # Write transaction data
-        for tx in transactions:
-            writer.writerow([
-                tx['datetime'].strftime('%Y-%m-%d'),
-                tx['datetime'].strftime('%H:%M:%S'),
-                tx['action'],
-                tx['symbol'],
-                tx['amount'],
-                tx['price'],
-                tx['total'],
-                'Completed'
-            ])
+        symbols = None if symbol.lower() == 'all' else [symbol]
 
-        output.seek(0)
-
-        return output.getvalue(), filename
+        return ''.join(stream_csv_content(symbols)), create_csv_filename(symbols)
     except Exception as e:
         logger.error(f"Error creating CSV content: {e}")
 
         return None, 'transactions.csv'
 
+def _record_trade(action, symbol, amount, price, date=None, exchange=None, wallet=None, notes=None):
+    """
+    Write a trade to storage and apply it to the position ledger.
+
+    Sales larger than the held position are rejected. A trade dated before
+    the latest one of its symbol makes the ledger replay the symbol, and
+    the replayed position replaces the stored one.
+
+    Returns:
+        bool: True if the trade was recorded, False otherwise
+    """
+    ledger = get_ledger()
+
+    def update_position(position):
+        if action == 'SELL' and not position:
+            return None
+
+        current = empty_position()
+        if position:
+            current.update(position)
+
+        try:
+            apply_trade(current, action, float(amount), float(price))
+        except ValueError as e:
+            logger.error(f"Rejected {symbol} sale: {e}")
+            return None
+
+        return {
+            "quantity": round(current["quantity"], 6),
+            "average_price": round(current["average_price"], 6),
+            "total_investment": round(current["total_investment"], 2),
+        }
+
+    transaction = create_transaction(symbol, amount, price, action, date, exchange, wallet, notes)
+
+    if not storage.save_trade(transaction, update_position):
+        return False
+
+    if ledger.record(transaction, storage.load_transactions):
+        storage.save_position(symbol, ledger.position(symbol))
+
+    versions.bump('transactions')
+    return True
+
+
 def update_buy(symbol, amount, price, date=None, exchange=None, wallet=None, notes=None):
     """
     Handles buying a cryptocurrency and updating the portfolio correctly.
 
+    The transaction and the position update are written in one storage transaction.
+
     Args:
         symbol (str): Coin symbol
         amount (float): Transaction coin amount
@@ -123,40 +221,15 @@ def update_buy(symbol, amount, price, date=None, exchange=None, wallet=None, not
         wallet (str, optional): Wallet where the asset is stored. Defaults to None.
         notes (str, optional): Additional notes for the transaction. Defaults to None.
     """
-    portfolio = load_json_file('./config/portfolio.json')
-
-    if not portfolio:
-        return
-
-    if symbol in portfolio:
-        current_quantity = portfolio[symbol]["quantity"]
-        current_avg_price = portfolio[symbol]["average_price"]
-        current_total_investment = portfolio[symbol]["total_investment"]
-
-        # Weighted average price calculation
-        new_quantity = current_quantity + amount
-        new_avg_price = ((current_quantity * current_avg_price) + (amount * price)) / new_quantity
-        new_total_investment = current_total_investment + (amount * price)
-    else:
-        # If it's a new asset, initialize with all required fields
-        new_quantity = amount
-        new_avg_price = price
-        new_total_investment = round(amount * price, 2)
-
-    portfolio[symbol] = {
-        "quantity": round(new_quantity, 6),
-        "average_price": round(new_avg_price, 6),
-        "total_investment": round(new_total_investment, 2),
-        "allocation_percentage": None  # To be calculated later
-    }
-    save_data_to_json_file('./config/portfolio.json', portfolio)
-
-    save_new_transaction(symbol, amount, price, 'BUY', date, exchange, wallet, notes)
+    return _record_trade('BUY', symbol, amount, price, date, exchange, wallet, notes)
 
 
 def update_sell(symbol, amount, price, date=None, exchange=None, wallet=None, notes=None):
     """
-    Handles selling a cryptocurrency, updating portfolio, and adding USDT balance.
+    Handles selling a cryptocurrency, reducing the position at its average cost.
+
+    The transaction and the position update are written in one storage transaction.
+
     Args:
         symbol (str): Coin symbol
         amount (float): Transaction coin amount
@@ -166,27 +239,4 @@ def update_sell(symbol, amount, price, date=None, exchange=None, wallet=None, no
         wallet (str, optional): Wallet where the asset is stored. Defaults to None.
         notes (str, optional): Additional notes for the transaction. Defaults to None.
     """
-    portfolio = load_json_file('./config/portfolio.json')
-
-    if not portfolio:
-        return False
-
-    if symbol in portfolio:
-        current_quantity = portfolio[symbol]["quantity"]
-        current_avg_price = portfolio[symbol]["average_price"]
-        current_total_investment = portfolio[symbol]["total_investment"]
-
-        # Weighted average price calculation
-        new_quantity = current_quantity - amount
-    else:
-        return False
-
-    portfolio[symbol] = {
-        "quantity": round(new_quantity, 6),
-        "average_price": round(current_avg_price, 6),
-        "total_investment": round(current_total_investment, 2),
-        "allocation_percentage": None  # To be calculated later
-    }
-    save_data_to_json_file('./config/portfolio.json', portfolio)
-
-    save_new_transaction(symbol, amount, price, 'SELL', date, exchange, wallet, notes)
+    return _record_trade('SELL', symbol, amount, price, date, exchange, wallet, notes)
@@ -0,0 +1,70 @@
+import threading
+
+# Inputs of the portfolio and journal pages, each with a counter bumped when it changes
+INPUTS = ('transactions', 'quotes', 'history', 'journal')
+
+_versions = {name: 0 for name in INPUTS}
+_lock = threading.Lock()
+
+
+def bump(name):
+    """
+    Mark one portfolio input as changed.
+
+    Args:
+        name (str): One of INPUTS
+    """
+    with _lock:
+        _versions[name] += 1
+
+
+def get_versions():
+    """
+    Return the current version of every portfolio input.
+
+    Returns:
+        dict: Version counter keyed by input name
+    """
+    with _lock:
+        return dict(_versions)
+
+
+class VersionedCache:
+    """
+    Caches computed values keyed by the versions of the inputs they depend on.
+
+    Only the latest value per name is kept, so a change to an input
+    recomputes just the values that depend on it.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, key, compute):
+        """
+        Return the cached value for name if key matches, computing it otherwise.
+
+        Args:
+            name (str): Value name
+            key (tuple): Versions of the inputs the value depends on
+            compute (callable): Called without arguments to build the value
+
+        Returns:
+            Any: The cached or freshly computed value
+        """
+        with self._lock:
+            cached = self._values.get(name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+        value = compute()
+
+        with self._lock:
+            self._values[name] = (key, value)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
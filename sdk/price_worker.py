@@ -0,0 +1,241 @@
+import random
+import logging
+import threading
+
+from datetime import datetime, timezone
+
+from sdk.portoflio import versions
+from sdk.portoflio.ledger import get_ledger
+from sdk.api_client import QUOTE_CACHE_TTL, request_crypto_data
+
+logger = logging.getLogger(__name__)
+
+
+def load_portfolio_symbols():
+    """
+    Load the symbols held in the portfolio.
+
+    Returns:
+        list: Coin symbols in the portfolio
+    """
+    return get_ledger().symbols()
+
+
+class QuoteSnapshotStore:
+    """
+    In-process store of the latest quote per symbol.
+
+    Written by the price ingestion worker and read by get_holdings without
+    any network I/O.
+    """
+
+    def __init__(self):
+        self._quotes = {}
+        self._status = None
+        self._lock = threading.Lock()
+
+        self.updated_at = None
+        self.version = 0
+
+    def update(self, response):
+        """
+        Store the quotes of a CoinMarketCap shaped response.
+
+        Args:
+            response (dict): Response with 'status' and 'data' keys
+        """
+        with self._lock:
+            self._quotes.update(response.get('data') or {})
+            self._status = response.get('status')
+            self.updated_at = datetime.now(timezone.utc)
+            self.version += 1
+
+        versions.bump('quotes')
+
+    def get_response(self, symbols):
+        """
+        Build a quotes response for the given symbols.
+
+        Args:
+            symbols (list): Coin symbols
+
+        Returns:
+            dict: Response shaped like the CoinMarketCap quotes response, or
+                  None if any symbol has no stored quote yet
+        """
+        with self._lock:
+            if any(symbol not in self._quotes for symbol in symbols):
+                return None
+
+            return {
+                'status': self._status,
+                'data': {symbol: self._quotes[symbol] for symbol in symbols}
+            }
+
+    def clear(self):
+        """
+        Drop every stored quote.
+        """
+        with self._lock:
+            self._quotes = {}
+            self._status = None
+            self.updated_at = None
+            self.version += 1
+
+        versions.bump('quotes')
+
+
+class FakeQuoteProvider:
+    """
+    Deterministic quote provider returning fixed prices, for test mode.
+    """
+
+    def __init__(self, prices, percent_change_24h=0.0, percent_change_7d=0.0):
+        self.prices = dict(prices)
+        self.percent_change_24h = percent_change_24h
+        self.percent_change_7d = percent_change_7d
+        self.calls = 0
+
+    def __call__(self, symbols, convert='USD'):
+        self.calls += 1
+
+        data = {}
+        for symbol in symbols:
+            if symbol not in self.prices:
+                continue
+
+            data[symbol] = {
+                'name': symbol,
+                'symbol': symbol,
+                'quote': {
+                    convert: {
+                        'price': self.prices[symbol],
+                        'percent_change_24h': self.percent_change_24h,
+                        'percent_change_7d': self.percent_change_7d,
+                    }
+                }
+            }
+
+        return {'status': {'error_code': 0}, 'data': data}
+
+
+class PriceIngestionWorker:
+    """
+    Background thread polling quotes for every portfolio symbol on a fixed cadence.
+
+    The default provider requests the quote providers directly rather than
+    through the quote cache, which would hide upstream failures behind
+    stale quotes; a failed poll leaves the store and its updated_at as they
+    were and backs off.
+    """
+
+    def __init__(self, store, provider=request_crypto_data, symbols_loader=load_portfolio_symbols,
+                 interval=QUOTE_CACHE_TTL, max_backoff=600, rng=None):
+        self.store = store
+        self.provider = provider
+        self.symbols_loader = symbols_loader
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.rng = rng or random.Random()
+
+        self.failures = 0
+        self.listeners = []
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def run_once(self):
+        """
+        Poll quotes once and write them to the snapshot store.
+
+        Returns:
+            bool: True if the quotes were stored, False otherwise
+        """
+        try:
+            symbols = self.symbols_loader()
+
+            if not symbols:
+                return True
+
+            response = self.provider(symbols)
+        except Exception as e:
+            logger.error(f"Price worker provider error: {str(e)}")
+            response = None
+
+        if response is None:
+            self.failures += 1
+            return False
+
+        self.store.update(response)
+        self.failures = 0
+
+        for listener in self.listeners:
+            try:
+                listener(response)
+            except Exception as e:
+                logger.error(f"Price worker listener error: {str(e)}")
+
+        return True
+
+    def add_listener(self, listener):
+        """
+        Register a callable invoked with each stored quotes response.
+
+        Args:
+            listener (callable): Called as listener(response) after every
+                successful poll
+        """
+        self.listeners.append(listener)
+
+    def next_delay(self):
+        """
+        Return the delay before the next poll.
+
+        Uses the fixed interval while healthy and a jittered exponential
+        backoff capped at max_backoff after consecutive failures.
+
+        Returns:
+            float: Delay in seconds
+        """
+        if self.failures == 0:
+            return self.interval
+
+        backoff = min(self.max_backoff, self.interval * (2 ** (self.failures - 1)))
+
+        return self.rng.uniform(backoff / 2, backoff)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.next_delay())
+
+    def start(self):
+        """
+        Start the worker thread if it is not already running.
+        """
+        if self.is_running():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='price-ingestion', daemon=True)
+        self._thread.start()
+        logger.info("Price ingestion worker started")
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker thread.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the thread to exit
+        """
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+quote_store = QuoteSnapshotStore()
+price_worker = PriceIngestionWorker(quote_store)
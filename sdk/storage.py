@@ -0,0 +1,1090 @@
+import os
+import json
+import hashlib
+import queue
+import sqlite3
+import logging
+import threading
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = 'trades.db'
+
+PORTFOLIO_JSON = './config/portfolio.json'
+TRANSACTIONS_JSON = './config/transactions.json'
+PORTFOLIO_HISTORY_JSON = './config/portfolio_history.json'
+
+# Versioned schema migrations, applied in order and tracked in PRAGMA user_version
+MIGRATIONS = [
+    (1, '''
+CREATE TABLE IF NOT EXISTS transactions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  symbol TEXT NOT NULL,
+  action TEXT NOT NULL,
+  amount REAL NOT NULL,
+  price REAL NOT NULL,
+  total REAL NOT NULL,
+  exchange TEXT,
+  wallet TEXT,
+  notes TEXT,
+  timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_symbol ON transactions (symbol, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp);
+
+CREATE TABLE IF NOT EXISTS positions (
+  symbol TEXT PRIMARY KEY,
+  quantity REAL NOT NULL,
+  average_price REAL NOT NULL,
+  total_investment REAL NOT NULL,
+  updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_history (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  datetime TEXT NOT NULL,
+  total_value REAL NOT NULL,
+  total_investment REAL NOT NULL,
+  profit_loss REAL NOT NULL,
+  profit_loss_percentage REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_portfolio_history_datetime ON portfolio_history (datetime);
+
+CREATE TABLE IF NOT EXISTS storage_meta (
+  key TEXT PRIMARY KEY,
+  value TEXT
+);
+'''),
+    # The trades table used to be created by main.py at import time
+    (2, '''
+CREATE TABLE IF NOT EXISTS trades (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  date TEXT,
+  pair TEXT,
+  type TEXT,
+  entry REAL,
+  stopLoss REAL,
+  takeProfit REAL,
+  exit REAL,
+  profit REAL,
+  size REAL,
+  leverage REAL,
+  strategy TEXT,
+  result TEXT,
+  confidence INTEGER,
+  session TEXT,
+  note TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trades_date ON trades (date, id);
+CREATE INDEX IF NOT EXISTS idx_trades_pair ON trades (pair, date, id);
+CREATE INDEX IF NOT EXISTS idx_trades_strategy ON trades (strategy, date, id);
+CREATE INDEX IF NOT EXISTS idx_trades_result ON trades (result, date, id);
+CREATE INDEX IF NOT EXISTS idx_trades_session ON trades (session, date, id);
+'''),
+    (3, lambda conn: add_dedup_keys(conn)),
+    (4, '''
+CREATE TABLE IF NOT EXISTS asset_prices (
+  symbol TEXT NOT NULL,
+  date TEXT NOT NULL,
+  close REAL NOT NULL,
+  PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_asset_prices_date ON asset_prices (date);
+'''),
+    (5, '''
+CREATE TABLE IF NOT EXISTS candles (
+  symbol TEXT NOT NULL,
+  tf TEXT NOT NULL,
+  ts INTEGER NOT NULL,
+  open REAL NOT NULL,
+  high REAL NOT NULL,
+  low REAL NOT NULL,
+  close REAL NOT NULL,
+  volume REAL NOT NULL,
+  PRIMARY KEY (symbol, tf, ts)
+) WITHOUT ROWID;
+'''),
+    (6, '''
+CREATE TABLE IF NOT EXISTS backtest_trades (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  date TEXT,
+  pair TEXT,
+  type TEXT,
+  entry REAL,
+  stopLoss REAL,
+  takeProfit REAL,
+  exit REAL,
+  profit REAL,
+  size REAL,
+  leverage REAL,
+  strategy TEXT,
+  result TEXT,
+  confidence INTEGER,
+  session TEXT,
+  note TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_backtest_trades_date ON backtest_trades (date, id);
+CREATE INDEX IF NOT EXISTS idx_backtest_trades_pair ON backtest_trades (pair, date, id);
+CREATE INDEX IF NOT EXISTS idx_backtest_trades_strategy ON backtest_trades (strategy, date, id);
+CREATE INDEX IF NOT EXISTS idx_backtest_trades_result ON backtest_trades (result, date, id);
+CREATE INDEX IF NOT EXISTS idx_backtest_trades_session ON backtest_trades (session, date, id);
+'''),
+    (7, '''
+CREATE TABLE IF NOT EXISTS alert_rules (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL,
+  symbol TEXT NOT NULL,
+  side TEXT NOT NULL,
+  level REAL,
+  pct REAL,
+  note TEXT,
+  created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alert_outbox (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  rule_id INTEGER NOT NULL,
+  symbol TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  side TEXT NOT NULL,
+  level REAL NOT NULL,
+  price REAL NOT NULL,
+  message TEXT NOT NULL,
+  created_at TEXT NOT NULL,
+  delivered_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alert_outbox_pending ON alert_outbox (delivered_at, id);
+CREATE INDEX IF NOT EXISTS idx_alert_outbox_rule ON alert_outbox (rule_id, created_at);
+'''),
+    (8, lambda conn: fill_dedup_keys(conn)),
+    # Profit sorts and the confidence filter of the journal pages
+    (9, '''
+CREATE INDEX IF NOT EXISTS idx_trades_profit ON trades (profit, id);
+CREATE INDEX IF NOT EXISTS idx_trades_confidence ON trades (confidence, date, id);
+CREATE INDEX IF NOT EXISTS idx_backtest_trades_profit ON backtest_trades (profit, id);
+CREATE INDEX IF NOT EXISTS idx_backtest_trades_confidence ON backtest_trades (confidence, date, id);
+'''),
+]
+
+TRANSACTION_COLUMNS = ['symbol', 'action', 'amount', 'price', 'total', 'exchange', 'wallet', 'notes', 'timestamp']
+TRADE_COLUMNS = [
+    'date', 'pair', 'type', 'entry', 'stopLoss', 'takeProfit', 'exit', 'profit', 'size', 'leverage',
+    'strategy', 'result', 'confidence', 'session', 'note'
+]
+HISTORY_COLUMNS = ['datetime', 'total_value', 'total_investment', 'profit_loss', 'profit_loss_percentage']
+
+# Connection pool settings, see configure_pool
+POOL_SIZE = 8
+BUSY_TIMEOUT = 30
+STATEMENT_CACHE_SIZE = 256
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Connections bound to the current request, see bind_connections
+_bound = threading.local()
+
+
+def _open(db_file, busy_timeout=None):
+    conn = sqlite3.connect(
+        db_file,
+        timeout=BUSY_TIMEOUT if busy_timeout is None else busy_timeout,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of connections to one database file.
+
+    Connections are opened lazily up to size and handed out most recently
+    used first. Callers block for up to busy_timeout seconds when every
+    connection is in use.
+    """
+
+    def __init__(self, db_file, size=POOL_SIZE, busy_timeout=BUSY_TIMEOUT):
+        self.db_file = db_file
+        self.size = size
+        self.busy_timeout = busy_timeout
+
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a connection from the pool, opening one if the pool is not full.
+
+        Returns:
+            sqlite3.Connection: Connection in autocommit mode
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return _open(self.db_file, self.busy_timeout)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.busy_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No free connection to {self.db_file} after {self.busy_timeout}s")
+
+    def release(self, conn):
+        """
+        Return a connection to the pool, rolling back an unfinished transaction.
+        """
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+
+        self._idle.put(conn)
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+def configure_pool(size=None, busy_timeout=None):
+    """
+    Change the pool settings. Existing pools are closed and recreated on next use.
+
+    Args:
+        size (int, optional): Connections per database file
+        busy_timeout (float, optional): Seconds to wait for a lock or a free connection
+    """
+    global POOL_SIZE, BUSY_TIMEOUT
+
+    if size is not None:
+        POOL_SIZE = size
+    if busy_timeout is not None:
+        BUSY_TIMEOUT = busy_timeout
+
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
+
+
+def get_pool(db_file=None):
+    """
+    Return the connection pool of a database file, initialising the
+    storage on first use.
+    """
+    db_file = db_file or DB_FILE
+
+    if db_file not in _initialized:
+        init_storage(db_file)
+
+    with _pools_lock:
+        pool = _pools.get(db_file)
+        if pool is None:
+            pool = _pools[db_file] = ConnectionPool(db_file, POOL_SIZE, BUSY_TIMEOUT)
+
+    return pool
+
+
+def bind_connections():
+    """
+    Start reusing one pooled connection per database file on this thread,
+    until release_connections is called. Used to share a connection
+    across a whole Flask request.
+    """
+    _bound.connections = {}
+
+
+def release_connections():
+    """
+    Return the connections bound by bind_connections to their pools.
+    """
+    connections = getattr(_bound, 'connections', None)
+    _bound.connections = None
+
+    for db_file, conn in (connections or {}).items():
+        get_pool(db_file).release(conn)
+
+
+@contextmanager
+def connect(db_file=None):
+    """
+    Get a pooled connection to the storage database, running the schema
+    migrations and the legacy JSON import on first use.
+
+    Inside bind_connections the same connection is reused for the rest
+    of the request.
+
+    Args:
+        db_file (str, optional): Database path. Defaults to DB_FILE.
+
+    Yields:
+        sqlite3.Connection: Connection in autocommit mode
+    """
+    db_file = db_file or DB_FILE
+    pool = get_pool(db_file)
+
+    bound = getattr(_bound, 'connections', None)
+    if bound is not None:
+        conn = bound.get(db_file)
+        if conn is None:
+            conn = bound[db_file] = pool.acquire()
+        yield conn
+        return
+
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction(conn):
+    """
+    Run a block inside a single write transaction.
+
+    Args:
+        conn (sqlite3.Connection): Connection opened with connect()
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
+
+
+def migrate(conn):
+    """
+    Apply the pending MIGRATIONS, each in its own transaction.
+
+    A migration is either an SQL script or a callable taking the connection.
+
+    Args:
+        conn (sqlite3.Connection): Storage connection
+
+    Returns:
+        int: Schema version after migrating
+    """
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+
+    for version, script in MIGRATIONS:
+        if version <= current:
+            continue
+
+        try:
+            if callable(script):
+                with transaction(conn):
+                    script(conn)
+                    conn.execute(f'PRAGMA user_version = {version}')
+            else:
+                conn.executescript(f'BEGIN IMMEDIATE;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+
+        logger.info(f"Applied storage migration {version}")
+        current = version
+
+    return current
+
+
+def _utc_second(timestamp):
+    timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+
+    return timestamp.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def transaction_dedup_key(tx):
+    """
+    Build the key identifying a transaction across re-imports.
+
+    Timestamps are taken to the second in UTC, amounts and prices at full
+    precision, so distinct trades in the same second never collide.
+
+    Args:
+        tx (dict): Transaction with symbol, action, amount, price and timestamp
+
+    Returns:
+        str: Hex digest
+    """
+    key = (f"{_utc_second(tx['timestamp'])}|{tx['action']}|{tx['symbol']}|"
+           f"{float(tx['amount'])!r}|{float(tx['price'])!r}")
+
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def transaction_export_key(tx):
+    """
+    Build the key of a transaction as the CSV export writes it.
+
+    The export formats amounts and prices to two decimals but writes the
+    total unformatted, so the total tells apart trades the formatted
+    columns do not.
+
+    Args:
+        tx (dict): Transaction with symbol, action, amount, price, total and timestamp
+
+    Returns:
+        str: Hex digest
+    """
+    key = (f"{_utc_second(tx['timestamp'])}|{tx['action']}|{tx['symbol']}|"
+           f"{float(tx['amount']):.2f}|{float(tx['price']):.2f}|{float(tx['total'])!r}")
+
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def is_export_precision(tx):
+    """
+    Return whether a transaction's amount and price have at most two
+    decimals, as in a CSV export.
+    """
+    return all(round(float(tx[column]), 2) == float(tx[column]) for column in ('amount', 'price'))
+
+
+def add_dedup_keys(conn):
+    """
+    Migration adding transactions.dedup_key and filling it for stored rows.
+    """
+    conn.execute('ALTER TABLE transactions ADD COLUMN dedup_key TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_dedup_key ON transactions (dedup_key)')
+
+    fill_dedup_keys(conn)
+
+
+def fill_dedup_keys(conn):
+    """
+    Migration (re)computing the dedup key of every stored transaction.
+    """
+    rows = conn.execute('SELECT id, symbol, action, amount, price, timestamp FROM transactions').fetchall()
+    conn.executemany(
+        'UPDATE transactions SET dedup_key = ? WHERE id = ?',
+        [(transaction_dedup_key(dict(row)), row['id']) for row in rows]
+    )
+
+
+def _insert_transactions(conn, transactions):
+    columns = TRANSACTION_COLUMNS + ['dedup_key']
+
+    conn.executemany(
+        f"INSERT INTO transactions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+        [tuple(tx.get(column) for column in TRANSACTION_COLUMNS) + (transaction_dedup_key(tx),) for tx in transactions]
+    )
+
+
+def _write_positions(conn, positions, updated_at, symbols=None):
+    """
+    Replace the stored positions, or only those of the given symbols.
+    """
+    if symbols is None:
+        conn.execute('DELETE FROM positions')
+    else:
+        symbols = set(symbols)
+        positions = {symbol: position for symbol, position in positions.items() if symbol in symbols}
+        conn.executemany('DELETE FROM positions WHERE symbol = ?', [(symbol,) for symbol in symbols])
+
+    conn.executemany(
+        'INSERT INTO positions (symbol, quantity, average_price, total_investment, updated_at) '
+        'VALUES (?, ?, ?, ?, ?)',
+        [
+            (symbol, round(position['quantity'], 6), round(position['average_price'], 6),
+             round(position['total_investment'], 2), updated_at)
+            for symbol, position in positions.items()
+        ]
+    )
+
+
+def init_storage(db_file=None):
+    """
+    Run the schema migrations and the one-shot JSON import.
+
+    Args:
+        db_file (str, optional): Database path. Defaults to DB_FILE.
+    """
+    db_file = db_file or DB_FILE
+
+    with _init_lock:
+        if db_file in _initialized:
+            return
+
+        conn = _open(db_file)
+        try:
+            migrate(conn)
+            migrate_from_json(conn)
+        finally:
+            conn.close()
+
+        _initialized.add(db_file)
+
+
+def _read_json(file_path):
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        with open(file_path, 'r') as file:
+            return json.load(file)
+    except (json.JSONDecodeError, OSError) as e:
+        logger.error(f"Could not migrate '{file_path}': {e}")
+        return None
+
+
+def migrate_from_json(conn, portfolio_path=PORTFOLIO_JSON, transactions_path=TRANSACTIONS_JSON,
+                      history_path=PORTFOLIO_HISTORY_JSON):
+    """
+    Import portfolio.json, transactions.json and portfolio_history.json once.
+
+    The migration is recorded in storage_meta and never runs again.
+
+    Args:
+        conn (sqlite3.Connection): Storage connection
+        portfolio_path (str): Path to the legacy portfolio JSON
+        transactions_path (str): Path to the legacy transactions JSON
+        history_path (str): Path to the legacy portfolio history JSON
+    """
+    done = conn.execute("SELECT value FROM storage_meta WHERE key = 'json_migrated'").fetchone()
+    if done:
+        return
+
+    # Positions must be explained by the transactions for the ledger to rebuild them
+    positions_explained = True
+
+    portfolio = _read_json(portfolio_path) or {}
+    transactions = _read_json(transactions_path) or []
+    history = _read_json(history_path) or []
+
+    if isinstance(history, dict):
+        history = history.get('history', [])
+
+    quantities = Counter()
+    for tx in transactions:
+        quantities[tx['symbol']] += float(tx['amount']) * (1 if tx['action'] == 'BUY' else -1)
+
+    for symbol, data in portfolio.items():
+        if symbol != 'last_update' and abs(float(data['quantity']) - quantities[symbol]) > 1e-6:
+            logger.warning(f"Migrated {symbol} position is not explained by transactions.json")
+            positions_explained = False
+
+    with transaction(conn):
+        conn.executemany(
+            'INSERT OR REPLACE INTO positions (symbol, quantity, average_price, total_investment, updated_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [
+                (symbol, data['quantity'], data['average_price'], data['total_investment'], None)
+                for symbol, data in portfolio.items()
+                if symbol != 'last_update'
+            ]
+        )
+
+        _insert_transactions(conn, transactions)
+
+        conn.executemany(
+            f"INSERT INTO portfolio_history ({', '.join(HISTORY_COLUMNS)}) VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})",
+            [tuple(entry.get(column) for column in HISTORY_COLUMNS) for entry in history]
+        )
+
+        conn.execute(
+            "INSERT INTO storage_meta (key, value) VALUES ('json_migrated', ?)",
+            (datetime.now(timezone.utc).isoformat(),)
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO storage_meta (key, value) VALUES ('transaction_log_complete', ?)",
+            ('1' if positions_explained else '0',)
+        )
+
+    logger.info(f"Migrated {len(portfolio)} positions, {len(transactions)} transactions "
+                f"and {len(history)} history entries from JSON")
+
+
+def load_positions(db_file=None):
+    """
+    Load every open position.
+
+    Returns:
+        dict: Positions keyed by symbol, shaped like portfolio.json
+    """
+    with connect(db_file) as conn:
+        rows = conn.execute('SELECT * FROM positions ORDER BY symbol').fetchall()
+
+    return {
+        row['symbol']: {
+            'quantity': row['quantity'],
+            'average_price': row['average_price'],
+            'total_investment': row['total_investment'],
+            'allocation_percentage': None
+        }
+        for row in rows
+    }
+
+
+def replace_positions(positions, db_file=None):
+    """
+    Replace every stored position in one transaction.
+
+    Args:
+        positions (dict): Positions keyed by symbol with quantity,
+            average_price and total_investment
+    """
+    with connect(db_file) as conn:
+        with transaction(conn):
+            _write_positions(conn, positions, datetime.now(timezone.utc).isoformat())
+
+
+def transaction_log_complete(db_file=None):
+    """
+    Return whether the stored transactions fully explain the stored positions.
+
+    Set by migrate_from_json; positions it could not explain keep the flag
+    off until complete_transaction_log stores their opening balances.
+    """
+    with connect(db_file) as conn:
+        row = conn.execute("SELECT value FROM storage_meta WHERE key = 'transaction_log_complete'").fetchone()
+
+    return row is not None and row['value'] == '1'
+
+
+def complete_transaction_log(transactions, db_file=None):
+    """
+    Store the transactions explaining the stored positions and mark the
+    transaction log complete, in one transaction.
+
+    Args:
+        transactions (list): Transactions with the TRANSACTION_COLUMNS keys
+    """
+    with connect(db_file) as conn:
+        with transaction(conn):
+            _insert_transactions(conn, transactions)
+            conn.execute("INSERT OR REPLACE INTO storage_meta (key, value) VALUES ('transaction_log_complete', '1')")
+
+
+def save_position(symbol, position, db_file=None):
+    """
+    Store one symbol's position, removing it once it is closed.
+
+    Args:
+        symbol (str): Coin symbol
+        position (dict): Position with quantity, average_price and total_investment
+    """
+    with connect(db_file) as conn:
+        with transaction(conn):
+            conn.execute('DELETE FROM positions WHERE symbol = ?', (symbol,))
+
+            if position is not None and position['quantity'] > 0:
+                conn.execute(
+                    'INSERT INTO positions (symbol, quantity, average_price, total_investment, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (symbol, round(position['quantity'], 6), round(position['average_price'], 6),
+                     round(position['total_investment'], 2), datetime.now(timezone.utc).isoformat())
+                )
+
+
+def load_transactions(symbol=None, db_file=None):
+    """
+    Load transactions in timestamp order.
+
+    Args:
+        symbol (str, optional): Only return transactions for this symbol
+
+    Returns:
+        list: Transaction dictionaries shaped like transactions.json, plus their id
+    """
+    query = f"SELECT id, {', '.join(TRANSACTION_COLUMNS)} FROM transactions"
+    params = ()
+
+    if symbol is not None:
+        query += ' WHERE symbol = ?'
+        params = (symbol,)
+
+    query += ' ORDER BY timestamp, id'
+
+    with connect(db_file) as conn:
+        return [dict(row) for row in conn.execute(query, params)]
+
+
+def last_transaction_id(db_file=None):
+    """
+    Return the id of the newest stored transaction, 0 without any.
+    """
+    with connect(db_file) as conn:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM transactions').fetchone()[0]
+
+
+def load_transactions_after(last_id=0, db_file=None):
+    """
+    Load the transactions stored after a given row id, in id order.
+
+    Args:
+        last_id (int): Id of the last transaction already seen
+
+    Returns:
+        list: Transaction dictionaries including their id
+    """
+    with connect(db_file) as conn:
+        return [
+            dict(row) for row in conn.execute(
+                f"SELECT id, {', '.join(TRANSACTION_COLUMNS)} FROM transactions WHERE id > ? ORDER BY id",
+                (last_id,)
+            )
+        ]
+
+
+def iter_transactions(symbols=None, start=None, end=None, chunk_size=500, db_file=None):
+    """
+    Stream transactions in timestamp order without loading them all.
+
+    Rows are read in chunks of chunk_size using keyset pagination on
+    (timestamp, id).
+
+    Args:
+        symbols (list, optional): Only yield transactions for these symbols
+        start (str, optional): Inclusive lower bound on the ISO timestamp
+        end (str, optional): Exclusive upper bound on the ISO timestamp
+        chunk_size (int): Rows fetched per query
+
+    Yields:
+        dict: Transaction dictionaries shaped like transactions.json
+    """
+    conditions = []
+    params = []
+
+    if symbols:
+        conditions.append(f"symbol IN ({', '.join('?' * len(symbols))})")
+        params.extend(symbols)
+    if start:
+        conditions.append('timestamp >= ?')
+        params.append(start)
+    if end:
+        conditions.append('timestamp < ?')
+        params.append(end)
+
+    base_query = f"SELECT id, {', '.join(TRANSACTION_COLUMNS)} FROM transactions"
+
+    last_key = None
+    while True:
+        page_conditions = list(conditions)
+        page_params = list(params)
+
+        if last_key is not None:
+            page_conditions.append('(timestamp > ? OR (timestamp = ? AND id > ?))')
+            page_params.extend([last_key[0], last_key[0], last_key[1]])
+
+        query = base_query
+        if page_conditions:
+            query += ' WHERE ' + ' AND '.join(page_conditions)
+        query += ' ORDER BY timestamp, id LIMIT ?'
+        page_params.append(chunk_size)
+
+        with connect(db_file) as conn:
+            rows = conn.execute(query, page_params).fetchall()
+
+        for row in rows:
+            tx = dict(row)
+            tx.pop('id')
+            yield tx
+
+        if len(rows) < chunk_size:
+            return
+
+        last_key = (rows[-1]['timestamp'], rows[-1]['id'])
+
+
+def load_portfolio_history(db_file=None):
+    """
+    Load the portfolio history in chronological order.
+
+    Returns:
+        list: History entries shaped like portfolio_history.json
+    """
+    with connect(db_file) as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM portfolio_history ORDER BY datetime, id"
+        ).fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def load_portfolio_history_columns(db_file=None):
+    """
+    Load the portfolio history as one list per column, in chronological order.
+
+    Returns:
+        tuple: datetime strings followed by the value columns
+    """
+    with connect(db_file) as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM portfolio_history ORDER BY datetime, id"
+        ).fetchall()
+
+    if not rows:
+        return tuple([] for _ in HISTORY_COLUMNS)
+
+    return tuple(list(column) for column in zip(*rows))
+
+
+def portfolio_history_signature(db_file=None):
+    """
+    Return a cheap signature that changes whenever the history changes.
+
+    Returns:
+        tuple: Row count and highest row id
+    """
+    with connect(db_file) as conn:
+        return tuple(conn.execute('SELECT COUNT(*), MAX(id) FROM portfolio_history').fetchone())
+
+
+def append_portfolio_history(entry, db_file=None):
+    """
+    Append one portfolio history snapshot.
+
+    Args:
+        entry (dict): Snapshot with the HISTORY_COLUMNS keys
+
+    Returns:
+        int: Row id of the stored snapshot
+    """
+    with connect(db_file) as conn:
+        return conn.execute(
+            f"INSERT INTO portfolio_history ({', '.join(HISTORY_COLUMNS)}) VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})",
+            tuple(entry[column] for column in HISTORY_COLUMNS)
+        ).lastrowid
+
+
+def save_trade(tx, update_position, db_file=None):
+    """
+    Record a transaction and update its position in one database transaction.
+
+    The position is read and written under the same write lock, so
+    concurrent trades on the same symbol cannot lose an update.
+
+    Args:
+        tx (dict): Transaction with the TRANSACTION_COLUMNS keys, receives
+            its id once stored
+        update_position (callable): Called with the current position dict (or
+            None) and returning the new position dict, or None to abort
+
+    Returns:
+        bool: True if the trade was recorded, False if it was aborted
+    """
+    with connect(db_file) as conn:
+        with transaction(conn):
+            row = conn.execute(
+                'SELECT quantity, average_price, total_investment FROM positions WHERE symbol = ?',
+                (tx['symbol'],)
+            ).fetchone()
+
+            position = update_position(dict(row) if row else None)
+
+            if position is None:
+                return False
+
+            conn.execute(
+                'INSERT OR REPLACE INTO positions (symbol, quantity, average_price, total_investment, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (tx['symbol'], position['quantity'], position['average_price'], position['total_investment'],
+                 tx['timestamp'])
+            )
+
+            _insert_transactions(conn, [tx])
+            tx['id'] = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+
+    return True
+
+
+def import_transactions(transactions, build_positions, db_file=None):
+    """
+    Store a batch of transactions and rebuild the positions of the symbols
+    they touch, in one database transaction. Positions of other symbols are
+    left as stored.
+
+    Transactions whose dedup key is already stored are skipped, as many
+    times as the key is stored, so importing the same file twice adds
+    nothing the second time. Rows with the two-decimal amounts and prices
+    of a CSV export also match the stored transaction they were exported
+    from, see transaction_export_key.
+
+    Args:
+        transactions (list): Transactions with the TRANSACTION_COLUMNS keys
+        build_positions (callable): Called with the stored transactions in
+            timestamp order and the new ones; returns the positions after
+            both and the new transactions to keep
+
+    Returns:
+        tuple: (list of stored transactions, list of skipped duplicates)
+    """
+    with connect(db_file) as conn:
+        with transaction(conn):
+            rows = conn.execute(
+                f"SELECT {', '.join(TRANSACTION_COLUMNS)}, dedup_key FROM transactions ORDER BY timestamp, id"
+            ).fetchall()
+
+            existing = []
+            stored_keys = Counter()
+            exported = defaultdict(list)
+            for row in rows:
+                tx = dict(row)
+                key = tx.pop('dedup_key')
+                stored_keys[key] += 1
+                exported[transaction_export_key(tx)].append(key)
+                existing.append(tx)
+
+            new = []
+            duplicates = []
+            for tx in transactions:
+                key = transaction_dedup_key(tx)
+
+                if stored_keys[key] <= 0 and is_export_precision(tx):
+                    matches = [match for match in exported.get(transaction_export_key(tx), ()) if stored_keys[match] > 0]
+                    key = matches[0] if matches else key
+
+                if stored_keys[key] > 0:
+                    stored_keys[key] -= 1
+                    duplicates.append(tx)
+                else:
+                    new.append(tx)
+
+            positions, accepted = build_positions(existing, new)
+
+            _insert_transactions(conn, accepted)
+            _write_positions(conn, positions, datetime.now(timezone.utc).isoformat(),
+                             {tx['symbol'] for tx in accepted})
+
+    return accepted, duplicates
+
+
+def save_daily_closes(closes, date, db_file=None):
+    """
+    Store or overwrite the close of each symbol for one day.
+
+    Args:
+        closes (dict): Price keyed by symbol
+        date (str): ISO date
+    """
+    with connect(db_file) as conn:
+        with transaction(conn):
+            conn.executemany(
+                'INSERT OR REPLACE INTO asset_prices (symbol, date, close) VALUES (?, ?, ?)',
+                [(symbol, date, close) for symbol, close in closes.items()]
+            )
+
+
+def load_daily_closes(start=None, end=None, db_file=None):
+    """
+    Load daily closes in date order.
+
+    Args:
+        start (str, optional): Exclusive lower bound on the ISO date
+        end (str, optional): Exclusive upper bound on the ISO date
+
+    Returns:
+        list: (date, symbol, close) rows
+    """
+    conditions = []
+    params = []
+
+    if start:
+        conditions.append('date > ?')
+        params.append(start)
+    if end:
+        conditions.append('date < ?')
+        params.append(end)
+
+    query = 'SELECT date, symbol, close FROM asset_prices'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY date, symbol'
+
+    with connect(db_file) as conn:
+        return [tuple(row) for row in conn.execute(query, params)]
+
+
+def save_candles(symbol, tf, candles, db_file=None):
+    """
+    Store or overwrite candles of one symbol and timeframe.
+
+    Args:
+        symbol (str): Coin symbol
+        tf (str): Timeframe, e.g. '1m'
+        candles (list): (ts, open, high, low, close, volume) rows
+    """
+    with connect(db_file) as conn:
+        with transaction(conn):
+            conn.executemany(
+                'INSERT OR REPLACE INTO candles (symbol, tf, ts, open, high, low, close, volume) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(symbol, tf, *candle) for candle in candles]
+            )
+
+
+def load_candles(symbol, tf, start, end, db_file=None):
+    """
+    Load candles of one symbol and timeframe in time order.
+
+    Args:
+        symbol (str): Coin symbol
+        tf (str): Timeframe
+        start (int): Inclusive lower bound on the open time, epoch seconds
+        end (int): Exclusive upper bound on the open time, epoch seconds
+
+    Returns:
+        list: (ts, open, high, low, close, volume) rows
+    """
+    with connect(db_file) as conn:
+        return [
+            tuple(row) for row in conn.execute(
+                'SELECT ts, open, high, low, close, volume FROM candles '
+                'WHERE symbol = ? AND tf = ? AND ts >= ? AND ts < ? ORDER BY ts',
+                (symbol, tf, start, end)
+            )
+        ]
+
+
+def last_candle_ts(symbol, tf, db_file=None):
+    """
+    Return the open time of the latest stored candle, or None.
+    """
+    with connect(db_file) as conn:
+        row = conn.execute(
+            'SELECT MAX(ts) FROM candles WHERE symbol = ? AND tf = ?', (symbol, tf)
+        ).fetchone()
+
+    return row[0]
@@ -5,6 +5,9 @@ from datetime import datetime, timezone
 
 import pytz
 
+from sdk.metrics import stage_metrics
+from sdk.portoflio.history import PortfolioHistory, get_portfolio_history
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,6 +31,7 @@ def get_api_key(key_name):
 
         return None
 
+@stage_metrics.timed('load_json_file')
 def load_json_file(file_path):
     """
     Load data from a JSON file.
@@ -44,6 +48,7 @@ def load_json_file(file_path):
 
     try:
         with open(file_path, "r") as file:
+            stage_metrics.add_bytes('load_json_file', os.fstat(file.fileno()).st_size)
             portfolio = json.load(file)
             logger.info(f"JSON loaded from '{file_path}'.")
             return portfolio
@@ -54,32 +59,23 @@ def load_json_file(file_path):
         logger.error(f"Error loading JSON from '{file_path}': {e}. Using an empty JSON.")
         return {}
 
-def get_atl_ath(file_path='./config/portfolio_history.json'):
+def get_atl_ath(portfolio_history=None):
     """
-    Return All-Time Low and All-Time High from the portfolio history JSON
+    Return All-Time Low and All-Time High from the portfolio history
 
     Args:
-        file_path (str): The path to the JSON
+        portfolio_history (list, optional): History entries. Defaults to the stored history.
 
     Returns:
         float: All-Time Low
         float All-Time High
     """
-    portfolio_history = load_json_file(file_path)
-
-    all_time_high = 0
-    all_time_low = 99999999
-
     logger.info("Calculate portfolio All Time Low and All Time High!")
 
-    for entry in portfolio_history:
-        if entry['total_value'] > all_time_high:
-            all_time_high = entry['total_value']
+    if portfolio_history is None:
+        return get_portfolio_history().atl_ath()
 
-        if entry['total_value'] < all_time_low:
-            all_time_low = entry['total_value']
-
-    return round(all_time_low, 2), round(all_time_high, 2)
+    return PortfolioHistory.from_entries(portfolio_history).atl_ath()
 
 def save_transaction(transaction, file_path='./config/transactions.json'):
     """
@@ -109,9 +105,10 @@ def save_data_to_json_file(file_path, data):
     with open(file_path, "w") as file:
         json.dump(data, file, indent=4)
 
-def save_new_transaction(symbol, amount, price, action, date=None, exchange=None, wallet=None, notes=None):
+def create_transaction(symbol, amount, price, action, date=None, exchange=None, wallet=None, notes=None):
     """
-    Save a new transaction to the transactions file.
+    Build a transaction record.
+
     Args:
         symbol (str): Coin symbol
         amount (float): Transaction coin amount
@@ -121,6 +118,9 @@ def save_new_transaction(symbol, amount, price, action, date=None, exchange=None
         exchange (str, optional): Exchange where the transaction occurred. Defaults to None.
         wallet (str, optional): Wallet where the asset is stored. Defaults to None.
         notes (str, optional): Additional notes for the transaction. Defaults to None.
+
+    Returns:
+        dict: Transaction data
     """
     utc_dt = datetime.now(timezone.utc)
     if date:
@@ -135,7 +135,7 @@ def save_new_transaction(symbol, amount, price, action, date=None, exchange=None
         # Convert to UTC
         utc_dt = localized_dt.astimezone(pytz.utc)
 
-    transaction = {
+    return {
         "symbol": symbol,
         "action": action,
         "amount": round(float(amount), 6),
@@ -147,4 +147,17 @@ def save_new_transaction(symbol, amount, price, action, date=None, exchange=None
         "timestamp": utc_dt.isoformat() ,
     }
 
-    save_transaction(transaction)
+def save_new_transaction(symbol, amount, price, action, date=None, exchange=None, wallet=None, notes=None):
+    """
+    Save a new transaction to the transactions file.
+    Args:
+        symbol (str): Coin symbol
+        amount (float): Transaction coin amount
+        price (float): Transaction price
+        action (str): Transaction action ('BUY', 'SELL')
+        date (str, optional): Transaction date in ISO format. Defaults to None.
+        exchange (str, optional): Exchange where the transaction occurred. Defaults to None.
+        wallet (str, optional): Wallet where the asset is stored. Defaults to None.
+        notes (str, optional): Additional notes for the transaction. Defaults to None.
+    """
+    save_transaction(create_transaction(symbol, amount, price, action, date, exchange, wallet, notes))
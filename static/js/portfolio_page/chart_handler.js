@@ -1,7 +1,26 @@
 document.addEventListener('DOMContentLoaded', function() {
-  // Get chart data from Flask
+  // Chart data embedded by Flask holds only the initial period, the other
+  // periods are fetched from the chart data endpoint on first use
   const chartData = window.chartData;
 
+  function loadPeriod(period) {
+    if (chartData[period]) {
+      return Promise.resolve(chartData[period]);
+    }
+
+    return fetch(`${window.chartDataUrl}?range=${encodeURIComponent(period)}`)
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(`Chart data request failed: ${response.status}`);
+        }
+        return response.json();
+      })
+      .then(data => {
+        chartData[period] = data.points;
+        return data.points;
+      });
+  }
+
   // Get the canvas context
   const ctx = document.getElementById('performanceChart').getContext('2d');
 
@@ -116,6 +135,20 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  // Called by the live stream with new snapshots of the portfolio history
+  window.appendChartPoints = function(points) {
+    Object.values(chartData).forEach(periodPoints => {
+      if (periodPoints && periodPoints !== chartData[currentPeriod]) {
+        periodPoints.push(...points);
+      }
+    });
+    chartData[currentPeriod].push(...points);
+
+    performanceChart.data.datasets[0].data.push(...points.map(point => ({ x: point.x, y: point.total_value })));
+    performanceChart.data.datasets[1].data.push(...points.map(point => ({ x: point.x, y: point.total_investment })));
+    performanceChart.update('none');
+  };
+
   // Helper function to determine time unit based on period
   function getTimeUnit(period) {
     switch(period) {
@@ -141,24 +174,28 @@ document.addEventListener('DOMContentLoaded', function() {
       this.classList.add('bg-teal-600', 'hover:bg-teal-700', 'active');
 
       // Get selected period
-      currentPeriod = this.getAttribute('data-period');
+      const period = this.getAttribute('data-period');
+
+      loadPeriod(period).then(points => {
+        currentPeriod = period;
 
-      // Update chart data
-      performanceChart.data.datasets[0].data = chartData[currentPeriod].map(point => ({
-        x: point.x,
-        y: point.total_value
-      }));
+        // Update chart data
+        performanceChart.data.datasets[0].data = points.map(point => ({
+          x: point.x,
+          y: point.total_value
+        }));
 
-      performanceChart.data.datasets[1].data = chartData[currentPeriod].map(point => ({
-        x: point.x,
-        y: point.total_investment
-      }));
+        performanceChart.data.datasets[1].data = points.map(point => ({
+          x: point.x,
+          y: point.total_investment
+        }));
 
-      // Update time unit
-      performanceChart.options.scales.x.time.unit = getTimeUnit(currentPeriod);
+        // Update time unit
+        performanceChart.options.scales.x.time.unit = getTimeUnit(currentPeriod);
 
-      // Update chart
-      performanceChart.update();
+        // Update chart
+        performanceChart.update();
+      }).catch(error => console.error(error));
     });
   });
 });
\ No newline at end of file
@@ -0,0 +1,24 @@
+// Switch the holdings table between the asset, location, exchange and wallet views
+document.addEventListener('DOMContentLoaded', () => {
+  const groupBySelect = document.getElementById('holdingsGroupBy');
+  if (!groupBySelect) return;
+
+  const showView = (view) => {
+    const tableView = view === 'location' ? 'asset' : view;
+
+    document.querySelectorAll('[data-holdings-view]').forEach(table => {
+      table.classList.toggle('hidden', table.dataset.holdingsView !== tableView);
+    });
+
+    document.querySelectorAll('.holdings-location-row').forEach(row => {
+      row.classList.toggle('hidden', view !== 'location');
+    });
+
+    localStorage.setItem('holdingsGroupBy', view);
+  };
+
+  groupBySelect.value = localStorage.getItem('holdingsGroupBy') || 'asset';
+  showView(groupBySelect.value);
+
+  groupBySelect.addEventListener('change', () => showView(groupBySelect.value));
+});
@@ -0,0 +1,115 @@
+// Apply the live portfolio deltas pushed by the server to the page
+document.addEventListener('DOMContentLoaded', () => {
+  if (!window.EventSource || !window.portfolioStreamUrl) return;
+
+  const money = value => `$${value.toLocaleString(undefined, { minimumFractionDigits: 2, maximumFractionDigits: 2 })}`;
+  const signed = (value, digits) => `${value >= 0 ? '+' : ''}${value.toFixed(digits)}`;
+
+  const holdingFormats = {
+    holdings: (value, symbol) => `${Math.round(value * 100) / 100} ${symbol}`,
+    current_price: money,
+    value: money,
+    percentage: value => `${value.toFixed(2)}%`,
+    day_change: value => `${signed(value, 1)}%`,
+  };
+
+  const setText = (element, text) => {
+    if (element && element.textContent.trim() !== text) {
+      element.textContent = text;
+    }
+  };
+
+  const updateHoldings = (holdings) => {
+    Object.entries(holdings).forEach(([symbol, holding]) => {
+      const row = document.querySelector(`[data-live-symbol="${symbol}"]`);
+
+      // A new position needs the full row markup
+      if (!row) {
+        window.location.reload();
+        return;
+      }
+
+      Object.entries(holdingFormats).forEach(([field, format]) => {
+        setText(row.querySelector(`[data-live="${field}"]`), format(holding[field], symbol));
+      });
+
+      const dayChange = row.querySelector('[data-live="day_change"]');
+      if (dayChange) {
+        dayChange.classList.toggle('text-green-500', holding.day_change >= 0);
+        dayChange.classList.toggle('text-red-500', holding.day_change < 0);
+      }
+    });
+  };
+
+  const updateTotals = (totals) => {
+    const profit = totals.profit_loss.amount;
+
+    setText(document.querySelector('[data-live-total="current_value"]'), money(totals.current_value));
+    setText(document.querySelector('[data-live-total="profit_amount"]'), `${profit > 0 ? '+' : ''}${money(profit)}`);
+    setText(
+      document.querySelector('[data-live-total="profit_percentage"]'),
+      `${profit > 0 ? '+' : ''}${totals.profit_loss.percentage}%`
+    );
+  };
+
+  const addTransactions = (transactions) => {
+    const table = document.getElementById('transactionTable');
+    if (!table) return;
+
+    transactions.forEach(tx => {
+      const row = document.createElement('tr');
+      const color = tx.action === 'BUY' ? 'green' : 'red';
+      row.className = 'border-b border-gray-700 hover:bg-gray-750';
+      row.innerHTML = `
+        <td class="py-3 pr-4 text-sm">${new Date(tx.timestamp).toISOString().slice(0, 16).replace('T', ' ')}</td>
+        <td class="py-3 pr-4">
+          <span class="text-${color}-500 px-2 py-1 rounded text-xs font-medium bg-opacity-20 bg-${color}-500"></span>
+        </td>
+        <td class="py-3 pr-4 font-medium"></td>
+        <td class="py-3 pr-4 text-sm">${tx.amount.toLocaleString(undefined, { minimumFractionDigits: 2, maximumFractionDigits: 2 })}</td>
+        <td class="py-3 pr-4 text-sm">${money(tx.price)}</td>
+        <td class="py-3 pr-4 text-sm">${money(tx.total)}</td>
+        <td class="py-3 pr-4 text-sm">
+          <span class="px-2 py-1 rounded-full bg-green-500 bg-opacity-20 text-green-500 text-xs">Completed</span>
+        </td>`;
+      row.children[1].firstElementChild.textContent = tx.action;
+      row.children[2].textContent = tx.symbol;
+
+      table.prepend(row);
+    });
+  };
+
+  const source = new EventSource(window.portfolioStreamUrl);
+
+  source.addEventListener('snapshot', event => {
+    const snapshot = JSON.parse(event.data);
+
+    // Transactions and chart points published while disconnected are not in a snapshot
+    if (snapshot.gap) {
+      source.close();
+      window.location.reload();
+      return;
+    }
+
+    document.querySelectorAll('[data-live-symbol]').forEach(row => {
+      if (!(row.dataset.liveSymbol in snapshot.holdings)) row.remove();
+    });
+
+    updateHoldings(snapshot.holdings);
+    updateTotals(snapshot.totals);
+  });
+
+  source.addEventListener('delta', event => {
+    const delta = JSON.parse(event.data);
+
+    if (delta.holdings) updateHoldings(delta.holdings);
+    if (delta.totals) updateTotals(delta.totals);
+    if (delta.transactions) addTransactions(delta.transactions);
+    if (delta.chart && window.appendChartPoints) window.appendChartPoints(delta.chart);
+
+    (delta.removed || []).forEach(symbol => {
+      const row = document.querySelector(`[data-live-symbol="${symbol}"]`);
+      if (row) row.remove();
+    });
+  });
+});
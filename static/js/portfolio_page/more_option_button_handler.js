@@ -181,8 +181,8 @@ function showTransactionHistory(currentAssetSymbol) {
                             </span>
                         </td>
                         <td class="py-3 pr-4 font-medium">${tx.symbol}</td>
-                        <td class="py-3 pr-4 text-sm">${tx.amount}</td>
-                        <td class="py-3 pr-4 text-sm">${tx.price}</td>
+                        <td class="py-3 pr-4 text-sm">${tx.amount.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</td>
+                        <td class="py-3 pr-4 text-sm">$${tx.price.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</td>
                         <td class="py-3 pr-4 text-sm">$${tx.total.toLocaleString('en-US', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</td>
                         <td class="py-3 pr-4 text-sm">
                             <span class="px-2 py-1 rounded-full bg-green-500 bg-opacity-20 text-green-500 text-xs">${tx.status}</span>
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sdk import storage
+from sdk.portoflio.ledger import reset_ledger
+
+
+@pytest.fixture
+def temp_storage(tmp_path, monkeypatch):
+    """
+    Run against an empty database and config directory under tmp_path.
+    """
+    (tmp_path / 'config').mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, 'DB_FILE', str(tmp_path / 'trades.db'))
+
+    reset_ledger()
+    yield tmp_path
+    reset_ledger()
+
+
+@pytest.fixture
+def client(temp_storage):
+    """
+    Flask test client of the app, running against temp_storage.
+    """
+    import main
+
+    main.app.config['TESTING'] = True
+    return main.app.test_client()
@@ -0,0 +1,142 @@
+import random
+
+import pytest
+
+from sdk.alerts import AlertEngine, LocalNotifier, ThresholdIndex, load_outbox
+from sdk.portoflio.transactions import update_buy
+
+
+def quotes(**prices):
+    return {'data': {symbol: {'quote': {'USD': {'price': price}}} for symbol, price in prices.items()}}
+
+
+def test_threshold_index_matches_a_linear_scan():
+    rng = random.Random(3)
+    index = ThresholdIndex()
+    rules = {}
+
+    for rule_id in range(300):
+        rules[rule_id] = (rng.choice(['above', 'below']), float(rng.randint(0, 100)))
+        index.add('BTC', *rules[rule_id], rule_id)
+
+    for rule_id in rng.sample(sorted(rules), 100):
+        index.remove('BTC', *rules.pop(rule_id), rule_id)
+
+    assert len(index) == len(rules)
+
+    previous = 50.0
+    for _ in range(500):
+        price = float(rng.randint(0, 100))
+        expected = sorted(
+            (rule_id, level) for rule_id, (side, level) in rules.items()
+            if (side == 'above' and previous < level <= price) or (side == 'below' and price <= level < previous)
+        )
+
+        assert sorted(index.crossed('BTC', previous, price)) == expected
+        previous = price
+
+    assert index.crossed('ETH', 0, 100) == []
+
+
+def test_first_tick_only_records_the_price(temp_storage):
+    engine = AlertEngine(clock=lambda: 0)
+    rule_id = engine.add_rule('price', 'BTC', 'above', 100)
+
+    assert engine.check('BTC', 150, now=0) == []
+    assert engine.check('BTC', 90, now=0) == []
+    assert [alert['rule_id'] for alert in engine.check('BTC', 110, now=0)] == [rule_id]
+
+    # A restarted engine does not fire the level the price is already above
+    restarted = AlertEngine(clock=lambda: 0)
+    assert restarted.on_quotes(quotes(BTC=120)) == []
+    assert restarted.on_quotes(quotes(BTC=125)) == []
+
+
+def test_cooldown(temp_storage):
+    engine = AlertEngine(cooldown=600)
+    engine.add_rule('price', 'BTC', 'above', 100)
+    engine.check('BTC', 90, now=0)
+
+    assert len(engine.check('BTC', 110, now=0)) == 1
+    engine.check('BTC', 90, now=10)
+    assert engine.check('BTC', 110, now=599) == []
+
+    engine.check('BTC', 90, now=600)
+    assert len(engine.check('BTC', 110, now=600)) == 1
+
+
+def test_global_rate_limit(temp_storage):
+    engine = AlertEngine(max_per_minute=2)
+    for level in (101, 102, 103):
+        engine.add_rule('price', 'BTC', 'above', level)
+    engine.check('BTC', 100, now=0)
+
+    assert [alert['level'] for alert in engine.check('BTC', 110, now=0)] == [101, 102]
+    assert engine.suppressed == 1
+
+    engine.check('BTC', 100, now=30)
+    assert engine.check('BTC', 110, now=59) == []
+    assert engine.suppressed == 2
+
+    engine.add_rule('price', 'ETH', 'below', 10)
+    engine.check('ETH', 11, now=60)
+    assert len(engine.check('ETH', 9, now=60)) == 1
+
+
+def test_outbox_delivery(temp_storage):
+    engine = AlertEngine(clock=lambda: 0)
+    engine.add_rule('target', 'BTC', level=100, note='take profit')
+    engine.add_rule('stop', 'ETH', level=10)
+
+    engine.on_quotes(quotes(BTC=90, ETH=11))
+    alerts = engine.on_quotes(quotes(BTC=110, ETH=9))
+
+    assert sorted(alert['symbol'] for alert in alerts) == ['BTC', 'ETH']
+    assert len(load_outbox(pending_only=True)) == 2
+
+    delivered = []
+    notifier = LocalNotifier(sink=delivered.append)
+
+    assert notifier.run_once() == 2
+    assert [alert['symbol'] for alert in delivered] == ['BTC', 'ETH']
+    assert delivered[0]['message'].endswith('- take profit')
+    assert load_outbox(pending_only=True) == []
+    assert notifier.run_once() == 0
+
+    # The engine reloads the fire times from the outbox
+    restarted = AlertEngine(clock=lambda: 60)
+    restarted.load()
+    assert set(restarted.last_fired) == {alert['rule_id'] for alert in alerts}
+
+
+def test_failed_delivery_stays_pending(temp_storage):
+    engine = AlertEngine(clock=lambda: 0)
+    engine.add_rule('price', 'BTC', 'above', 100)
+    engine.on_quotes(quotes(BTC=90))
+    engine.on_quotes(quotes(BTC=110))
+
+    def sink(alert):
+        raise RuntimeError('unreachable')
+
+    assert LocalNotifier(sink=sink).run_once() == 0
+    assert len(load_outbox(pending_only=True)) == 1
+
+
+def test_average_move_rule_follows_the_position(temp_storage):
+    update_buy('BTC', 1, 100)
+
+    engine = AlertEngine()
+    rule_id = engine.add_rule('average_move', 'BTC', pct=-10)
+
+    assert engine.list_rules()[0]['levels'] == [pytest.approx(90)]
+
+    engine.check('BTC', 95, now=0)
+    assert [alert['rule_id'] for alert in engine.check('BTC', 85, now=0)] == [rule_id]
+
+
+def test_metrics_expose_suppressed_alerts(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.alert_engine, 'suppressed', 7)
+
+    assert 'alerts_suppressed_total 7' in client.get('/metrics').get_data(as_text=True).splitlines()
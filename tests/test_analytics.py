@@ -0,0 +1,25 @@
+import json
+
+from sdk import storage
+from sdk.portoflio import analytics
+
+
+def test_chart_data_reuses_the_chart_points(temp_storage, monkeypatch):
+    points = [{'x': 1, 'y': 100.0}, {'x': 2, 'y': 101.0}]
+    calls = []
+
+    def chart_data(period):
+        calls.append(period)
+        return points
+
+    def load_transactions(*args, **kwargs):
+        raise AssertionError('chart data must not load the transactions')
+
+    monkeypatch.setattr(analytics, 'get_chart_data', chart_data)
+    monkeypatch.setattr(storage, 'load_transactions', load_transactions)
+
+    values = analytics.evaluate_portfolio_nodes(['chart_data', 'chart_points'], versions=(0, 0, 'test-chart-data'))
+
+    assert json.loads(values['chart_data']) == {analytics.INITIAL_CHART_PERIOD: points}
+    assert values['chart_points'] == points
+    assert calls == [analytics.INITIAL_CHART_PERIOD]
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from sdk.api_client import CoinGeckoProvider, CoinMarketCapProvider, QuoteCache, QuoteClient
+
+
+class StubQuoteServer:
+    """
+    Local HTTP server answering the CoinMarketCap quotes endpoint at /cmc
+    and the CoinGecko markets endpoint at /gecko.
+
+    Every request is recorded with its parameters; delays (per path) and
+    status apply to the requests that follow.
+    """
+
+    def __init__(self):
+        self.prices = {}
+        self.delays = {}
+        self.status = 200
+        self.requests = []
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+                with stub._lock:
+                    stub.requests.append((url.path, params))
+
+                time.sleep(stub.delays.get(url.path, 0))
+                status, body = stub.respond(url.path, params)
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def quote(self, symbol, convert):
+        return {
+            'name': symbol,
+            'symbol': symbol,
+            'quote': {convert: {'price': self.prices[symbol], 'percent_change_24h': 0, 'percent_change_7d': 0}},
+        }
+
+    def respond(self, path, params):
+        if self.status != 200:
+            return self.status, {'error': 'unavailable'}
+
+        if path == '/gecko':
+            return 200, [
+                {'id': coin_id, 'name': coin_id, 'current_price': self.prices[coin_id.upper()]}
+                for coin_id in params['ids'].split(',')
+                if coin_id.upper() in self.prices
+            ]
+
+        symbols = [symbol for symbol in params['symbol'].split(',') if symbol in self.prices]
+        return 200, {'data': {symbol: self.quote(symbol, params['convert']) for symbol in symbols}}
+
+    def symbols_requested(self, path):
+        with self._lock:
+            return [
+                params['ids' if path == '/gecko' else 'symbol'].split(',')
+                for request_path, params in self.requests
+                if request_path == path
+            ]
+
+
+@pytest.fixture
+def quote_server():
+    server = StubQuoteServer()
+    thread = threading.Thread(target=server.server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def cmc_provider(server, **kwargs):
+    return CoinMarketCapProvider(url=f'{server.url}/cmc', api_key='test', timeout=5, **kwargs)
+
+
+def gecko_provider(server, symbols):
+    return CoinGeckoProvider(url=f'{server.url}/gecko', api_key='test', timeout=5,
+                             ids={symbol: symbol.lower() for symbol in symbols})
+
+
+def test_cache_shares_one_request_between_concurrent_callers(quote_server):
+    quote_server.prices = {'BTC': 100.0, 'ETH': 10.0}
+    quote_server.delays['/cmc'] = 0.2
+
+    cache = QuoteCache(fetcher=QuoteClient([cmc_provider(quote_server)]).fetch)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(['BTC', 'ETH']))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(quote_server.symbols_requested('/cmc')) == 1
+    assert [response['data']['BTC']['quote']['USD']['price'] for response in results] == [100.0] * 5
+    assert cache.get_stats()['upstream_requests'] == 1
+
+
+def test_cache_serves_stale_quotes_when_upstream_fails(quote_server):
+    quote_server.prices = {'BTC': 100.0}
+    now = [0.0]
+
+    cache = QuoteCache(fetcher=QuoteClient([cmc_provider(quote_server)]).fetch, ttl=60, clock=lambda: now[0])
+    assert cache.get(['BTC'])['data']['BTC']['quote']['USD']['price'] == 100.0
+
+    now[0] = 120.0
+    quote_server.status = 500
+
+    response = cache.get(['BTC'])
+
+    assert response['data']['BTC']['quote']['USD']['price'] == 100.0
+    assert len(quote_server.symbols_requested('/cmc')) == 2
+
+    stats = cache.get_stats()
+    assert stats['stale'] == 1
+    assert stats['errors'] == 1
+
+
+def test_client_splits_symbols_into_provider_batches(quote_server):
+    symbols = ['BTC', 'ETH', 'SOL', 'ADA', 'DOT']
+    quote_server.prices = {symbol: float(i + 1) for i, symbol in enumerate(symbols)}
+
+    provider = cmc_provider(quote_server)
+    provider.batch_size = 2
+
+    response = QuoteClient([provider]).fetch(symbols)
+
+    batches = quote_server.symbols_requested('/cmc')
+    assert sorted(len(batch) for batch in batches) == [1, 2, 2]
+    assert sorted(symbol for batch in batches for symbol in batch) == sorted(symbols)
+    assert {symbol: coin['quote']['USD']['price'] for symbol, coin in response['data'].items()} == quote_server.prices
+
+
+def test_client_falls_back_when_the_primary_provider_is_slow(quote_server):
+    quote_server.prices = {'BTC': 100.0, 'ETH': 10.0}
+    quote_server.delays['/cmc'] = 1.0
+
+    client = QuoteClient([cmc_provider(quote_server), gecko_provider(quote_server, ['BTC', 'ETH'])], slow_after=0.2)
+
+    start = time.perf_counter()
+    response = client.fetch(['BTC', 'ETH'])
+
+    assert time.perf_counter() - start < 1.0
+    assert response['status']['sources'] == {'BTC': 'coingecko', 'ETH': 'coingecko'}
+    assert response['data']['ETH']['quote']['USD']['price'] == 10.0
+    assert quote_server.symbols_requested('/gecko') == [['btc', 'eth']]
+
+
+def test_every_configured_symbol_has_a_coingecko_id(monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    with open('config/coin_mappings.json') as file:
+        symbols = list(json.load(file))
+
+    ids = CoinGeckoProvider(api_key='test').get_ids()
+
+    assert sorted(ids) == sorted(symbols)
+    assert ids['FET'] == 'fetch-ai'
+    assert ids['SEI'] == 'sei-network'
+    assert ids['LDO'] == 'lido-dao'
+    assert all(coin_id == coin_id.lower() and ' ' not in coin_id for coin_id in ids.values())
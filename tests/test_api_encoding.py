@@ -0,0 +1,150 @@
+import gzip
+import json
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from werkzeug.datastructures import Accept, MIMEAccept
+
+from sdk import api_encoding
+from sdk.portoflio import analytics
+
+
+def test_encode_handles_numpy_values_and_datetimes():
+    data = {'value': np.float64(1.5), 'count': np.int64(3), 'at': datetime(2024, 1, 2, 3, 4, 5), 'items': [1, 'a']}
+
+    body = api_encoding.encode(data)
+
+    assert json.loads(body) == {'value': 1.5, 'count': 3, 'at': '2024-01-02T03:04:05', 'items': [1, 'a']}
+    assert b' ' not in body
+
+
+def test_encode_without_orjson(monkeypatch):
+    monkeypatch.setattr(api_encoding, 'orjson', None)
+
+    assert api_encoding.encode({'value': np.float32(0.5)}) == b'{"value":0.5}'
+
+    with pytest.raises(TypeError):
+        api_encoding.encode({'value': object()})
+
+
+def test_small_bodies_are_not_compressed():
+    assert api_encoding.compress(b'{}', 'gzip') == (b'{}', None)
+
+    body = json.dumps([{'symbol': 'BTC', 'value': i} for i in range(200)]).encode()
+    compressed, encoding = api_encoding.compress(body, 'gzip')
+
+    assert encoding == 'gzip'
+    assert gzip.decompress(compressed) == body
+    assert api_encoding.compress(body, None) == (body, None)
+
+
+def test_format_negotiation(monkeypatch):
+    monkeypatch.setattr(api_encoding, 'msgpack', None)
+
+    assert api_encoding.negotiate_format(MIMEAccept([('application/msgpack', 1)])) == 'json'
+    assert api_encoding.negotiate_format(MIMEAccept([]), 'msgpack') is None
+    assert api_encoding.negotiate_format(MIMEAccept([]), 'json') == 'json'
+
+    monkeypatch.setattr(api_encoding, 'msgpack', object())
+
+    assert api_encoding.negotiate_format(MIMEAccept([('application/x-msgpack', 1)])) == 'msgpack'
+    assert api_encoding.negotiate_format(MIMEAccept([('application/json', 1), ('application/msgpack', 0.5)])) == 'json'
+
+
+def test_encoding_negotiation(monkeypatch):
+    monkeypatch.setattr(api_encoding, 'brotli', None)
+
+    assert api_encoding.negotiate_encoding(Accept([('gzip', 1), ('br', 1)])) == 'gzip'
+    assert api_encoding.negotiate_encoding(Accept([])) is None
+
+    monkeypatch.setattr(api_encoding, 'brotli', object())
+    assert api_encoding.negotiate_encoding(Accept([('gzip', 0.5), ('br', 1)])) == 'br'
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+
+    body = api_encoding.encode({'value': np.float64(2.5)}, 'msgpack')
+
+    assert msgpack.unpackb(body) == {'value': 2.5}
+
+
+def test_only_the_nodes_of_the_requested_fields_are_evaluated(monkeypatch):
+    evaluated = []
+
+    def evaluate_portfolio_nodes(names, versions=None):
+        evaluated.append(set(names))
+        return {'atl_ath': (10.0, 20.0), 'chart_points': [{'x': 1}]}
+
+    monkeypatch.setattr(analytics, 'evaluate_portfolio_nodes', evaluate_portfolio_nodes)
+
+    result = analytics.calculate_portfolio_fields(['extremes', 'chart'])
+
+    assert evaluated == [{'atl_ath', 'chart_points'}]
+    assert result == {
+        'extremes': {'all_time_low': 10.0, 'all_time_high': 20.0},
+        'chart': {'range': analytics.INITIAL_CHART_PERIOD, 'points': [{'x': 1}]},
+    }
+
+
+@pytest.fixture
+def api(client, monkeypatch):
+    """
+    The portfolio API with canned field values.
+    """
+    import main
+
+    requested = []
+
+    def calculate_portfolio_fields(fields, versions=None):
+        requested.append(list(fields))
+        return {field: [{'field': field, 'value': i} for i in range(100)] for field in fields}
+
+    monkeypatch.setattr(main, 'portfolio_versions', lambda: (1, 1, 1))
+    monkeypatch.setattr(main, 'calculate_portfolio_fields', calculate_portfolio_fields)
+
+    return requested
+
+
+def test_api_returns_the_requested_fields(client, api):
+    response = client.get('/api/v1/portfolio?fields=totals, extremes')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert response.headers['Vary'] == 'Accept, Accept-Encoding'
+    assert list(response.get_json()) == ['totals', 'extremes']
+
+    assert list(client.get('/api/v1/portfolio/risk').get_json()) == ['risk']
+    assert list(client.get('/api/v1/portfolio').get_json()) == list(analytics.PORTFOLIO_FIELDS)
+
+
+def test_api_rejects_unknown_fields_and_formats(client, api):
+    unknown = client.get('/api/v1/portfolio?fields=totals,secrets')
+    assert unknown.status_code == 400
+    assert 'secrets' in unknown.get_json()['error']
+
+    assert client.get('/api/v1/portfolio/secrets').status_code == 400
+    assert client.get('/api/v1/portfolio?format=xml').status_code == 406
+    assert api == []
+
+
+def test_api_etag_and_compression(client, api):
+    first = client.get('/api/v1/portfolio/holdings', headers={'Accept-Encoding': 'gzip'})
+
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(first.get_data())) == {
+        'holdings': [{'field': 'holdings', 'value': i} for i in range(100)]
+    }
+
+    cached = client.get('/api/v1/portfolio/holdings', headers={'Accept-Encoding': 'gzip',
+                                                                'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+    assert len(api) == 1
+
+    # The ETag covers the coding, so an identity response does not match it
+    plain = client.get('/api/v1/portfolio/holdings', headers={'If-None-Match': first.headers['ETag']})
+    assert plain.status_code == 200
+    assert 'Content-Encoding' not in plain.headers
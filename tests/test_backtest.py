@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from sdk.backtest import Backtest
+from sdk.candles import CANDLE_DTYPE
+
+
+def make_candles(opens, highs, lows, closes):
+    candles = np.zeros(len(closes), dtype=CANDLE_DTYPE)
+    candles['ts'] = np.arange(len(closes)) * 3600
+    candles['open'] = opens
+    candles['high'] = highs
+    candles['low'] = lows
+    candles['close'] = closes
+    return candles
+
+
+def random_candles(count, seed):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    # Gaps between the previous close and the open
+    opens = np.concatenate(([100.0], closes[:-1])) * np.exp(rng.normal(0, 0.006, count))
+    highs = np.maximum(opens, closes) * np.exp(np.abs(rng.normal(0, 0.006, count)))
+    lows = np.minimum(opens, closes) * np.exp(-np.abs(rng.normal(0, 0.006, count)))
+    return make_candles(opens, highs, lows, closes)
+
+
+def reference_exit(backtest, entry_index, direction):
+    """
+    Walk the bars after an entry one at a time.
+
+    Returns:
+        tuple: (exit index, exit price, reason)
+    """
+    candles = backtest.candles
+    count = len(candles)
+    entry = candles['close'][entry_index]
+    stop = entry * (1 - direction * backtest.stop_loss)
+    target = entry * (1 + direction * backtest.take_profit)
+
+    bar = entry_index
+    for bar in range(entry_index + 1, min(entry_index + backtest.max_bars, count - 1) + 1):
+        high, low, bar_open = candles['high'][bar], candles['low'][bar], candles['open'][bar]
+
+        if (low <= stop) if direction > 0 else (high >= stop):
+            return bar, (min(bar_open, stop) if direction > 0 else max(bar_open, stop)), 0
+        if (high >= target) if direction > 0 else (low <= target):
+            return bar, (max(bar_open, target) if direction > 0 else min(bar_open, target)), 1
+
+    return bar, candles['close'][bar], 2
+
+
+def assert_matches_reference(backtest, entries, directions):
+    trades = backtest.resolve(entries, directions)
+
+    for trade, entry_index, direction in zip(trades, entries, directions):
+        exit_index, exit_price, reason = reference_exit(backtest, entry_index, direction)
+
+        assert (trade['exit_index'], trade['reason']) == (exit_index, reason)
+        assert trade['exit'] == pytest.approx(exit_price)
+
+        notional = backtest.size * backtest.leverage
+        profit = notional * direction * (exit_price / trade['entry'] - 1) - 2 * notional * backtest.fee
+        assert trade['profit'] == pytest.approx(profit)
+
+
+@pytest.mark.parametrize('max_bars', [1, 5, 40])
+def test_resolve_matches_a_bar_by_bar_loop(max_bars):
+    candles = random_candles(400, max_bars)
+    backtest = Backtest(candles, stop_loss=0.015, take_profit=0.02, max_bars=max_bars, leverage=2, fee=0.001)
+
+    # Every bar as a long and a short, including the last max_bars bars
+    entries = np.arange(len(candles))
+    assert_matches_reference(backtest, entries, np.ones(len(entries), dtype=np.int8))
+    assert_matches_reference(backtest, entries, -np.ones(len(entries), dtype=np.int8))
+
+
+def test_stop_and_target_on_the_same_bar_count_as_the_stop():
+    candles = make_candles([100, 100, 100], [100, 110, 100], [100, 90, 100], [100, 100, 100])
+    backtest = Backtest(candles, stop_loss=0.05, take_profit=0.05, max_bars=10)
+
+    trades = backtest.resolve(np.array([0, 0]), np.array([1, -1], dtype=np.int8))
+
+    assert trades['reason'].tolist() == [0, 0]
+    assert trades['exit'].tolist() == [95, 105]
+
+
+def test_exits_fill_at_the_open_when_it_gaps_past_the_level():
+    candles = make_candles([100, 90, 100, 120], [100, 91, 100, 121], [100, 89, 100, 119], [100, 90, 100, 120])
+    backtest = Backtest(candles, stop_loss=0.05, take_profit=0.05, max_bars=10)
+
+    stopped = backtest.resolve(np.array([0]), np.array([1], dtype=np.int8))[0]
+    assert (stopped['exit_index'], stopped['reason'], stopped['exit']) == (1, 0, 90)
+
+    target = backtest.resolve(np.array([2]), np.array([1], dtype=np.int8))[0]
+    assert (target['exit_index'], target['reason'], target['exit']) == (3, 1, 120)
+
+
+def test_entries_near_the_end_exit_on_the_last_bar():
+    candles = make_candles([100] * 4, [101] * 4, [99] * 4, [100, 100, 100, 100.5])
+    backtest = Backtest(candles, stop_loss=0.05, take_profit=0.05, max_bars=10)
+
+    trades = backtest.resolve(np.array([1, 2, 3]), np.array([1, 1, 1], dtype=np.int8))
+
+    assert trades['exit_index'].tolist() == [3, 3, 3]
+    assert trades['reason'].tolist() == [2, 2, 2]
+    assert trades['exit'].tolist() == [100.5] * 3
+
+
+def test_run_takes_one_position_at_a_time():
+    candles = random_candles(600, 7)
+    backtest = Backtest(candles, max_bars=30)
+
+    trades = backtest.run('sma_cross', fast=5, slow=20)
+
+    assert len(trades)
+    assert np.all(trades['entry_index'][1:] > trades['exit_index'][:-1])
@@ -0,0 +1,47 @@
+import csv
+import gzip
+import io
+
+from sdk.portoflio.transactions import update_buy
+
+
+def exported_rows(data):
+    return list(csv.DictReader(io.StringIO(data.decode())))
+
+
+def seed_trades():
+    assert update_buy('BTC', 1, 100, date='2024-01-10T12:00')
+    assert update_buy('ETH', 2, 10, date='2024-02-10T12:00')
+    assert update_buy('BTC', 0.5, 200, date='2024-03-10T12:00')
+
+
+def test_export_all_returns_every_symbol(client):
+    seed_trades()
+
+    response = client.get('/export/transactions/all')
+
+    assert response.status_code == 200
+    assert [row['Symbol'] for row in exported_rows(response.data)] == ['BTC', 'ETH', 'BTC']
+
+
+def test_export_filters_by_symbol_and_date(client):
+    seed_trades()
+
+    rows = exported_rows(client.get('/export/transactions/BTC').data)
+    assert [row['Amount'] for row in rows] == ['1.00', '0.50']
+
+    rows = exported_rows(client.get('/export?start=2024-02-01&end=2024-03-10').data)
+    assert [row['Symbol'] for row in rows] == ['ETH', 'BTC']
+
+    assert client.get('/export?start=2024-02-31').status_code == 400
+
+
+def test_gzip_export_matches_plain_export(client):
+    seed_trades()
+
+    plain = client.get('/export/transactions/all').data
+    response = client.get('/export/transactions/all?gzip=1')
+
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.csv.gz"')
+    assert gzip.decompress(response.data) == plain
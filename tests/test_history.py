@@ -0,0 +1,277 @@
+import math
+import random
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from sdk import storage
+from sdk.portoflio import history as history_module
+from sdk.portoflio.history import (
+    CHART_PERIODS,
+    HISTORY_DATETIME_FORMAT,
+    SECONDS_PER_DAY,
+    PortfolioHistory,
+    StorageHistorySource,
+    append_snapshot,
+    calculate_change,
+    get_portfolio_history,
+    parse_datetimes,
+    period_seconds,
+)
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def make_entries(count, seed, step=timedelta(hours=7)):
+    rng = random.Random(seed)
+    entries = []
+    value = 1000.0
+
+    for i in range(count):
+        value *= 1 + rng.uniform(-0.05, 0.05)
+        entries.append({
+            'datetime': (NOW - i * step).strftime(HISTORY_DATETIME_FORMAT),
+            'total_value': round(value, 2),
+            'total_investment': 900.0,
+            'profit_loss': round(value - 900, 2),
+            'profit_loss_percentage': round((value - 900) / 9, 2),
+        })
+
+    # Stored newest first, the engine sorts them
+    return entries
+
+
+def epoch(moment):
+    return int((moment - datetime(1970, 1, 1)).total_seconds())
+
+
+def reference_drawdown_and_sharpe(values, risk_free_rate=0.02, periods_per_year=252):
+    returns = [current / previous - 1 for previous, current in zip(values, values[1:])]
+
+    peak, cumulative, drawdown = 1.0, 1.0, 0.0
+    for value in returns:
+        cumulative *= 1 + value
+        peak = max(peak, cumulative)
+        drawdown = min(drawdown, cumulative / peak - 1)
+
+    mean = sum(returns) / len(returns)
+    std = math.sqrt(sum((value - mean) ** 2 for value in returns) / (len(returns) - 1))
+    sharpe = (mean - risk_free_rate / periods_per_year) / std * math.sqrt(periods_per_year)
+
+    return round(abs(drawdown) * 100, 2), round(sharpe, 2)
+
+
+def test_from_entries_sorts_the_columns():
+    entries = make_entries(50, 1)
+    history = PortfolioHistory.from_entries(entries + [{'total_value': 1}])
+
+    ordered = sorted(entries, key=lambda entry: entry['datetime'])
+
+    assert len(history) == 50
+    assert history.timestamps.tolist() == [
+        epoch(datetime.strptime(entry['datetime'], HISTORY_DATETIME_FORMAT)) for entry in ordered
+    ]
+    assert history.total_value.tolist() == [entry['total_value'] for entry in ordered]
+    assert history.profit_loss_percentage.tolist() == [entry['profit_loss_percentage'] for entry in ordered]
+
+
+def test_parse_datetimes_falls_back_per_value(caplog):
+    timestamps = parse_datetimes(['2024-01-01 00:00:00', 'not a date'])
+
+    assert timestamps[0] == epoch(datetime(2024, 1, 1))
+    assert 'Invalid datetime format' in caplog.text
+
+
+def test_metrics_match_a_reference():
+    entries = make_entries(300, 2)
+    history = PortfolioHistory.from_entries(entries)
+    values = [entry['total_value'] for entry in sorted(entries, key=lambda entry: entry['datetime'])]
+
+    assert history.atl_ath() == (round(min(values), 2), round(max(values), 2))
+    assert history.drawdown_and_sharpe() == reference_drawdown_and_sharpe(values)
+
+
+def test_empty_and_short_histories():
+    empty = PortfolioHistory.from_entries([])
+
+    assert empty.atl_ath() == (99999999, 0)
+    assert empty.drawdown_and_sharpe() == (0, 0)
+    assert empty.chart_points() == []
+
+    single = PortfolioHistory.from_entries(make_entries(1, 3))
+    assert single.drawdown_and_sharpe() == (0, 0)
+
+
+def test_extremes_of_rolled_up_snapshots_count():
+    history = PortfolioHistory.from_entries(make_entries(10, 4))
+    low, high = history.atl_ath()
+
+    history.extremes = (low - 10, high + 10)
+
+    assert history.atl_ath() == (round(low - 10, 2), round(high + 10, 2))
+
+
+def test_chart_buckets_match_timedelta_days():
+    entries = make_entries(2000, 5)
+    history = PortfolioHistory.from_entries(entries)
+
+    buckets = history.chart_buckets(now=epoch(NOW))
+
+    ordered = sorted(entries, key=lambda entry: entry['datetime'])
+    for period, days in CHART_PERIODS.items():
+        expected = [
+            entry['total_value'] for entry in ordered
+            if (NOW - datetime.strptime(entry['datetime'], HISTORY_DATETIME_FORMAT)).days <= days
+        ]
+        assert [point['total_value'] for point in buckets[period]] == expected
+
+    assert len(buckets['All']) == len(entries)
+
+
+def test_chart_points_convert_to_milliseconds():
+    history = PortfolioHistory.from_entries(make_entries(3, 6))
+
+    points = history.chart_points(start=1, utc_offset=3600)
+
+    assert [point['x'] for point in points] == [(ts - 3600) * 1000 for ts in history.timestamps[1:].tolist()]
+    assert set(points[0]) == {'x', 'total_value', 'total_investment', 'profit_loss', 'profit_loss_percentage'}
+
+
+class CountingSource(StorageHistorySource):
+    def __init__(self):
+        self.loads = 0
+
+    def load_columns(self):
+        self.loads += 1
+        return super().load_columns()
+
+
+def test_history_is_loaded_from_storage_once(temp_storage):
+    source = CountingSource()
+    history_module.set_history_source(source)
+
+    entries = make_entries(20, 7)
+    for entry in entries:
+        storage.append_portfolio_history(entry)
+
+    history = get_portfolio_history()
+    assert history.total_value.tolist() == [
+        entry['total_value'] for entry in sorted(entries, key=lambda entry: entry['datetime'])
+    ]
+    assert get_portfolio_history() is history
+    assert source.loads == 1
+
+    # Written by another process: the signature changes and the history reloads
+    storage.append_portfolio_history(make_entries(1, 8)[0])
+    assert len(get_portfolio_history()) == 21
+    assert source.loads == 2
+
+    history_module.set_history_source(StorageHistorySource())
+
+
+@pytest.mark.parametrize('count', [0, 1, 5])
+def test_columns_of_short_storage_histories(temp_storage, count):
+    for entry in make_entries(count, 9):
+        storage.append_portfolio_history(entry)
+
+    columns = storage.load_portfolio_history_columns()
+
+    assert len(columns) == len(storage.HISTORY_COLUMNS)
+    assert all(len(column) == count for column in columns)
+    assert np.all(np.diff(parse_datetimes(columns[0])) >= 0)
+
+
+def reference_closest(timestamps, target, tolerance):
+    best = -1
+    for i, timestamp in enumerate(timestamps):
+        # On a tie the newer snapshot wins
+        if best < 0 or abs(timestamp - target) <= abs(timestamps[best] - target):
+            best = i
+
+    return best if best >= 0 and abs(timestamps[best] - target) <= tolerance else -1
+
+
+def test_closest_indices_match_a_linear_scan():
+    rng = random.Random(10)
+    timestamps = sorted(rng.randint(0, 100 * SECONDS_PER_DAY) for _ in range(300))
+    history = PortfolioHistory(timestamps, *[np.zeros(len(timestamps))] * 4)
+
+    targets = [rng.randint(-5 * SECONDS_PER_DAY, 105 * SECONDS_PER_DAY) for _ in range(500)]
+    targets += timestamps[:20] + [(a + b) // 2 for a, b in zip(timestamps, timestamps[1:])][:20]
+
+    for tolerance in (3600, SECONDS_PER_DAY):
+        assert history.closest_indices(targets, tolerance).tolist() == [
+            reference_closest(timestamps, target, tolerance) for target in targets
+        ]
+
+    assert PortfolioHistory([], [], [], [], []).closest_indices([0, 1]).tolist() == [-1, -1]
+
+
+def test_changes_for_periods():
+    now = epoch(NOW)
+    timestamps = [now - 400 * SECONDS_PER_DAY, now - 30 * SECONDS_PER_DAY, now - SECONDS_PER_DAY - 60,
+                  now - 3600, now]
+    values = [50.0, 80.0, 90.0, 99.0, 100.0]
+    history = PortfolioHistory(timestamps, values, *[np.zeros(5)] * 3)
+
+    changes = history.changes_for_periods(['1h', '24h', '30d', '90d', '1y', 'YTD'])
+
+    assert changes['1h'] == calculate_change(100.0, 99.0)
+    assert changes['24h'] == calculate_change(100.0, 90.0)
+    assert changes['30d'] == calculate_change(100.0, 80.0)
+    # Nothing within a day of 90 days or one year ago
+    assert changes['90d'] == changes['1y'] == {'amount': 0, 'percentage': 0, 'is_positive': True}
+    assert changes['YTD'] == {'amount': 0, 'percentage': 0, 'is_positive': True}
+
+    assert history.change_for_period(3600, current_value=110.0) == calculate_change(110.0, 99.0)
+
+
+def test_period_seconds():
+    assert period_seconds('15m', 0) == 900
+    assert period_seconds('2w', 0) == 14 * SECONDS_PER_DAY
+    assert period_seconds('ytd', epoch(datetime(2024, 3, 1))) == epoch(datetime(2024, 3, 1)) - epoch(datetime(2024, 1, 1))
+
+    with pytest.raises(ValueError):
+        period_seconds('7x', 0)
+
+
+@pytest.mark.parametrize('seed', [11, 12])
+def test_append_keeps_the_index_sorted(seed):
+    rng = random.Random(seed)
+    rows = [(rng.randint(0, 10 ** 6), float(i), 1.0, 2.0, 3.0) for i in range(200)]
+
+    history = PortfolioHistory(*zip(*rows[:10]))
+    for row in rows[10:]:
+        history.append(*row)
+
+    expected = PortfolioHistory(*zip(*rows))
+
+    assert len(history) == 200
+    assert history.timestamps.tolist() == expected.timestamps.tolist()
+    assert history.total_value.tolist() == expected.total_value.tolist()
+    assert history.period_start(5, now=10 ** 6) == expected.period_start(5, now=10 ** 6)
+
+
+def test_append_snapshot_updates_the_loaded_history(temp_storage):
+    source = CountingSource()
+    history_module.set_history_source(source)
+
+    entries = make_entries(10, 13)
+    for entry in entries[1:]:
+        storage.append_portfolio_history(entry)
+
+    history = get_portfolio_history()
+
+    # An older snapshot is inserted at its sorted position
+    append_snapshot(entries[0])
+    append_snapshot({**entries[-1], 'datetime': '2020-01-01 00:00:00'})
+
+    assert get_portfolio_history() is history
+    assert source.loads == 1
+    assert len(history) == 11
+    assert history.timestamps.tolist() == sorted(history.timestamps.tolist())
+    assert history.timestamps[0] == epoch(datetime(2020, 1, 1))
+
+    history_module.set_history_source(StorageHistorySource())
@@ -0,0 +1,58 @@
+import io
+import json
+
+import pytest
+
+from sdk import storage
+from sdk.portoflio.importer import import_transactions
+from sdk.portoflio.transactions import stream_csv_content
+
+
+def jsonl(*rows):
+    return io.StringIO(''.join(json.dumps(row) + '\n' for row in rows))
+
+
+def row(amount, price, time='12:00:00', action='BUY'):
+    return {
+        'Date': '2024-01-02', 'Time': time, 'Action': action, 'Symbol': 'BTC',
+        'Amount': amount, 'Price': price, 'Total': amount * price, 'Status': 'Completed',
+    }
+
+
+def test_sub_cent_trades_in_the_same_second_are_not_duplicates(temp_storage):
+    assert import_transactions(jsonl(row(0.001, 40000.0), row(1000, 0.0011)), 'jsonl')['imported'] == 2
+
+    report = import_transactions(jsonl(row(0.004, 40000.0), row(1000, 0.0012)), 'jsonl')
+    assert report['imported'] == 2
+    assert report['duplicates'] == 0
+
+    report = import_transactions(jsonl(row(0.004, 40000.0), row(1000, 0.0011)), 'jsonl')
+    assert report['imported'] == 0
+    assert report['duplicates'] == 2
+
+
+def test_reimporting_an_export_adds_nothing(temp_storage):
+    import_transactions(jsonl(row(0.011, 40000.0), row(0.014, 40000.0), row(1.23456, 2000.123456, '13:00:00'),
+                              row(1.5, 2000.0, '13:00:00'), row(0.5, 2100.0, '14:00:00', 'SELL')), 'jsonl')
+
+    exported = ''.join(stream_csv_content())
+    report = import_transactions(io.StringIO(exported), 'csv')
+
+    assert report['errors'] == []
+    assert report['imported'] == 0
+    assert report['duplicates'] == 5
+    assert len(storage.load_transactions()) == 5
+
+
+@pytest.mark.parametrize('explicit_db', [False, True])
+def test_import_keeps_unexplained_positions(temp_storage, explicit_db):
+    position = {'quantity': 2.0, 'average_price': 10.0, 'total_investment': 20.0}
+    (temp_storage / 'config' / 'portfolio.json').write_text(json.dumps({'ETH': position}))
+    storage.init_storage()
+
+    report = import_transactions(jsonl(row(1.0, 40000.0)), 'jsonl', storage.DB_FILE if explicit_db else None)
+    assert report['imported'] == 1
+
+    positions = storage.load_positions()
+    assert positions['ETH']['quantity'] == pytest.approx(2.0)
+    assert positions['BTC']['quantity'] == pytest.approx(1.0)
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from sdk import journal, storage
+
+
+@pytest.fixture
+def trades(temp_storage):
+    rng = random.Random(12)
+    rows = []
+
+    for i in range(137):
+        values = {column: None for column in storage.TRADE_COLUMNS}
+        values.update({
+            'date': f'2024-01-{rng.randint(1, 28):02d}',
+            'pair': rng.choice(['BTC/USDT', 'ETH/USDT']),
+            # Few distinct profits so pages split ties
+            'profit': float(rng.randint(-5, 5)),
+            'confidence': rng.randint(1, 3),
+            'result': 'win',
+        })
+        values['id'] = journal.add_trade(values)
+        rows.append(values)
+
+    return rows
+
+
+def read_all_pages(limit, **kwargs):
+    ids, cursor, pages = [], None, 0
+
+    while True:
+        rows, cursor = journal.query_trades(cursor=cursor, limit=limit, **kwargs)
+        ids += [row['id'] for row in rows]
+        pages += 1
+
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize('sort', sorted(journal.JOURNAL_SORTS))
+@pytest.mark.parametrize('filters', [None, {'confidence': 2}, {'confidence': 3, 'pair': 'ETH/USDT'}])
+def test_pages_match_a_full_sort(trades, sort, filters):
+    column, direction = journal.JOURNAL_SORTS[sort]
+
+    matching = [trade for trade in trades if all(trade[key] == value for key, value in (filters or {}).items())]
+    expected = [
+        trade['id'] for trade in sorted(matching, key=lambda trade: (trade[column], trade['id']),
+                                        reverse=direction == 'DESC')
+    ]
+
+    ids, pages = read_all_pages(10, sort=sort, filters=filters)
+
+    assert ids == expected
+    assert pages == max(1, -(-len(expected) // 10))
+
+
+def test_date_range_and_page_size(trades):
+    expected = sorted(
+        (trade for trade in trades if '2024-01-10' <= trade['date'] < '2024-01-20'),
+        key=lambda trade: (trade['date'], trade['id'])
+    )
+
+    ids, _ = read_all_pages(7, sort='date_asc', start='2024-01-10', end='2024-01-20')
+    assert ids == [trade['id'] for trade in expected]
+
+    rows, cursor = journal.query_trades(limit=10 ** 6)
+    assert len(rows) == len(trades)
+    assert cursor is None
+
+    # A malformed cursor starts from the first page
+    assert journal.query_trades(cursor='not a cursor', limit=5)[0] == journal.query_trades(limit=5)[0]
+
+
+@pytest.mark.parametrize('table', sorted(journal.JOURNAL_TABLES.values()))
+@pytest.mark.parametrize('condition, order, index', [
+    ('(profit, id) < (1, 5)', 'profit DESC, id DESC', 'profit'),
+    ('confidence = 2', 'date DESC, id DESC', 'confidence'),
+])
+def test_profit_sort_and_confidence_filter_use_an_index(temp_storage, table, condition, order, index):
+    with storage.connect() as conn:
+        plan = ' '.join(
+            row[3] for row in
+            conn.execute(f'EXPLAIN QUERY PLAN SELECT * FROM {table} WHERE {condition} ORDER BY {order} LIMIT 10')
+        )
+
+    assert f'idx_{table}_{index}' in plan
+    assert 'TEMP B-TREE' not in plan
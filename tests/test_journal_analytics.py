@@ -0,0 +1,138 @@
+import random
+
+import numpy as np
+
+from sdk import journal, storage
+from sdk.journal_analytics import JOURNAL_GROUPS, JournalAnalytics, max_consecutive_losses
+
+
+def random_trades(count, seed):
+    rng = random.Random(seed)
+    trades = []
+
+    for _ in range(count):
+        values = {column: None for column in storage.TRADE_COLUMNS}
+        entry = float(rng.randint(90, 110))
+        values.update({
+            'date': f'2024-{rng.randint(1, 3):02d}-{rng.randint(1, 28):02d}',
+            'pair': rng.choice(['BTC/USDT', 'ETH/USDT', 'SOL/USDT']),
+            'type': rng.choice(['Buy', 'Sell']),
+            'entry': entry,
+            'stopLoss': rng.choice([entry - 5, entry + 5, entry, None]),
+            'exit': float(rng.randint(85, 115)),
+            'profit': rng.choice([float(rng.randint(-50, 50)), None]),
+            'strategy': rng.choice(['breakout', 'range', 'trend', None]),
+            'session': rng.choice(['asia', 'london', 'new_york']),
+            'confidence': rng.choice([1, 4, 5, 8, None]),
+        })
+        trades.append(values)
+
+    return trades
+
+
+def bucket(confidence):
+    if confidence is None:
+        return 'unknown'
+    return 'high' if confidence >= 7 else 'medium' if confidence >= 4 else 'low'
+
+
+def reference_metrics(trades):
+    """
+    Metrics of one group computed trade by trade, trades in (date, id) order.
+    """
+    pnl = [trade['profit'] or 0.0 for trade in trades]
+
+    r_values = []
+    for trade in trades:
+        if trade['stopLoss'] is None or trade['stopLoss'] == trade['entry']:
+            continue
+        direction = -1 if trade['type'] == 'Sell' else 1
+        r_values.append(direction * (trade['exit'] - trade['entry']) / abs(trade['entry'] - trade['stopLoss']))
+
+    streak = longest = 0
+    for value in pnl:
+        streak = streak + 1 if value < 0 else 0
+        longest = max(longest, streak)
+
+    gross_profit = sum(value for value in pnl if value > 0)
+    gross_loss = -sum(value for value in pnl if value < 0)
+
+    equity, curve = 0.0, []
+    for trade, value in zip(trades, pnl):
+        equity += value
+        curve.append([trade['date'], round(equity, 2)])
+
+    return {
+        'trades': len(trades),
+        'win_rate': round(sum(value > 0 for value in pnl) / len(trades) * 100, 2),
+        'expectancy': round(sum(pnl) / len(trades), 2),
+        'average_r': round(sum(r_values) / len(r_values), 2) if r_values else None,
+        'profit_factor': round(gross_profit / gross_loss, 2) if gross_loss else None,
+        'max_consecutive_losses': longest,
+        'total_profit': round(sum(pnl), 2),
+        'equity_curve': curve,
+    }
+
+
+def reference_compute(trades):
+    ordered = sorted(trades, key=lambda trade: (trade['date'], trade['id']))
+    keys = {
+        'strategy': lambda trade: trade['strategy'] or '',
+        'pair': lambda trade: trade['pair'],
+        'session': lambda trade: trade['session'],
+        'confidence': lambda trade: bucket(trade['confidence']),
+    }
+
+    result = {'overall': reference_metrics(ordered)}
+    for group in JOURNAL_GROUPS:
+        names = sorted({keys[group](trade) for trade in ordered})
+        result[f'by_{group}'] = {
+            name: reference_metrics([trade for trade in ordered if keys[group](trade) == name]) for name in names
+        }
+
+    return result
+
+
+def store(trades):
+    for trade in trades:
+        trade['id'] = journal.add_trade(trade)
+
+
+def test_compute_matches_a_per_group_reference(temp_storage):
+    trades = random_trades(150, 13)
+    store(trades)
+
+    assert JournalAnalytics().compute() == reference_compute(trades)
+
+
+def test_refresh_extends_the_columns(temp_storage):
+    trades = random_trades(150, 21)
+    analytics = JournalAnalytics()
+
+    assert analytics.compute()['overall'] is None
+
+    store(trades[:100])
+    assert analytics.compute() == reference_compute(trades[:100])
+
+    store(trades[100:])
+    assert analytics.refresh() == 50
+    assert analytics.compute() == reference_compute(trades)
+
+
+def test_equity_curves_are_downsampled(temp_storage):
+    store(random_trades(450, 5))
+
+    result = JournalAnalytics().compute()
+
+    curve = result['overall']['equity_curve']
+    assert len(curve) == 200
+    assert [date for date, _ in curve] == sorted(date for date, _ in curve)
+    assert all(len(metrics['equity_curve']) == min(metrics['trades'], 200) for metrics in result['by_pair'].values())
+
+
+def test_max_consecutive_losses_per_group():
+    groups = np.array([0, 1, 0, 0, 1, 1, 0, 2])
+    losses = np.array([True, True, True, False, True, True, True, False])
+
+    assert max_consecutive_losses(groups, losses, 3).tolist() == [2, 3, 0]
+    assert max_consecutive_losses(groups[:0], losses[:0], 3).tolist() == [0, 0, 0]
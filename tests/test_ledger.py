@@ -0,0 +1,131 @@
+import json
+import random
+import threading
+
+import pytest
+
+from sdk import storage
+from sdk.portoflio.ledger import OPENING_BALANCE_NOTE, PositionLedger, get_ledger
+from sdk.portoflio.transactions import update_buy, update_sell
+
+
+def assert_matches_replay(ledger):
+    replayed = PositionLedger.replay(storage.load_transactions())
+
+    positions = ledger.open_positions()
+    assert positions.keys() == replayed.open_positions().keys()
+
+    for symbol, position in replayed.open_positions().items():
+        for field, value in position.items():
+            assert positions[symbol][field] == pytest.approx(value)
+
+    for field, value in replayed.totals().items():
+        assert ledger.totals()[field] == pytest.approx(value)
+
+    locations = ledger.location_positions()
+    assert locations.keys() == replayed.location_positions().keys()
+
+    for key, location in replayed.location_positions().items():
+        for field, value in location.items():
+            assert locations[key][field] == pytest.approx(value)
+
+
+def test_backdated_trades_match_replay(temp_storage):
+    assert update_buy('BTC', 1, 100, date='2024-03-01T10:00')
+    assert update_buy('BTC', 1, 200, date='2024-01-01T10:00')
+    assert update_sell('BTC', 0.5, 300, date='2024-02-01T10:00')
+    assert update_buy('BTC', 1, 50)
+
+    ledger = get_ledger()
+    assert_matches_replay(ledger)
+
+    # Sold out of the 200 lot alone, before the 100 buy
+    assert ledger.totals()['realized_pnl'] == pytest.approx(50)
+    assert storage.load_positions()['BTC']['quantity'] == pytest.approx(2.5)
+
+
+def test_interleaved_trades_match_replay(temp_storage):
+    def trade(seed):
+        rng = random.Random(seed)
+        for _ in range(15):
+            symbol = rng.choice(['BTC', 'ETH'])
+            date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:00"
+            if rng.random() < 0.6:
+                update_buy(symbol, rng.randint(1, 5), rng.randint(10, 100), date=date, exchange=f'E{seed % 2}')
+            else:
+                update_sell(symbol, rng.randint(1, 3), rng.randint(10, 100), date=date, exchange=f'E{seed % 2}')
+
+    threads = [threading.Thread(target=trade, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert storage.load_transactions()
+    assert_matches_replay(get_ledger())
+
+
+def test_locations_keep_their_own_cost(temp_storage):
+    assert update_buy('BTC', 1, 100, exchange='A')
+    assert update_buy('BTC', 1, 200, exchange='B')
+    assert update_sell('BTC', 0.5, 300, exchange='B')
+
+    ledger = get_ledger()
+    locations = ledger.location_positions()
+
+    assert locations[('BTC', 'A', 'Unknown')]['average_price'] == pytest.approx(100)
+    assert locations[('BTC', 'B', 'Unknown')]['average_price'] == pytest.approx(200)
+    assert locations[('BTC', 'B', 'Unknown')]['total_investment'] == pytest.approx(100)
+    assert ledger.open_positions()['BTC']['average_price'] == pytest.approx(150)
+
+
+def test_oversell_is_rejected(temp_storage):
+    assert update_buy('ETH', 1, 100)
+    assert not update_sell('ETH', 2, 150)
+
+    assert len(storage.load_transactions('ETH')) == 1
+    assert get_ledger().open_positions()['ETH']['quantity'] == pytest.approx(1)
+
+
+def test_unexplained_positions_are_kept(temp_storage):
+    position = {'quantity': 3.0, 'average_price': 10.0, 'total_investment': 30.0}
+    (temp_storage / 'config' / 'portfolio.json').write_text(json.dumps({'SOL': position}))
+    (temp_storage / 'config' / 'transactions.json').write_text(json.dumps([
+        {'symbol': 'SOL', 'action': 'BUY', 'amount': 1.0, 'price': 20.0, 'total': 20.0,
+         'timestamp': '2024-01-01T00:00:00+00:00'},
+    ]))
+
+    storage.init_storage()
+    assert not storage.transaction_log_complete()
+
+    ledger = get_ledger()
+
+    assert storage.transaction_log_complete()
+    assert ledger.open_positions()['SOL']['quantity'] == pytest.approx(3.0)
+    assert storage.load_positions()['SOL']['quantity'] == pytest.approx(3.0)
+
+    opening = storage.load_transactions('SOL')[0]
+    assert opening['notes'] == OPENING_BALANCE_NOTE
+    assert opening['amount'] == pytest.approx(2.0)
+    assert opening['timestamp'] < '2024-01-01T00:00:00+00:00'
+
+
+def test_migrated_portfolio_without_transactions(temp_storage):
+    position = {'quantity': 2.0, 'average_price': 100.0, 'total_investment': 200.0}
+    (temp_storage / 'config' / 'portfolio.json').write_text(json.dumps({'BTC': position}))
+    (temp_storage / 'config' / 'transactions.json').write_text('[]')
+
+    storage.init_storage()
+
+    assert get_ledger().symbols() == ['BTC']
+
+    assert update_sell('BTC', 1, 150)
+
+    ledger = get_ledger()
+    assert ledger.open_positions()['BTC']['quantity'] == pytest.approx(1.0)
+    assert ledger.totals()['realized_pnl'] == pytest.approx(50.0)
+    assert storage.load_positions()['BTC']['quantity'] == pytest.approx(1.0)
+    assert_matches_replay(ledger)
+
+    assert not update_sell('BTC', 2, 150)
+    assert get_ledger().open_positions()['BTC']['quantity'] == pytest.approx(1.0)
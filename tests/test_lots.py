@@ -0,0 +1,157 @@
+import random
+
+import pytest
+
+from sdk.portoflio.lots import COST_BASIS_METHODS, CostBasisEngine, LotBook
+
+
+def reference_sell(lots, method, amount):
+    """
+    Close lots one at a time from a plain list of [quantity, price] lots.
+
+    Returns:
+        float: Cost basis of the sold quantity
+    """
+    remaining = min(amount, sum(quantity for quantity, _ in lots))
+    cost = 0.0
+
+    while remaining > 1e-12 and lots:
+        if method == 'fifo':
+            index = 0
+        elif method == 'lifo':
+            index = len(lots) - 1
+        else:
+            index = max(range(len(lots)), key=lambda i: (lots[i][1], -i))
+
+        used = min(remaining, lots[index][0])
+        cost += used * lots[index][1]
+        remaining -= used
+        lots[index][0] -= used
+
+        if lots[index][0] <= 1e-12:
+            del lots[index]
+
+    return cost
+
+
+@pytest.mark.parametrize('method', ['fifo', 'lifo', 'hifo'])
+def test_lot_methods_match_a_reference(method):
+    rng = random.Random(method)
+    book = LotBook(method)
+    lots = []
+
+    for _ in range(500):
+        if rng.random() < 0.55 or not lots:
+            amount, price = rng.randint(1, 20) / 4, float(rng.randint(1, 100))
+            book.buy(amount, price)
+            lots.append([amount, price])
+        else:
+            amount, price = rng.randint(1, 30) / 4, float(rng.randint(1, 100))
+            held = sum(quantity for quantity, _ in lots)
+
+            expected_cost = reference_sell(lots, method, amount)
+            pnl, cost = book.sell(amount, price)
+
+            assert cost == pytest.approx(expected_cost)
+            assert pnl == pytest.approx(min(amount, held) * price - expected_cost)
+
+        assert book.open_lots() == pytest.approx([tuple(lot) for lot in lots])
+        assert book.quantity == pytest.approx(sum(quantity for quantity, _ in lots))
+
+
+def test_partial_lot_consumption():
+    book = LotBook('fifo')
+    book.buy(2, 10)
+    book.buy(2, 20)
+
+    pnl, cost = book.sell(3, 30)
+
+    assert cost == pytest.approx(2 * 10 + 1 * 20)
+    assert pnl == pytest.approx(90 - 40)
+    assert book.open_lots() == [(1, 20)]
+
+
+def test_selling_more_than_held_closes_the_position():
+    book = LotBook('lifo')
+    book.buy(1, 10)
+
+    pnl, cost = book.sell(5, 30)
+
+    assert cost == pytest.approx(10)
+    assert pnl == pytest.approx(20)
+    assert book.quantity == 0
+    assert book.cost == 0
+    assert book.open_lots() == []
+
+    # Nothing left to sell
+    assert book.sell(1, 30) == (0, 0)
+
+
+def test_fifo_trims_the_consumed_prefix():
+    book = LotBook('fifo')
+    for price in range(1, 11):
+        book.buy(1, price)
+
+    book.sell(4, 50)
+    assert book.head == 4
+    assert len(book.quantities) == 10
+
+    book.sell(1, 50)
+    assert book.head == 0
+    assert list(book.prices) == [6, 7, 8, 9, 10]
+
+
+def test_hifo_compacts_closed_lots():
+    book = LotBook('hifo')
+    for price in [5, 1, 9, 3, 7, 2]:
+        book.buy(1, price)
+
+    book.sell(2, 10)
+    assert len(book.quantities) == 6
+
+    book.sell(2, 10)
+    assert len(book.quantities) == 2
+    assert sorted(book.prices) == [1, 2]
+
+    book.buy(1, 4)
+    _, cost = book.sell(1.5, 10)
+    assert cost == pytest.approx(4 + 0.5 * 2)
+
+
+def test_average_pools_the_cost():
+    book = LotBook('average')
+    book.buy(1, 10)
+    book.buy(1, 30)
+
+    pnl, cost = book.sell(1, 25)
+
+    assert cost == pytest.approx(20)
+    assert pnl == pytest.approx(5)
+    assert book.open_lots() == [(1, 20)]
+
+
+def test_report_without_prices():
+    engine = CostBasisEngine.replay([
+        {'symbol': 'BTC', 'action': 'BUY', 'amount': 1, 'price': 100},
+        {'symbol': 'BTC', 'action': 'SELL', 'amount': 0.5, 'price': 300},
+        {'symbol': 'ETH', 'action': 'BUY', 'amount': 2, 'price': 10},
+    ])
+
+    report = engine.report({'ETH': 15})
+
+    assert report['symbols']['BTC']['unrealized_pnl'] is None
+    assert report['symbols']['BTC']['realized_pnl'] == 100
+    assert report['symbols']['ETH']['unrealized_pnl'] == 10
+    assert report['totals'] == {'cost_basis': 70, 'market_value': 30, 'realized_pnl': 100, 'unrealized_pnl': 10}
+
+    assert CostBasisEngine().report() == {
+        'method': 'fifo', 'symbols': {},
+        'totals': {'cost_basis': 0, 'market_value': 0, 'realized_pnl': 0, 'unrealized_pnl': 0},
+    }
+
+
+def test_unknown_method_is_rejected():
+    assert 'hifo' in COST_BASIS_METHODS
+
+    with pytest.raises(ValueError):
+        LotBook('random')
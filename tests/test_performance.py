@@ -0,0 +1,27 @@
+from sdk.portoflio import performance
+from sdk.portoflio.history import PortfolioHistory
+
+
+def test_chart_cache_is_bounded(monkeypatch):
+    history = PortfolioHistory.from_entries([
+        {'datetime': f'2024-01-01 {hour:02d}:00:00', 'total_value': 100.0 + hour, 'total_investment': 100.0,
+         'profit_loss': float(hour), 'profit_loss_percentage': float(hour)}
+        for hour in range(24)
+    ])
+    now = [1704110400]
+
+    monkeypatch.setattr(performance, 'get_portfolio_history', lambda: history)
+    monkeypatch.setattr(performance, 'naive_now', lambda: now[0])
+    monkeypatch.setitem(performance._chart_cache, 'history', None)
+
+    for points in range(10, 110):
+        performance.get_chart_data('All', points)
+
+    ranges = performance._chart_cache['ranges']
+    assert len(ranges) == performance.CHART_CACHE_SIZE
+    assert ('All', 109, now[0] // 60) in ranges
+
+    now[0] += 60
+    performance.get_chart_data('All', 10)
+
+    assert list(ranges) == [('All', 10, now[0] // 60)]
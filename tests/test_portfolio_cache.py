@@ -0,0 +1,105 @@
+import pytest
+
+from sdk.portoflio import analytics, versions
+from sdk.portoflio.transactions import update_buy
+from sdk.portoflio.versions import VersionedCache, get_versions
+
+
+@pytest.fixture
+def page(client, monkeypatch):
+    """
+    /portfolio with controllable input versions and a counting renderer.
+    """
+    import main
+
+    state = {'versions': (1, 1, 1), 'computed': 0}
+
+    def calculate_portfolio_data(page_versions):
+        state['computed'] += 1
+        return {'versions': page_versions}
+
+    monkeypatch.setattr(main, 'portfolio_versions', lambda: state['versions'])
+    monkeypatch.setattr(main, 'calculate_portfolio_data', calculate_portfolio_data)
+    monkeypatch.setattr(main, 'render_template', lambda name, **data: f"{name} {data['versions']}")
+    monkeypatch.setattr(main, 'portfolio_page', {'etag': None, 'html': None})
+
+    return state
+
+
+def test_page_is_rendered_once_per_version(client, page):
+    first = client.get('/portfolio')
+
+    assert first.status_code == 200
+    assert first.get_data(as_text=True) == 'portfolio.html (1, 1, 1)'
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/portfolio')
+    assert again.get_data(as_text=True) == first.get_data(as_text=True)
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert page['computed'] == 1
+
+    page['versions'] = (1, 2, 1)
+    changed = client.get('/portfolio')
+
+    assert changed.get_data(as_text=True) == 'portfolio.html (1, 2, 1)'
+    assert changed.headers['ETag'] != first.headers['ETag']
+    assert page['computed'] == 2
+
+
+def test_matching_etag_gets_304(client, page):
+    etag = client.get('/portfolio').headers['ETag']
+
+    response = client.get('/portfolio', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+
+    page['versions'] = (2, 1, 1)
+    assert client.get('/portfolio', headers={'If-None-Match': etag}).status_code == 200
+    assert page['computed'] == 2
+
+
+def test_versioned_cache_recomputes_on_a_new_key():
+    cache = VersionedCache()
+    calls = []
+
+    def compute(value):
+        return lambda: calls.append(value) or value
+
+    assert cache.get('holdings', (1, 1), compute('a')) == 'a'
+    assert cache.get('holdings', (1, 1), compute('b')) == 'a'
+    assert cache.get('history', (1,), compute('c')) == 'c'
+    assert cache.get('holdings', (1, 2), compute('d')) == 'd'
+    assert calls == ['a', 'c', 'd']
+
+    cache.clear()
+    assert cache.get('holdings', (1, 2), compute('e')) == 'e'
+
+
+def test_recording_a_trade_bumps_the_transactions_version(temp_storage):
+    before = get_versions()
+
+    update_buy('BTC', 1, 100)
+
+    after = get_versions()
+    assert after['transactions'] == before['transactions'] + 1
+    assert after['quotes'] == before['quotes']
+
+
+def test_quotes_version_follows_the_cache_ttl_without_the_worker(temp_storage, monkeypatch):
+    now = [1000 * analytics.QUOTE_CACHE_TTL]
+    monkeypatch.setattr(analytics.price_worker, 'is_running', lambda: False)
+    monkeypatch.setattr(analytics.time, 'time', lambda: now[0])
+
+    first = analytics.portfolio_versions()
+    assert analytics.portfolio_versions() == first
+
+    now[0] += analytics.QUOTE_CACHE_TTL
+    assert analytics.portfolio_versions()[1] != first[1]
+
+    monkeypatch.setattr(analytics.price_worker, 'is_running', lambda: True)
+    quotes = analytics.portfolio_versions()[1]
+
+    versions.bump('quotes')
+    assert analytics.portfolio_versions()[1] == quotes + 1
@@ -0,0 +1,67 @@
+import random
+
+from sdk.portoflio import versions
+from sdk.price_worker import FakeQuoteProvider, PriceIngestionWorker, QuoteSnapshotStore
+
+
+def make_worker(provider, **kwargs):
+    return PriceIngestionWorker(
+        QuoteSnapshotStore(), provider=provider, symbols_loader=lambda: ['BTC', 'ETH'],
+        interval=60, rng=random.Random(0), **kwargs
+    )
+
+
+def test_fake_provider_fills_store():
+    provider = FakeQuoteProvider({'BTC': 100.0, 'ETH': 10.0})
+    worker = make_worker(provider)
+
+    before = versions.get_versions()['quotes']
+
+    assert worker.run_once()
+    assert provider.calls == 1
+    assert versions.get_versions()['quotes'] == before + 1
+
+    response = worker.store.get_response(['BTC', 'ETH'])
+    assert response['data']['BTC']['quote']['USD']['price'] == 100.0
+    assert worker.store.updated_at is not None
+
+
+def test_failures_back_off_and_keep_last_quotes():
+    prices = FakeQuoteProvider({'BTC': 100.0, 'ETH': 10.0})
+    healthy = [True]
+
+    def provider(symbols, convert='USD'):
+        return prices(symbols, convert) if healthy[0] else None
+
+    worker = make_worker(provider, max_backoff=600)
+
+    assert worker.run_once()
+    updated_at = worker.store.updated_at
+    assert worker.next_delay() == 60
+
+    healthy[0] = False
+    delays = []
+    for _ in range(6):
+        assert not worker.run_once()
+        delays.append(worker.next_delay())
+
+    assert worker.failures == 6
+    assert worker.store.updated_at == updated_at
+    assert 30 <= delays[0] <= 60
+    assert all(300 <= delay <= 600 for delay in delays[-2:])
+
+    healthy[0] = True
+    assert worker.run_once()
+    assert worker.failures == 0
+    assert worker.next_delay() == 60
+
+
+def test_provider_exception_counts_as_failure():
+    def provider(symbols, convert='USD'):
+        raise ConnectionError('down')
+
+    worker = make_worker(provider)
+
+    assert not worker.run_once()
+    assert worker.failures == 1
+    assert worker.store.updated_at is None
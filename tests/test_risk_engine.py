@@ -0,0 +1,51 @@
+import math
+
+from sdk.candles import TIMEFRAMES, CandleProvider, CandleStore
+from sdk.portoflio import risk_engine
+
+
+class FakeCandleProvider(CandleProvider):
+    """
+    Daily candles oscillating around a base price per symbol; other
+    symbols fail like an unlisted pair.
+    """
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = {}
+
+    def fetch_candles(self, symbol, tf, start, end):
+        self.calls[symbol] = self.calls.get(symbol, 0) + 1
+
+        if symbol not in self.prices:
+            return None
+
+        seconds = TIMEFRAMES[tf]
+        candles = []
+        for ts in range(start, end, seconds):
+            close = self.prices[symbol] * (1 + 0.05 * math.sin(ts / seconds))
+            candles.append((ts, close, close, close, close, 0.0))
+
+        return candles
+
+
+def test_first_poll_seeds_risk_and_failed_symbols_are_not_refetched(temp_storage, monkeypatch):
+    provider = FakeCandleProvider({'BTC': 100.0, 'ETH': 10.0})
+    monkeypatch.setattr(risk_engine, 'candle_store', CandleStore(provider))
+    monkeypatch.setattr(risk_engine, 'risk_engine', risk_engine.RiskEngine())
+
+    holdings = [{'symbol': 'BTC', 'percentage': 60}, {'symbol': 'ETH', 'percentage': 40}]
+    assert risk_engine.get_risk_metrics(holdings) is None
+
+    response = {'data': {'BTC': {}, 'ETH': {}, 'USDT': {}}}
+    risk_engine.update_daily_candles(response)
+
+    metrics = risk_engine.get_risk_metrics(holdings)
+    assert metrics is not None
+    assert metrics['days'] >= risk_engine.MIN_RISK_HISTORY_DAYS
+
+    calls = dict(provider.calls)
+    assert calls['USDT'] == 1
+
+    risk_engine.update_daily_candles(response)
+    assert provider.calls == calls
@@ -0,0 +1,26 @@
+from sdk.portoflio.ledger import get_ledger
+from sdk.portoflio.transactions import update_buy
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return session.get('_flashes', [])
+
+
+def test_selling_more_than_held_flashes_an_error(client):
+    assert update_buy('BTC', 1, 100)
+
+    response = client.post('/sell_asset', data={'asset_name': 'BTC', 'price': '150', 'quantity': '2'})
+
+    assert response.status_code == 302
+    assert [category for category, _ in flashes(client)] == ['error']
+    assert get_ledger().open_positions()['BTC']['quantity'] == 1
+
+
+def test_selling_held_quantity_succeeds(client):
+    assert update_buy('BTC', 1, 100)
+
+    client.post('/sell_asset', data={'asset_name': 'BTC', 'price': '150', 'quantity': '0.5'})
+
+    assert flashes(client) == [('success', 'Asset sold successfully!')]
+    assert get_ledger().open_positions()['BTC']['quantity'] == 0.5
@@ -0,0 +1,166 @@
+import numpy as np
+import pytest
+
+from sdk import storage
+from sdk.portoflio import snapshots
+from sdk.portoflio.history import SECONDS_PER_DAY
+from sdk.portoflio.snapshots import (
+    ROLLUP_DTYPE,
+    SECONDS_PER_HOUR,
+    SNAPSHOT_DTYPE,
+    SnapshotRecorder,
+    merge_rollups,
+    open_records,
+    read_range,
+    rollup,
+)
+
+START = 1_700_000_000 // SECONDS_PER_DAY * SECONDS_PER_DAY
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    return SnapshotRecorder(
+        raw_path=str(tmp_path / 'raw.bin'),
+        hourly_path=str(tmp_path / 'hourly.bin'),
+        daily_path=str(tmp_path / 'daily.bin'),
+    )
+
+
+def make_snapshots(days, step=600, seed=1):
+    rng = np.random.default_rng(seed)
+    offsets = np.arange(0, days * SECONDS_PER_DAY, step)
+    timestamps = START + offsets + rng.integers(0, step // 2, len(offsets))
+    values = 1000 * np.cumprod(1 + rng.normal(0, 0.01, len(timestamps)))
+
+    records = np.zeros(len(timestamps), dtype=SNAPSHOT_DTYPE)
+    records['timestamp'] = timestamps
+    records['total_value'] = values
+    records['total_investment'] = 900
+    records['profit_loss'] = values - 900
+    records['profit_loss_percentage'] = (values - 900) / 9
+    return records
+
+
+def record_all(recorder, records):
+    for record in records.tolist():
+        recorder.record(*record)
+
+
+def reference_rollup(records, bucket_seconds):
+    buckets = {}
+    for record in records:
+        buckets.setdefault(int(record['timestamp']) // bucket_seconds, []).append(record)
+
+    return [
+        (bucket * bucket_seconds, rows[0]['total_value'], max(row['total_value'] for row in rows),
+         min(row['total_value'] for row in rows), rows[-1]['total_value'], rows[-1]['total_investment'],
+         rows[-1]['profit_loss'], rows[-1]['profit_loss_percentage'])
+        for bucket, rows in sorted(buckets.items())
+    ]
+
+
+def test_records_round_trip_through_the_memmap(recorder):
+    records = make_snapshots(2)
+    record_all(recorder, records)
+
+    # A crash mid-write leaves a partial record behind
+    with open(recorder.raw_path, 'ab') as file:
+        file.write(b'\0' * (SNAPSHOT_DTYPE.itemsize - 3))
+
+    stored = open_records(recorder.raw_path, SNAPSHOT_DTYPE)
+
+    assert isinstance(stored, np.memmap)
+    assert np.array_equal(stored, records)
+    assert len(open_records(recorder.hourly_path, ROLLUP_DTYPE)) == 0
+
+
+def test_read_range_matches_a_mask():
+    records = make_snapshots(3)
+    start, end = START + SECONDS_PER_DAY // 2, START + 2 * SECONDS_PER_DAY
+
+    selected = read_range(records, start, end)
+    mask = (records['timestamp'] >= start) & (records['timestamp'] < end)
+
+    assert np.array_equal(selected, records[mask])
+    assert np.array_equal(read_range(records, end=start), records[records['timestamp'] < start])
+    assert len(read_range(records, start=START + 10 * SECONDS_PER_DAY)) == 0
+
+
+def test_rollup_matches_a_reference():
+    records = make_snapshots(3)
+
+    for bucket_seconds in (SECONDS_PER_HOUR, SECONDS_PER_DAY):
+        assert rollup(records, bucket_seconds).tolist() == reference_rollup(records, bucket_seconds)
+
+    # Daily rollups of hourly rollups keep the true open, high, low and close
+    hourly = rollup(records, SECONDS_PER_HOUR)
+    assert rollup(hourly, SECONDS_PER_DAY, value_field='open').tolist() == reference_rollup(records, SECONDS_PER_DAY)
+
+
+def test_merge_rollups_joins_a_shared_bucket():
+    records = make_snapshots(1)
+    middle = len(records) // 2 + 1
+
+    merged = merge_rollups(rollup(records[:middle], SECONDS_PER_DAY), rollup(records[middle:], SECONDS_PER_DAY))
+
+    assert merged.tolist() == rollup(records, SECONDS_PER_DAY).tolist()
+
+
+def test_compaction_keeps_every_snapshot_accounted_for(recorder):
+    records = make_snapshots(40)
+    record_all(recorder, records)
+    now = START + 40 * SECONDS_PER_DAY
+
+    # Compacting day by day gives the same files as compacting once
+    stepwise = SnapshotRecorder(recorder.raw_path + '2', recorder.hourly_path + '2', recorder.daily_path + '2')
+    record_all(stepwise, records)
+    for day in range(10, 41):
+        stepwise.compact(raw_days=7, hourly_days=20, now=START + day * SECONDS_PER_DAY)
+
+    recorder.compact(raw_days=7, hourly_days=20, now=now)
+
+    for first, second, dtype in ((recorder.raw_path, stepwise.raw_path, SNAPSHOT_DTYPE),
+                                 (recorder.hourly_path, stepwise.hourly_path, ROLLUP_DTYPE),
+                                 (recorder.daily_path, stepwise.daily_path, ROLLUP_DTYPE)):
+        assert np.array_equal(open_records(first, dtype), open_records(second, dtype))
+
+    raw = open_records(recorder.raw_path, SNAPSHOT_DTYPE)
+    hourly = open_records(recorder.hourly_path, ROLLUP_DTYPE)
+    daily = open_records(recorder.daily_path, ROLLUP_DTYPE)
+
+    assert raw['timestamp'][0] >= now - 7 * SECONDS_PER_DAY - SECONDS_PER_HOUR
+    assert np.array_equal(raw, records[-len(raw):])
+
+    expired = records[:-len(raw)]
+    assert daily.tolist() + hourly.tolist() == (
+        reference_rollup(expired[expired['timestamp'] < daily['timestamp'][-1] + SECONDS_PER_DAY], SECONDS_PER_DAY)
+        + reference_rollup(expired[expired['timestamp'] >= hourly['timestamp'][0]], SECONDS_PER_HOUR)
+    )
+
+    columns, extremes = recorder.load_columns()
+
+    assert len(columns[0]) == len(daily) + len(hourly) + len(raw)
+    assert np.all(np.diff(columns[0]) > 0)
+    assert extremes == (expired['total_value'].min(), expired['total_value'].max())
+
+
+def test_record_portfolio_is_rate_limited_and_stored(recorder, temp_storage, monkeypatch):
+    now = [START]
+    monkeypatch.setattr(snapshots, 'naive_now', lambda: now[0])
+    monkeypatch.setattr(snapshots, 'get_holdings', lambda: ([], 1100.0, 1000.0))
+    monkeypatch.setattr(snapshots, 'calculate_profit_loss', lambda value: {'amount': 100.0, 'percentage': 10.0})
+
+    assert recorder.record_portfolio()
+    assert not recorder.record_portfolio({'data': {}})
+
+    now[0] += recorder.min_interval
+    assert recorder.record_portfolio()
+
+    assert open_records(recorder.raw_path, SNAPSHOT_DTYPE)['timestamp'].tolist() == [START, START + 60]
+    assert storage.load_portfolio_history() == [
+        {'datetime': str(np.datetime64(timestamp, 's')).replace('T', ' '), 'total_value': 1100.0,
+         'total_investment': 1000.0, 'profit_loss': 100.0, 'profit_loss_percentage': 10.0}
+        for timestamp in (START, START + 60)
+    ]
+    assert recorder.last_compacted == START
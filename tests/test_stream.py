@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+from sdk.portoflio import stream
+
+
+class FakeHistory(list):
+    def chart_points(self, start=0):
+        return self[start:]
+
+
+class FakePortfolio:
+    """
+    Holdings, history and input versions the stream reads, changed by the tests.
+    """
+
+    def __init__(self):
+        self.prices = {'BTC': 100.0, 'ETH': 10.0}
+        self.history = FakeHistory()
+        self.version = 0
+
+    def holdings(self):
+        rows = [
+            {'symbol': symbol, 'holdings': 1, 'current_price': price, 'value': price, 'percentage': 0,
+             'day_change': 0, 'pnl_amount': 0, 'pnl_percentage': 0}
+            for symbol, price in self.prices.items()
+        ]
+        return rows, sum(self.prices.values()), None
+
+    def move(self, symbol, price):
+        self.prices[symbol] = price
+        self.version += 1
+
+
+@pytest.fixture
+def portfolio(temp_storage, monkeypatch):
+    fake = FakePortfolio()
+
+    monkeypatch.setattr(stream, 'get_holdings', fake.holdings)
+    monkeypatch.setattr(stream, 'get_portfolio_history', lambda: fake.history)
+    monkeypatch.setattr(stream, 'portfolio_versions', lambda: fake.version)
+    monkeypatch.setattr(stream, 'calculate_profit_loss', lambda value: {'amount': round(value - 100, 2)})
+
+    return fake
+
+
+def make_stream(monkeypatch, **kwargs):
+    portfolio_stream = stream.PortfolioStream(heartbeat=0, **kwargs)
+    # Tests drive publish and run_once themselves
+    monkeypatch.setattr(portfolio_stream, 'start', lambda: None)
+    return portfolio_stream
+
+
+def parse(message):
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    return int(fields['id']), fields['event'], json.loads(fields['data'])
+
+
+def connect(portfolio_stream, cursor=None):
+    client = portfolio_stream.subscribe(cursor)
+    assert next(client).startswith('retry: ')
+    return client
+
+
+def test_deltas_carry_only_changed_holdings(portfolio, monkeypatch):
+    portfolio_stream = make_stream(monkeypatch)
+    assert portfolio_stream.publish(force=True) is None
+
+    assert portfolio_stream.publish() is None
+
+    portfolio.move('ETH', 12.0)
+    event_id, name, delta = portfolio_stream.publish()
+
+    assert (event_id, name) == (1, 'delta')
+    assert list(delta['holdings']) == ['ETH']
+    assert delta['totals'] == {'current_value': 112.0, 'profit_loss': {'amount': 12.0}}
+
+    del portfolio.prices['ETH']
+    portfolio.version += 1
+    assert portfolio_stream.publish()[2]['removed'] == ['ETH']
+
+
+def test_reconnect_replays_from_the_cursor(portfolio, monkeypatch):
+    portfolio_stream = make_stream(monkeypatch, buffer_size=3)
+    portfolio_stream.publish(force=True)
+
+    for price in (101.0, 102.0, 103.0):
+        portfolio.move('BTC', price)
+        portfolio_stream.publish()
+
+    client = connect(portfolio_stream, cursor=1)
+    assert [parse(next(client))[0] for _ in range(2)] == [2, 3]
+    assert next(client) == ': heartbeat\n\n'
+
+    assert portfolio_stream.replay(3) == []
+    assert portfolio_stream.replay(4) is None
+
+    # Event 1 left the buffer, so a client at cursor 0 gets a snapshot
+    portfolio.move('BTC', 104.0)
+    portfolio_stream.publish()
+    assert portfolio_stream.replay(0) is None
+
+    event_id, name, snapshot = parse(next(connect(portfolio_stream, cursor=0)))
+    assert (event_id, name, snapshot['gap']) == (4, 'snapshot', True)
+    assert snapshot['holdings']['BTC']['current_price'] == 104.0
+
+
+def test_slow_client_is_resynced_with_a_snapshot(portfolio, monkeypatch):
+    portfolio_stream = make_stream(monkeypatch, client_queue_size=2)
+
+    client = connect(portfolio_stream)
+    assert parse(next(client))[1:] == ('snapshot', portfolio_stream.snapshot()[2])
+
+    for price in (101.0, 102.0, 103.0):
+        portfolio.move('BTC', price)
+        portfolio_stream.publish()
+
+    event_id, name, snapshot = parse(next(client))
+    assert (event_id, name, snapshot['gap']) == (3, 'snapshot', True)
+    assert snapshot['holdings']['BTC']['current_price'] == 103.0
+
+    portfolio.move('BTC', 104.0)
+    portfolio_stream.publish()
+    assert parse(next(client))[:2] == (4, 'delta')
+
+
+def test_buffer_is_reset_without_clients(portfolio, monkeypatch):
+    portfolio_stream = make_stream(monkeypatch)
+
+    client = connect(portfolio_stream)
+    next(client)
+
+    portfolio.move('BTC', 101.0)
+    portfolio_stream.run_once()
+    assert parse(next(client))[:2] == (1, 'delta')
+
+    client.close()
+    assert not portfolio_stream.subscribers
+
+    portfolio.move('BTC', 102.0)
+    portfolio_stream.run_once()
+
+    assert portfolio_stream.state is None
+    assert len(portfolio_stream.events) == 0
+    assert portfolio_stream.replay(1) is None
+
+    event_id, name, snapshot = parse(next(connect(portfolio_stream, cursor=1)))
+    assert (event_id, name, snapshot['gap']) == (2, 'snapshot', True)
+    assert snapshot['holdings']['BTC']['current_price'] == 102.0